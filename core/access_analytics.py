@@ -0,0 +1,204 @@
+"""
+Analítica de accesos con agregación vectorizada (NumPy).
+
+Las columnas (timestamp, id_device, access_type, id_user) se leen por
+bloques con un cursor del servidor y cada bloque se acumula con bincount,
+sin cargar el rango completo en memoria. Los resultados se cachean por
+(filtros, rango) hasta que llega un log nuevo dentro de ese rango.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from core import log_events
+from core.config import settings
+from models.logs import Log
+
+# Tipos de acceso que representan un paso por la puerta
+ACCESS_TYPES = ("nfc", "pin", "local")
+
+# Colombia no tiene horario de verano: UTC-5 fijo
+COLOMBIA_OFFSET_HOURS = -5
+
+CHUNK_ROWS = 50000
+CACHE_MAX_ENTRIES = 128
+
+
+def _np():
+    import numpy as np
+    return np
+
+
+class _Accumulator:
+    """Acumula histogramas bloque a bloque."""
+
+    def __init__(self, start: datetime, end: datetime):
+        np = _np()
+        self.day0 = (start + timedelta(hours=COLOMBIA_OFFSET_HOURS)).date()
+        last_day = (end + timedelta(hours=COLOMBIA_OFFSET_HOURS)).date()
+        self.n_days = (last_day - self.day0).days + 1
+        self.total = 0
+        self.hourly = np.zeros(24, dtype=np.int64)
+        self.daily = np.zeros(self.n_days, dtype=np.int64)
+        self.heatmap = np.zeros(7 * 24, dtype=np.int64)
+        self.by_device: Dict[int, object] = {}
+        self.by_access_type: Counter = Counter()
+        self.by_user: Counter = Counter()
+
+    def add(self, rows: List[Tuple]):
+        np = _np()
+        if not rows:
+            return
+        timestamps, devices, access_types, users = zip(*rows)
+
+        local = np.array(timestamps, dtype="datetime64[us]") + np.timedelta64(COLOMBIA_OFFSET_HOURS, "h")
+        hours = local.astype("datetime64[h]").astype(np.int64) % 24
+        days = local.astype("datetime64[D]").astype(np.int64)
+        weekdays = (days + 3) % 7  # 1970-01-01 fue jueves; lunes = 0
+
+        self.total += len(rows)
+        self.hourly += np.bincount(hours, minlength=24)
+        self.heatmap += np.bincount(weekdays * 24 + hours, minlength=7 * 24)
+
+        day_index = days - (self.day0 - date(1970, 1, 1)).days
+        valid = (day_index >= 0) & (day_index < self.n_days)
+        self.daily += np.bincount(day_index[valid], minlength=self.n_days)
+
+        device_array = np.array(devices, dtype=np.int64)
+        unique_devices, inverse = np.unique(device_array, return_inverse=True)
+        per_device = np.bincount(inverse * 24 + hours, minlength=len(unique_devices) * 24)
+        for i, device in enumerate(unique_devices):
+            device = int(device)
+            counts = per_device[i * 24:(i + 1) * 24]
+            if device in self.by_device:
+                self.by_device[device] += counts
+            else:
+                self.by_device[device] = counts.copy()
+
+        self.by_access_type.update(access_types)
+
+        user_array = np.array([u if u is not None else -1 for u in users], dtype=np.int64)
+        user_ids, user_counts = np.unique(user_array[user_array >= 0], return_counts=True)
+        self.by_user.update(dict(zip(user_ids.tolist(), user_counts.tolist())))
+
+    def result(self, top_users: int) -> Dict:
+        np = _np()
+        peak_order = np.argsort(self.hourly, kind="stable")[::-1][:3]
+        return {
+            "total": self.total,
+            "hourly": self.hourly.tolist(),
+            "peak_hours": [
+                {"hour": int(h), "count": int(self.hourly[h])}
+                for h in peak_order if self.hourly[h] > 0
+            ],
+            "daily": [
+                {"date": (self.day0 + timedelta(days=i)).isoformat(), "count": int(c)}
+                for i, c in enumerate(self.daily)
+            ],
+            "weekday_heatmap": self.heatmap.reshape(7, 24).tolist(),
+            "hourly_by_device": {
+                str(device): {
+                    "hourly": counts.tolist(),
+                    "total": int(counts.sum()),
+                    "peak_hour": int(np.argmax(counts)),
+                }
+                for device, counts in sorted(self.by_device.items())
+            },
+            "by_access_type": dict(self.by_access_type),
+            "top_users": [
+                {"id_user": int(user), "count": int(count)}
+                for user, count in self.by_user.most_common(top_users)
+            ],
+        }
+
+
+class AccessAnalytics:
+    def __init__(self):
+        self._cache: "OrderedDict[tuple, Tuple[int, float, Dict]]" = OrderedDict()
+        self._day_versions: Dict[date, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    # ---------------------- INVALIDACIÓN ----------------------
+    def on_logs(self, records: List[log_events.LogRecord]):
+        """Suscriptor de log_events: marca como modificados los días afectados."""
+        with self._lock:
+            for record in records:
+                self._day_versions[record.timestamp.date()] += 1
+
+    def _range_version(self, start: datetime, end: Optional[datetime]) -> int:
+        last = (end or datetime.utcnow()).date()
+        day = start.date()
+        version = 0
+        with self._lock:
+            while day <= last:
+                version += self._day_versions.get(day, 0)
+                day += timedelta(days=1)
+        return version
+
+    # ---------------------- CONSULTA ----------------------
+    def compute(
+        self,
+        session: Session,
+        start: datetime,
+        end: Optional[datetime] = None,
+        id_device: Optional[int] = None,
+        access_type: Optional[str] = None,
+        id_user: Optional[int] = None,
+        top_users: int = 10,
+    ) -> Dict:
+        key = (start, end, id_device, access_type, id_user, top_users)
+        version = self._range_version(start, end)
+        now = time.monotonic()
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] == version and now - cached[1] < settings.ANALYTICS_CACHE_TTL_SECONDS:
+                self._cache.move_to_end(key)
+                return {**cached[2], "cached": True}
+
+        query = session.query(Log.timestamp, Log.id_device, Log.access_type, Log.id_user).filter(
+            Log.timestamp >= start
+        )
+        if end:
+            query = query.filter(Log.timestamp <= end)
+        if id_device:
+            query = query.filter(Log.id_device == id_device)
+        if access_type:
+            query = query.filter(Log.access_type == access_type)
+        else:
+            query = query.filter(Log.access_type.in_(ACCESS_TYPES))
+        if id_user:
+            query = query.filter(Log.id_user == id_user)
+
+        accumulator = _Accumulator(start, end or datetime.utcnow())
+        rows = query.yield_per(CHUNK_ROWS)
+        chunk = []
+        for row in rows:
+            chunk.append(tuple(row))
+            if len(chunk) >= CHUNK_ROWS:
+                accumulator.add(chunk)
+                chunk = []
+        accumulator.add(chunk)
+
+        result = {
+            "range": {"start": start.isoformat(), "end": end.isoformat() if end else None},
+            "timezone": "America/Bogota (UTC-5)",
+            **accumulator.result(top_users),
+        }
+
+        with self._lock:
+            self._cache[key] = (version, now, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+
+        return {**result, "cached": False}
+
+
+# Instancia global
+access_analytics = AccessAnalytics()
+log_events.subscribe(access_analytics.on_logs)
@@ -0,0 +1,190 @@
+"""
+Acciones programadas ("abrir la puerta principal a las 08:00 de lunes a
+viernes", "cerrar el garaje a las 22:00").
+
+Las programaciones viven en `scheduled_actions` con su próxima ejecución
+(`next_run_at`, UTC). Las horas se expresan en hora Colombia, que no tiene
+horario de verano (core/time_utils.py), así que una hora local siempre es
+la misma hora UTC. En memoria solo hay un temporizador por programación en
+una rueda jerárquica (core/timer_wheel.py); al vencer, la acción sale por el
+mismo camino que POST /actions/ (cola de comandos, WhatsApp y log).
+
+- Al arrancar, las ejecuciones que vencieron con el servidor apagado se
+  disparan si no pasaron más de `catch_up_minutes`; si no, se registra un
+  log de acción omitida y se pasa a la siguiente.
+- Antes de ejecutar se "reclama" la fila con un UPDATE condicionado a la
+  `next_run_at` esperada: con varios workers solo uno la dispara.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.database import SessionLocal
+from core.event_codes import EventCode
+from core.time_utils import colombia_to_utc, format_colombia_time, to_colombia_time
+from core.timer_wheel import TimerWheel
+from models.logs import Log
+from models.scheduled_actions import ScheduledAction
+
+KINDS = ("once", "daily", "weekly")
+
+
+def parse_weekdays(value: Optional[str]) -> List[int]:
+    return sorted({int(day) for day in (value or "").split(",") if day.strip()})
+
+
+def next_occurrence(schedule: ScheduledAction, after: datetime) -> Optional[datetime]:
+    """Próxima ejecución estrictamente posterior a `after` (UTC sin zona), o None."""
+    if schedule.kind == "once":
+        return schedule.run_at if schedule.run_at and schedule.run_at > after else None
+
+    hour, minute = (int(part) for part in schedule.time_of_day.split(":"))
+    days = parse_weekdays(schedule.weekdays) if schedule.kind == "weekly" else range(7)
+    if not days:
+        return None
+    local_date = to_colombia_time(after).date()
+    for offset in range(8):
+        day = local_date + timedelta(days=offset)
+        if day.weekday() not in days:
+            continue
+        candidate = colombia_to_utc(datetime(day.year, day.month, day.day, hour, minute))
+        if candidate > after:
+            return candidate
+    return None
+
+
+def _epoch(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class ActionScheduler:
+    def __init__(self, tick_seconds: float):
+        self.tick_seconds = tick_seconds
+        self.wheel = TimerWheel(time.time(), tick_seconds)
+        self._lock = threading.Lock()
+        self.stats = {"fired": 0, "caught_up": 0, "missed": 0, "lost_claims": 0, "errors": 0}
+
+    def _arm(self, schedule_id: int, next_run_at: Optional[datetime]):
+        with self._lock:
+            if next_run_at is None:
+                self.wheel.cancel(schedule_id)
+            else:
+                self.wheel.schedule(schedule_id, _epoch(next_run_at))
+
+    def _missed_log(self, schedule: ScheduledAction, due: datetime) -> Log:
+        self.stats["missed"] += 1
+        return Log(
+            id_device=schedule.id_device,
+            id_user=schedule.id_user,
+            event_code=EventCode.SCHEDULED_ACTION_MISSED,
+            event=f"'{schedule.name}' ({schedule.action}) de las {format_colombia_time(due, '%Y-%m-%d %H:%M')}"[:255],
+            access_type="scheduled",
+        )
+
+    # ---------------------- ALTA Y CAMBIOS ----------------------
+    def reschedule(self, session: Session, schedule: ScheduledAction):
+        """Recalcula la próxima ejecución tras crear o editar la programación y la arma."""
+        schedule.next_run_at = next_occurrence(schedule, datetime.utcnow()) if schedule.enabled else None
+        session.add(schedule)
+        session.commit()
+        session.refresh(schedule)
+        self._arm(schedule.id, schedule.next_run_at)
+
+    def remove(self, schedule_id: int):
+        self._arm(schedule_id, None)
+
+    # ---------------------- CARGA ----------------------
+    def load(self) -> dict:
+        """Arma los temporizadores al arrancar y resuelve las ejecuciones perdidas."""
+        now = datetime.utcnow()
+        armed = caught_up = missed = 0
+        with SessionLocal() as session:
+            for schedule in session.query(ScheduledAction).filter(ScheduledAction.enabled == True):
+                if schedule.next_run_at is None:
+                    schedule.next_run_at = next_occurrence(schedule, now)
+                elif schedule.next_run_at <= now:
+                    if now - schedule.next_run_at <= timedelta(minutes=schedule.catch_up_minutes):
+                        # Queda vencida: la rueda la dispara en el primer tick
+                        caught_up += 1
+                    else:
+                        missed += 1
+                        session.add(self._missed_log(schedule, schedule.next_run_at))
+                        schedule.next_run_at = next_occurrence(schedule, now)
+                if schedule.next_run_at is None:
+                    schedule.enabled = False
+                    continue
+                self._arm(schedule.id, schedule.next_run_at)
+                armed += 1
+            session.commit()
+        self.stats["caught_up"] += caught_up
+        return {"armed": armed, "caught_up": caught_up, "missed": missed}
+
+    # ---------------------- EJECUCIÓN ----------------------
+    async def _fire(self, schedule_id: int):
+        from routers.actions import dispatch_action  # Mismo camino que POST /actions/
+
+        now = datetime.utcnow()
+        with SessionLocal() as session:
+            schedule = session.get(ScheduledAction, schedule_id)
+            if schedule is None or not schedule.enabled or schedule.next_run_at is None:
+                return
+            if schedule.next_run_at > now + timedelta(seconds=self.tick_seconds):
+                # Reprogramada en otro worker
+                self._arm(schedule.id, schedule.next_run_at)
+                return
+
+            due = schedule.next_run_at
+            following = next_occurrence(schedule, max(due, now))
+            table = ScheduledAction.__table__
+            claimed = session.execute(
+                update(table)
+                .where(table.c.id == schedule.id, table.c.next_run_at == due)
+                .values(next_run_at=following, last_run_at=now, enabled=following is not None)
+            ).rowcount
+            session.commit()
+            if not claimed:
+                self.stats["lost_claims"] += 1
+                session.refresh(schedule)
+                self._arm(schedule.id, schedule.next_run_at if schedule.enabled else None)
+                return
+            self._arm(schedule.id, following)
+
+            if now - due > timedelta(minutes=schedule.catch_up_minutes):
+                # El proceso estuvo detenido más que la tolerancia
+                session.add(self._missed_log(schedule, due))
+                session.commit()
+                return
+
+            id_device, action, id_user, name = schedule.id_device, schedule.action, schedule.id_user, schedule.name
+            new_action, _ = await dispatch_action(session, id_device, action, id_user, access_type="scheduled")
+            session.execute(update(table).where(table.c.id == schedule_id).values(last_action_id=new_action.id))
+            session.commit()
+            self.stats["fired"] += 1
+            print(f"⏰ Acción programada '{name}': {action} → dispositivo {id_device} (acción {new_action.id})")
+
+    async def run(self):
+        """Tarea de fondo: avanza la rueda cada tick y dispara las programaciones vencidas."""
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            with self._lock:
+                due = self.wheel.advance(time.time())
+            for schedule_id in due:
+                try:
+                    await self._fire(schedule_id)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    print(f"❌ Error ejecutando acción programada {schedule_id}: {e}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, **self.wheel.get_stats()}
+
+
+# Instancia global
+action_scheduler = ActionScheduler(settings.SCHEDULER_TICK_SECONDS)
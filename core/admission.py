@@ -0,0 +1,204 @@
+import asyncio
+import json
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from core.config import settings
+
+# Rutas usadas por los dispositivos (puertas). Tienen prioridad sobre el panel.
+DEVICE_ROUTES: List[Tuple[str, re.Pattern]] = [
+    ("POST", re.compile(r"^/nfc-cards/validate/?$")),
+    ("POST", re.compile(r"^/access-pins/validate/?$")),
+    ("POST", re.compile(r"^/actions/access-log(/.*)?$")),
+    ("POST", re.compile(r"^/actions/device/confirm/\d+/?$")),
+]
+
+# Rutas que nunca pasan por el control de admisión (sondas de salud, raíz)
+EXEMPT_PREFIXES = ("/health", "/docs", "/openapi.json", "/redoc")
+
+
+class AdmissionRejected(Exception):
+    pass
+
+
+class _Lane:
+    """Presupuesto de concurrencia con cola FIFO acotada para una clase de rutas."""
+
+    def __init__(self, name: str, limit: int, queue_size: int, max_wait: float, retry_after: int):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        # Métricas
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    async def acquire(self) -> float:
+        """Espera un hueco; devuelve el tiempo en cola (ms) o lanza AdmissionRejected."""
+        start = time.perf_counter()
+
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return self._admit(start)
+
+        if len(self.waiters) >= self.queue_size:
+            self.rejected += 1
+            raise AdmissionRejected()
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # El hueco llegó justo al vencer el plazo: devolverlo
+                self.release()
+            else:
+                future.cancel()
+                self._discard(future)
+            self.rejected += 1
+            raise AdmissionRejected()
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+                self._discard(future)
+            raise
+
+        return self._admit(start)
+
+    def release(self):
+        # Traspasar el hueco directamente al siguiente en cola
+        while self.waiters:
+            future = self.waiters.popleft()
+            if not future.done():
+                future.set_result(True)
+                return
+        self.active -= 1
+
+    def _discard(self, future: asyncio.Future):
+        try:
+            self.waiters.remove(future)
+        except ValueError:
+            pass
+
+    def _admit(self, start: float) -> float:
+        wait_ms = (time.perf_counter() - start) * 1000
+        self.admitted += 1
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        return wait_ms
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": len(self.waiters),
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_ms / self.admitted, 2) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 2),
+        }
+
+
+class AdmissionController:
+    """
+    Separa el tráfico de dispositivos del tráfico del panel. Cada clase tiene
+    su propio presupuesto de concurrencia, de modo que una ráfaga de consultas
+    del panel no agota el threadpool ni el pool de conexiones que usan las puertas.
+    """
+
+    def __init__(self):
+        self.lanes: Dict[str, _Lane] = {
+            "device": _Lane(
+                "device",
+                settings.ADMISSION_DEVICE_CONCURRENCY,
+                settings.ADMISSION_DEVICE_QUEUE,
+                settings.ADMISSION_DEVICE_MAX_WAIT,
+                retry_after=1,
+            ),
+            "dashboard": _Lane(
+                "dashboard",
+                settings.ADMISSION_DASHBOARD_CONCURRENCY,
+                settings.ADMISSION_DASHBOARD_QUEUE,
+                settings.ADMISSION_DASHBOARD_MAX_WAIT,
+                retry_after=settings.ADMISSION_RETRY_AFTER,
+            ),
+        }
+
+    def classify(self, method: str, path: str) -> Optional[str]:
+        if path == "/" or path.startswith(EXEMPT_PREFIXES):
+            return None
+        for route_method, pattern in DEVICE_ROUTES:
+            if method == route_method and pattern.match(path):
+                return "device"
+        return "dashboard"
+
+    def stats(self) -> Dict:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+
+class AdmissionControlMiddleware:
+    """Middleware ASGI que aplica el control de admisión por clase de ruta."""
+
+    def __init__(self, app, controller: "AdmissionController" = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        lane_name = self.controller.classify(scope["method"], scope["path"])
+        if lane_name is None:
+            await self.app(scope, receive, send)
+            return
+
+        lane = self.controller.lanes[lane_name]
+        try:
+            wait_ms = await lane.acquire()
+        except AdmissionRejected:
+            await self._reject(send, lane)
+            return
+
+        async def send_with_wait_header(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-queue-wait-ms", f"{wait_ms:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_wait_header)
+        finally:
+            lane.release()
+
+    async def _reject(self, send, lane: _Lane):
+        body = json.dumps({
+            "detail": "Servidor ocupado, intente de nuevo más tarde",
+            "route_class": lane.name,
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(lane.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# Instancia global
+admission_controller = AdmissionController()
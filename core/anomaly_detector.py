@@ -0,0 +1,313 @@
+"""
+Detección incremental de anomalías sobre los eventos de acceso.
+
+Se alimenta de los logs confirmados (y de las repeticiones compactadas) vía
+core/log_events; nunca vuelve a consultar el historial. Todo el estado es de
+tamaño fijo: diccionarios acotados (LRU) por credencial y por dispositivo,
+colas de largo fijo y 24 contadores por hora. Cada evento cuesta O(1).
+
+Reglas:
+- multi_door: la misma credencial (usuario o tarjeta) concede acceso en dos
+  dispositivos distintos con menos de ANOMALY_MULTI_DOOR_SECONDS de diferencia.
+- denied_burst: ANOMALY_BURST_COUNT accesos denegados (PIN/NFC) en un
+  dispositivo dentro de ANOMALY_BURST_SECONDS.
+- login_failed_burst: lo mismo con logins fallidos de un usuario.
+- unusual_hour: acceso en una hora (Colombia) con probabilidad histórica menor
+  a ANOMALY_RARE_HOUR_PROBABILITY para esa credencial (o el dispositivo, si la
+  credencial aún no tiene historial suficiente).
+
+Las alertas se guardan en `alerts` y se envían a los clientes del panel con
+`manager.broadcast_json` desde una tarea de fondo.
+"""
+import asyncio
+import json
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from core import log_events
+from core.config import settings
+from core.event_codes import (
+    ACCESS_DENIED_CODES,
+    ACCESS_GRANTED_CODES,
+    CREDENTIAL_ACCESS_CODES,
+    EventCode,
+)
+
+COLOMBIA_OFFSET = timedelta(hours=-5)
+# Al llegar a este total, los contadores por hora se reducen a la mitad
+HOUR_HISTORY_CAP = 2000
+MAX_PENDING_ALERTS = 1000
+
+
+class _BoundedDict(OrderedDict):
+    """Diccionario LRU de tamaño máximo fijo."""
+
+    def __init__(self, max_size: int):
+        super().__init__()
+        self.max_size = max_size
+
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+
+    def touch(self, key, factory):
+        value = self.get(key)
+        if value is None:
+            value = self[key] = factory()
+            if len(self) > self.max_size:
+                self.popitem(last=False)
+        else:
+            self.move_to_end(key)
+        return value
+
+
+class _HourHistogram:
+    __slots__ = ("bins", "total")
+
+    def __init__(self):
+        self.bins = [0] * 24
+        self.total = 0
+
+    def probability(self, hour: int) -> float:
+        # Suavizado de Laplace: una hora nunca vista no tiene probabilidad 0
+        return (self.bins[hour] + 1) / (self.total + 24)
+
+    def add(self, hour: int):
+        self.bins[hour] += 1
+        self.total += 1
+        if self.total >= HOUR_HISTORY_CAP:
+            # Decaimiento: el historial reciente pesa más que el antiguo
+            self.bins = [count // 2 for count in self.bins]
+            self.total = sum(self.bins)
+
+
+class AnomalyDetector:
+    def __init__(self):
+        max_keys = settings.ANOMALY_MAX_TRACKED_KEYS
+        self._lock = threading.Lock()
+        self._last_access = _BoundedDict(max_keys)   # credencial -> (dispositivo, timestamp)
+        self._credential_hours = _BoundedDict(max_keys)
+        self._device_hours: Dict[int, _HourHistogram] = {}
+        self._bursts = _BoundedDict(max_keys)        # (regla, clave) -> deque de timestamps
+        self._cooldowns = _BoundedDict(max_keys)     # (regla, clave) -> último aviso
+        self._pending = deque(maxlen=MAX_PENDING_ALERTS)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self.stats = {"events": 0, "alerts": 0, "suppressed": 0, "by_kind": {}}
+
+    # ---------------------- ENTRADA ----------------------
+    def on_logs(self, records: List[log_events.LogRecord]):
+        """Suscriptor de log_events (logs nuevos y repeticiones compactadas)."""
+        alerts = []
+        with self._lock:
+            for record in records:
+                alerts.extend(self.observe(record))
+        for alert in alerts:
+            self._emit(alert)
+
+    def observe(self, record: log_events.LogRecord) -> List[dict]:
+        """Actualiza el estado con un evento y devuelve las alertas que dispara."""
+        code = record.event_code
+        if code is None:
+            return []
+        self.stats["events"] += 1
+        alerts = []
+
+        if code in ACCESS_GRANTED_CODES:
+            credential = self._credential(record)
+            if credential and code in CREDENTIAL_ACCESS_CODES:
+                alerts.extend(self._check_multi_door(record, credential))
+            alerts.extend(self._check_hour(record, credential))
+        elif code in ACCESS_DENIED_CODES:
+            alerts.extend(self._check_burst(
+                "denied_burst", record.id_device, record,
+                f"{settings.ANOMALY_BURST_COUNT} accesos denegados seguidos en el dispositivo {record.id_device}",
+            ))
+        elif code == EventCode.SECURITY_LOGIN_FAILED and record.id_user:
+            alerts.extend(self._check_burst(
+                "login_failed_burst", record.id_user, record,
+                f"{settings.ANOMALY_BURST_COUNT} logins fallidos seguidos del usuario {record.id_user}",
+            ))
+        return alerts
+
+    @staticmethod
+    def _credential(record) -> Optional[tuple]:
+        # Una tarjeta pertenece a un usuario: se agrupa por usuario cuando se conoce
+        if record.id_user:
+            return ("user", record.id_user)
+        if record.id_card:
+            return ("card", record.id_card)
+        return None
+
+    # ---------------------- REGLAS ----------------------
+    def _check_multi_door(self, record, credential) -> List[dict]:
+        previous = self._last_access.get(credential)
+        self._last_access.put(credential, (record.id_device, record.timestamp))
+        if not previous:
+            return []
+
+        device, timestamp = previous
+        elapsed = abs((record.timestamp - timestamp).total_seconds())
+        if device == record.id_device or elapsed > settings.ANOMALY_MULTI_DOOR_SECONDS:
+            return []
+        return self._alert(
+            "multi_door", credential, record, "alta",
+            f"Credencial usada en los dispositivos {device} y {record.id_device} con {elapsed:.0f} s de diferencia",
+            {"previous_device": device, "seconds_apart": round(elapsed, 1)},
+        )
+
+    def _check_hour(self, record, credential) -> List[dict]:
+        hour = (record.timestamp + COLOMBIA_OFFSET).hour
+        device_hist = self._device_hours.get(record.id_device)
+        if device_hist is None:
+            device_hist = self._device_hours[record.id_device] = _HourHistogram()
+        credential_hist = self._credential_hours.touch(credential, _HourHistogram) if credential else None
+
+        reference, scope = None, None
+        if credential_hist and credential_hist.total >= settings.ANOMALY_MIN_HOUR_SAMPLES:
+            reference, scope = credential_hist, "credencial"
+        elif device_hist.total >= settings.ANOMALY_MIN_HOUR_SAMPLES:
+            reference, scope = device_hist, "dispositivo"
+
+        alerts = []
+        if reference is not None:
+            probability = reference.probability(hour)
+            if probability < settings.ANOMALY_RARE_HOUR_PROBABILITY:
+                alerts = self._alert(
+                    "unusual_hour", credential or ("device", record.id_device), record, "media",
+                    f"Acceso a las {hour:02d}:00 (hora Colombia), inusual para este {scope}",
+                    {"hour": hour, "probability": round(probability, 4), "scope": scope},
+                )
+
+        device_hist.add(hour)
+        if credential_hist:
+            credential_hist.add(hour)
+        return alerts
+
+    def _check_burst(self, kind: str, key, record, message: str) -> List[dict]:
+        window = self._bursts.touch((kind, key), lambda: deque(maxlen=settings.ANOMALY_BURST_COUNT))
+        window.append(record.timestamp)
+        if len(window) < window.maxlen:
+            return []
+        if (window[-1] - window[0]).total_seconds() > settings.ANOMALY_BURST_SECONDS:
+            return []
+        window.clear()
+        return self._alert(kind, key, record, "alta", message, {"count": settings.ANOMALY_BURST_COUNT})
+
+    def _alert(self, kind: str, key, record, severity: str, message: str, details: dict) -> List[dict]:
+        cooldown_key = (kind, key)
+        last = self._cooldowns.get(cooldown_key)
+        if last and abs((record.timestamp - last).total_seconds()) < settings.ANOMALY_COOLDOWN_SECONDS:
+            self.stats["suppressed"] += 1
+            return []
+        self._cooldowns.put(cooldown_key, record.timestamp)
+
+        self.stats["alerts"] += 1
+        self.stats["by_kind"][kind] = self.stats["by_kind"].get(kind, 0) + 1
+        return [{
+            "kind": kind,
+            "severity": severity,
+            "message": message[:255],
+            "id_device": record.id_device,
+            "id_user": record.id_user,
+            "id_card": record.id_card,
+            "details": {**details, "log_id": record.id, "event_code": record.event_code},
+            "event_timestamp": record.timestamp,
+        }]
+
+    # ---------------------- SALIDA ----------------------
+    def _emit(self, alert: dict):
+        if self._loop is not None and self._queue is not None:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, alert)
+        else:
+            self._pending.append(alert)
+
+    async def run(self):
+        """Tarea de fondo: guarda las alertas y las envía al panel."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        while self._pending:
+            self._queue.put_nowait(self._pending.popleft())
+
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                while not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                try:
+                    saved = await asyncio.to_thread(self._persist, batch)
+                except Exception as e:
+                    print(f"❌ Error guardando alertas: {e}")
+                    saved = [
+                        {**alert, "id": None, "event_timestamp": alert["event_timestamp"].isoformat()}
+                        for alert in batch
+                    ]
+                for alert in saved:
+                    await self._broadcast(alert)
+        finally:
+            self._loop = None
+            self._queue = None
+
+    def _persist(self, batch: List[dict]) -> List[dict]:
+        from core.database import SessionLocal
+        from models.alerts import Alert
+
+        with SessionLocal() as session:
+            rows = [
+                Alert(**{**alert, "details": json.dumps(alert["details"], default=str)[:1000]})
+                for alert in batch
+            ]
+            session.add_all(rows)
+            session.commit()
+            return [alert_to_dict(row) for row in rows]
+
+    async def _broadcast(self, alert: dict):
+        from core.websocket_manager import manager
+        try:
+            await manager.broadcast_json({"type": "alert", "alert": alert})
+        except Exception as e:
+            print(f"⚠️ Error enviando alerta al panel: {e}")
+        print(f"🚨 Alerta {alert['kind']}: {alert['message']}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "by_kind": dict(self.stats["by_kind"]),
+                "tracked_credentials": len(self._last_access),
+                "tracked_devices": len(self._device_hours),
+            }
+
+
+def alert_to_dict(alert) -> dict:
+    """Representación JSON de una fila de `alerts`."""
+    details = alert.details
+    try:
+        details = json.loads(details) if details else {}
+    except ValueError:
+        pass
+    return {
+        "id": alert.id,
+        "kind": alert.kind,
+        "severity": alert.severity,
+        "message": alert.message,
+        "id_device": alert.id_device,
+        "id_user": alert.id_user,
+        "id_card": alert.id_card,
+        "details": details,
+        "event_timestamp": alert.event_timestamp.isoformat() if alert.event_timestamp else None,
+        "created_at": alert.created_at.isoformat() if alert.created_at else None,
+        "acknowledged": alert.acknowledged,
+        "acknowledged_at": alert.acknowledged_at.isoformat() if alert.acknowledged_at else None,
+        "acknowledged_by": alert.acknowledged_by,
+    }
+
+
+# Instancia global
+anomaly_detector = AnomalyDetector()
+log_events.subscribe(anomaly_detector.on_logs)
+log_events.subscribe_occurrences(anomaly_detector.on_logs)
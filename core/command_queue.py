@@ -0,0 +1,480 @@
+"""
+Cola persistente de comandos hacia los dispositivos.
+
+Cada comando es una fila de `actions_devices` con número de secuencia por
+dispositivo, estado (pending → sent → confirmed | expired), intentos y
+vencimiento. La cola en memoria solo guarda los comandos sin confirmar:
+
+- Si el dispositivo no está conectado, el comando queda `pending` y se
+  entrega cuando se reconecta a /ws/device/{id} (se relee de la base, así
+  que también sirve tras un reinicio o si lo creó otro worker).
+- Sin confirmación (`action_confirmed` por WebSocket o
+  POST /actions/device/confirm/{id}) se reenvía con espera exponencial
+  hasta COMMAND_MAX_ATTEMPTS intentos.
+- Al pasar COMMAND_TTL_SECONDS se marca `expired` y se registra un log.
+- Una apertura repetida para el mismo dispositivo dentro de
+  COMMAND_COALESCE_SECONDS reutiliza el comando pendiente.
+- La secuencia por dispositivo sale de `devices.command_seq`, incrementado
+  en la misma transacción que crea el comando: el bloqueo de esa fila
+  ordena a los workers que crean comandos para el mismo dispositivo.
+"""
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from core.command_tracing import CommandTrace, command_tracer
+from core.config import settings
+from core.database import SessionLocal, engine
+from core.event_codes import EventCode
+from models.actions_devices import ActionDevice
+from models.devices import Device
+from models.logs import Log
+
+COALESCED_ACTIONS = ("DOOR_OPEN", "GARAGE_OPEN")
+OPEN_STATUSES = ("pending", "sent")
+
+
+class _Command:
+    __slots__ = (
+        "id", "id_device", "seq", "action", "created_at", "expires_at",
+        "attempts", "last_sent_at", "next_attempt_at", "correlation_id",
+    )
+
+    def __init__(self, row: ActionDevice):
+        self.id = row.id
+        self.id_device = row.id_device
+        self.seq = row.seq
+        self.action = row.action
+        self.created_at = row.created_at
+        self.expires_at = row.expires_at
+        self.attempts = row.attempts or 0
+        self.last_sent_at = row.last_sent_at
+        self.correlation_id = row.correlation_id
+        self.next_attempt_at: Optional[datetime] = None  # None = enviar en cuanto haya conexión
+
+
+class CommandQueue:
+    def __init__(self, ttl_seconds: float, retry_base_seconds: float, max_attempts: int, coalesce_seconds: float):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.retry_base_seconds = retry_base_seconds
+        self.max_attempts = max(max_attempts, 1)
+        self.coalesce = timedelta(seconds=coalesce_seconds)
+        self._queues: Dict[int, Dict[int, _Command]] = {}  # dispositivo -> {id: comando}, en orden de seq
+        self._ack_waiters: Dict[int, List[asyncio.Future]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"enqueued": 0, "coalesced": 0, "sent": 0, "resent": 0, "confirmed": 0, "expired": 0}
+
+    # ---------------------- ALTA ----------------------
+    def _next_seq(self, session: Session, id_device: int) -> Optional[int]:
+        """
+        Reserva la siguiente secuencia del dispositivo en la transacción de la
+        sesión; la fila de `devices` queda bloqueada hasta el commit. La primera
+        vez parte del mayor `seq` ya guardado.
+        """
+        devices = Device.__table__
+        actions = ActionDevice.__table__
+        stored = (
+            select(func.coalesce(func.max(actions.c.seq), 0))
+            .where(actions.c.id_device == id_device)
+            .scalar_subquery()
+        )
+        result = session.execute(
+            update(devices)
+            .where(devices.c.id == id_device)
+            .values(command_seq=func.coalesce(devices.c.command_seq, stored) + 1)
+        )
+        if not result.rowcount:
+            return None  # Dispositivo inexistente: la FK rechazará el comando
+        return session.execute(select(devices.c.command_seq).where(devices.c.id == id_device)).scalar()
+
+    def _find_duplicate(self, id_device: int, action: str, now: datetime) -> Optional[int]:
+        if action not in COALESCED_ACTIONS:
+            return None
+        with self._lock:
+            for command in reversed(list(self._queues.get(id_device, {}).values())):
+                if command.action == action and now - command.created_at < self.coalesce:
+                    return command.id
+        return None
+
+    async def enqueue(
+        self, session: Session, id_device: int, action: str, trace: Optional[CommandTrace] = None,
+    ) -> Tuple[ActionDevice, bool]:
+        """
+        Crea el comando y lo envía si el dispositivo está conectado.
+        Devuelve (acción, si se reutilizó un comando pendiente).
+        """
+        trace = trace or command_tracer.start(id_device, action)
+        now = datetime.utcnow()
+        duplicate_id = self._find_duplicate(id_device, action, now)
+        if duplicate_id is not None:
+            existing = session.query(ActionDevice).filter(ActionDevice.id == duplicate_id).first()
+            if existing is not None and existing.status in OPEN_STATUSES:
+                self.stats["coalesced"] += 1
+                print(f"🔁 Comando {action} agrupado con la acción {existing.id} (dispositivo {id_device})")
+                return existing, True
+
+        row = ActionDevice(
+            id_device=id_device,
+            action=action,
+            executed=False,
+            created_at=now,
+            status="pending",
+            seq=self._next_seq(session, id_device),
+            attempts=0,
+            expires_at=now + self.ttl,
+            correlation_id=trace.correlation_id,
+        )
+        session.add(row)
+        session.commit()
+        session.refresh(row)
+        command_tracer.bind(trace, row.id)
+
+        command = _Command(row)
+        with self._lock:
+            self._queues.setdefault(id_device, {})[row.id] = command
+        self.stats["enqueued"] += 1
+
+        if await self._send(command):
+            # Condicionado como en _save_attempts: no pisar una confirmación ya guardada
+            await asyncio.to_thread(self._save_attempts, [command])
+            session.commit()  # Cerrar la transacción para leer el estado actual
+            session.refresh(row)
+        return row, False
+
+    async def enqueue_many(
+        self, session: Session, device_ids: List[int], action: str, timeout: Optional[float] = None,
+        id_group_command: Optional[str] = None,
+    ) -> Tuple[List[ActionDevice], Dict[int, asyncio.Future]]:
+        """
+        Crea un comando por dispositivo en una sola transacción y los envía en
+        paralelo (sin agrupar duplicados: es una orden explícita a todo el grupo).
+        Devuelve las filas y sus esperas de confirmación (ver `wait_for_acks`),
+        registradas antes del envío para no perder una confirmación inmediata.
+        """
+        now = datetime.utcnow()
+        # Orden fijo de bloqueo de las filas de devices entre workers
+        traces = [command_tracer.start(id_device, action) for id_device in sorted(device_ids)]
+        rows = [
+            ActionDevice(
+                id_device=trace.id_device,
+                action=action,
+                executed=False,
+                created_at=now,
+                status="pending",
+                seq=self._next_seq(session, trace.id_device),
+                attempts=0,
+                expires_at=now + self.ttl,
+                correlation_id=trace.correlation_id,
+                id_group_command=id_group_command,
+            )
+            for trace in traces
+        ]
+        session.add_all(rows)
+        session.commit()
+        for trace, row in zip(traces, rows):
+            command_tracer.bind(trace, row.id)
+
+        commands = [_Command(row) for row in rows]
+        with self._lock:
+            for command in commands:
+                self._queues.setdefault(command.id_device, {})[command.id] = command
+        self.stats["enqueued"] += len(commands)
+
+        acks = self.watch_acks([row.id for row in rows])
+        try:
+            sent = await self._send_many(commands, timeout)
+            await asyncio.to_thread(self._save_attempts, sent)
+            for row in rows:
+                session.refresh(row)
+        except BaseException:
+            self.unwatch_acks(acks)
+            raise
+        return rows, acks
+
+    # ---------------------- ENVÍO ----------------------
+    async def _send_many(self, commands: List[_Command], timeout: Optional[float] = None) -> List[_Command]:
+        """
+        Envía varios comandos en paralelo. La parte común del JSON (acción y
+        fecha) se serializa una vez por acción; por dispositivo solo se
+        antepone id, secuencia e intento.
+        """
+        from core.websocket_manager import action_priority, manager
+
+        serialized: Dict[tuple, str] = {}
+        for command in commands:
+            key = (command.action, command.created_at)
+            if key not in serialized:
+                serialized[key] = json.dumps({
+                    "type": "action_execute",
+                    "action_type": command.action,
+                    "timestamp": command.created_at.isoformat(),
+                })
+
+        async def send(command: _Command) -> bool:
+            if command.id_device not in manager.device_connections:
+                return False
+            common = serialized[(command.action, command.created_at)]
+            text = (
+                f'{{"action_id": {command.id}, "id_device": {command.id_device}, '
+                f'"seq": {command.seq or "null"}, "attempt": {command.attempts + 1}, '
+                f'"correlation_id": {json.dumps(command.correlation_id)}, {common[1:]}'
+            )
+            previous_attempt_at = command.next_attempt_at
+            command.next_attempt_at = datetime.utcnow() + timedelta(seconds=self.retry_base_seconds * 2 ** command.attempts)
+            if not await manager.send_text_to_device(command.id_device, text, timeout, action_priority(command.action)):
+                command.next_attempt_at = previous_attempt_at
+                return False
+            self.stats["resent" if command.attempts else "sent"] += 1
+            command_tracer.mark(command.id, "ws_sent")
+            command.attempts += 1
+            command.last_sent_at = datetime.utcnow()
+            return True
+
+        # En paralelo entre dispositivos; en orden de secuencia dentro de cada uno
+        by_device: Dict[int, List[_Command]] = {}
+        for command in commands:
+            by_device.setdefault(command.id_device, []).append(command)
+
+        async def send_device(device_commands: List[_Command]) -> List[_Command]:
+            sent = []
+            for command in device_commands:
+                if not await send(command):
+                    break
+                sent.append(command)
+            return sent
+
+        results = await asyncio.gather(*(send_device(items) for items in by_device.values()))
+        return [command for sent in results for command in sent]
+
+    async def _send(self, command: _Command) -> bool:
+        return bool(await self._send_many([command]))
+
+    def _save_attempts(self, commands: List[_Command]):
+        if not commands:
+            return
+        table = ActionDevice.__table__
+        with engine.begin() as connection:
+            for command in commands:
+                connection.execute(
+                    update(table)
+                    .where(table.c.id == command.id, table.c.status.in_(OPEN_STATUSES))
+                    .values(status="sent", attempts=command.attempts, last_sent_at=command.last_sent_at)
+                )
+
+    async def redeliver(self, id_device: int) -> int:
+        """Reenvía, en orden de secuencia, los comandos abiertos de un dispositivo que se reconecta."""
+        rows = await asyncio.to_thread(self._load_open, id_device)
+        with self._lock:
+            queue = self._queues.setdefault(id_device, {})
+            for row in rows:
+                if row.id not in queue:
+                    queue[row.id] = _Command(row)
+            commands = sorted(queue.values(), key=lambda command: (command.seq or 0, command.id))
+
+        now = datetime.utcnow()
+        # Los vencidos los marca la tarea de fondo
+        sent = await self._send_many([
+            command for command in commands
+            if not (command.expires_at and command.expires_at <= now) and command.attempts < self.max_attempts
+        ])
+        await asyncio.to_thread(self._save_attempts, sent)
+        if sent:
+            print(f"📬 {len(sent)} comandos reenviados al dispositivo {id_device} tras reconectar")
+        return len(sent)
+
+    # ---------------------- CONFIRMACIÓN ----------------------
+    async def confirm(
+        self,
+        action_id: int,
+        session: Optional[Session] = None,
+        correlation_id: Optional[str] = None,
+        device_elapsed_ms: Optional[float] = None,
+    ) -> Optional[ActionDevice]:
+        """
+        Marca el comando como confirmado por el dispositivo (idempotente: una
+        confirmación repetida por un reenvío no vuelve a registrar el log).
+        """
+        own_session = session is None
+        session = session or SessionLocal()
+        try:
+            action = session.query(ActionDevice).filter(ActionDevice.id == action_id).first()
+            if not action:
+                return None
+
+            already_confirmed = action.executed and action.status == "confirmed"
+            action.executed = True
+            action.status = "confirmed"
+            session.add(action)
+            if not already_confirmed:
+                session.add(Log(
+                    id_device=action.id_device,
+                    id_user=None,
+                    id_action=action.id,
+                    event_code=EventCode.ACTION_DEVICE_CONFIRMED,
+                    access_type="remote",
+                ))
+                self.stats["confirmed"] += 1
+                command_tracer.confirmed(action.id, correlation_id, device_elapsed_ms)
+            session.commit()
+            session.refresh(action)
+            self.discard(action.id, action.id_device)
+            self._notify_ack(action.id)
+
+            if not already_confirmed:
+                from core.websocket_manager import manager
+                try:
+                    await manager.broadcast_json({
+                        "event": "action_confirmed",
+                        "action_id": action.id,
+                        "id_device": action.id_device,
+                        "action_type": action.action,
+                        "status": "executed",
+                    })
+                except Exception as e:
+                    print(f"⚠️ Error al broadcast confirmación: {e}")
+            return action
+        finally:
+            if own_session:
+                session.close()
+
+    def watch_acks(self, action_ids: List[int]) -> Dict[int, asyncio.Future]:
+        """Registra esperas de confirmación; hacerlo antes de enviar los comandos."""
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for action_id in action_ids:
+            future = loop.create_future()
+            self._ack_waiters.setdefault(action_id, []).append(future)
+            futures[action_id] = future
+        return futures
+
+    def unwatch_acks(self, futures: Dict[int, asyncio.Future]):
+        """Quita esperas de `watch_acks` que ya no se van a esperar."""
+        for action_id, future in futures.items():
+            waiters = self._ack_waiters.get(action_id, [])
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self._ack_waiters.pop(action_id, None)
+
+    async def wait_for_acks(self, futures: Dict[int, asyncio.Future], timeout: float) -> set:
+        """Espera hasta `timeout` segundos las confirmaciones de `watch_acks`; devuelve los confirmados."""
+        try:
+            pending = [future for future in futures.values() if not future.done()]
+            if pending:
+                await asyncio.wait(pending, timeout=max(timeout, 0))
+        finally:
+            self.unwatch_acks(futures)
+        return {action_id for action_id, future in futures.items() if future.done() and not future.cancelled()}
+
+    def _notify_ack(self, action_id: int):
+        for future in self._ack_waiters.pop(action_id, []):
+            if not future.done():
+                future.set_result(True)
+
+    def discard(self, action_id: int, id_device: Optional[int] = None):
+        """Saca un comando de la cola (confirmado, ejecutado a mano o eliminado)."""
+        with self._lock:
+            queues = [self._queues.get(id_device, {})] if id_device is not None else self._queues.values()
+            for queue in queues:
+                if queue.pop(action_id, None) is not None:
+                    return
+
+    # ---------------------- VENCIMIENTO Y REINTENTOS ----------------------
+    def _expire(self, commands: List[_Command]):
+        if not commands:
+            return
+        table = ActionDevice.__table__
+        with SessionLocal() as session:
+            for command in commands:
+                result = session.execute(
+                    update(table)
+                    .where(table.c.id == command.id, table.c.status.in_(OPEN_STATUSES))
+                    .values(status="expired")
+                )
+                if result.rowcount:
+                    session.add(Log(
+                        id_device=command.id_device,
+                        id_action=command.id,
+                        event_code=EventCode.ACTION_EXPIRED,
+                        event=f"{command.attempts} intentos",
+                        access_type="remote",
+                    ))
+            session.commit()
+
+    async def process(self):
+        """Vence los comandos pasados de tiempo y reenvía los que no se confirmaron."""
+        from core.websocket_manager import manager
+
+        now = datetime.utcnow()
+        expired, due = [], []
+        with self._lock:
+            for id_device, queue in self._queues.items():
+                for command in list(queue.values()):
+                    if command.expires_at and command.expires_at <= now:
+                        expired.append(queue.pop(command.id))
+                    elif (
+                        id_device in manager.device_connections
+                        and command.attempts < self.max_attempts
+                        and (command.next_attempt_at is None or command.next_attempt_at <= now)
+                    ):
+                        due.append(command)
+
+        if expired:
+            self.stats["expired"] += len(expired)
+            command_tracer.expired(command.id for command in expired)
+            await asyncio.to_thread(self._expire, expired)
+            print(f"⌛ {len(expired)} comandos vencieron sin confirmación")
+
+        sent = await self._send_many(due)
+        await asyncio.to_thread(self._save_attempts, sent)
+
+    async def run(self, interval: float = 1.0):
+        """Tarea de fondo: reintentos y vencimientos."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.process()
+            except Exception as e:
+                print(f"❌ Error procesando la cola de comandos: {e}")
+
+    # ---------------------- CARGA ----------------------
+    def _load_open(self, id_device: Optional[int] = None) -> List[ActionDevice]:
+        with SessionLocal() as session:
+            query = session.query(ActionDevice).filter(
+                ActionDevice.status.in_(OPEN_STATUSES),
+                ActionDevice.expires_at.isnot(None),
+            )
+            if id_device is not None:
+                query = query.filter(ActionDevice.id_device == id_device)
+            rows = query.order_by(ActionDevice.id_device, ActionDevice.seq, ActionDevice.id).all()
+            session.expunge_all()
+            return rows
+
+    def load(self) -> int:
+        """Carga al arrancar los comandos que quedaron abiertos."""
+        rows = self._load_open()
+        with self._lock:
+            for row in rows:
+                self._queues.setdefault(row.id_device, {}).setdefault(row.id, _Command(row))
+        return len(rows)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "open": {id_device: len(queue) for id_device, queue in self._queues.items() if queue},
+            }
+
+
+# Instancia global
+command_queue = CommandQueue(
+    settings.COMMAND_TTL_SECONDS,
+    settings.COMMAND_RETRY_BASE_SECONDS,
+    settings.COMMAND_MAX_ATTEMPTS,
+    settings.COMMAND_COALESCE_SECONDS,
+)
@@ -0,0 +1,259 @@
+"""
+Trazas de latencia de los comandos, desde la API hasta la confirmación del dispositivo.
+
+Cada comando recibe un `correlation_id` al crearse (create_action o un
+comando de grupo); viaja en el JSON `action_execute` y el dispositivo lo
+devuelve al confirmar. Se marcan los saltos con reloj monotónico:
+
+    created → db_commit → ws_sent → device_received → confirmed
+    notify_start → notified          (WhatsApp, en paralelo al resto)
+
+`device_received` lo informa el dispositivo con el mensaje WS
+`action_received`, o se deduce de `device_elapsed_ms` (tiempo que midió el
+dispositivo entre recibir y confirmar) para no depender de su reloj.
+
+Cada tramo se acumula en un histograma de buckets fijos por dispositivo y
+tipo de acción, en cuanto se conocen sus dos extremos. Las trazas recientes
+se guardan en memoria (COMMAND_TRACE_MAX) para consultarlas por acción.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.config import settings
+
+# Límites superiores de los buckets, en milisegundos (el último es +inf)
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# (tramo, salto inicial, salto final)
+SEGMENTS = (
+    ("db_commit", "created", "db_commit"),
+    ("ws_send", "db_commit", "ws_sent"),
+    ("device_receive", "ws_sent", "device_received"),
+    ("device_execute", "device_received", "confirmed"),
+    ("total", "created", "confirmed"),
+    ("notification", "notify_start", "notified"),
+)
+SEGMENT_NAMES = tuple(name for name, _, _ in SEGMENTS)
+
+
+class LatencyHistogram:
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float):
+        index = 0
+        while index < len(BUCKETS_MS) and ms > BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, value in enumerate(other.counts):
+            self.counts[index] += value
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Límite superior del bucket que contiene el percentil (acotado al máximo observado)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for index, value in enumerate(self.counts):
+            cumulative += value
+            if cumulative >= target:
+                bound = BUCKETS_MS[index] if index < len(BUCKETS_MS) else self.max_ms
+                return round(min(bound, self.max_ms), 1)
+        return round(self.max_ms, 1)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 1) if self.count else None,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 1) if self.count else None,
+            "buckets": {
+                (f"le_{bound}" if index < len(BUCKETS_MS) else "inf"): value
+                for index, (bound, value) in enumerate(zip(BUCKETS_MS + (None,), self.counts))
+                if value
+            },
+        }
+
+
+class CommandTrace:
+    __slots__ = ("correlation_id", "action_id", "id_device", "action", "started_at", "marks", "outcome")
+
+    def __init__(self, id_device: int, action: str, correlation_id: Optional[str] = None):
+        self.correlation_id = correlation_id or uuid.uuid4().hex[:16]
+        self.action_id: Optional[int] = None
+        self.id_device = id_device
+        self.action = action
+        self.started_at = datetime.utcnow()
+        self.marks: Dict[str, float] = {"created": time.perf_counter()}
+        self.outcome: Optional[str] = None  # confirmed, expired
+
+    def as_dict(self) -> dict:
+        created = self.marks["created"]
+        segments = {}
+        for name, start, end in SEGMENTS:
+            if start in self.marks and end in self.marks:
+                segments[name] = round((self.marks[end] - self.marks[start]) * 1000, 1)
+        return {
+            "correlation_id": self.correlation_id,
+            "action_id": self.action_id,
+            "id_device": self.id_device,
+            "action": self.action,
+            "started_at": self.started_at,
+            "outcome": self.outcome,
+            "hops_ms": {
+                hop: round((value - created) * 1000, 1)
+                for hop, value in sorted(self.marks.items(), key=lambda item: item[1])
+            },
+            "segments_ms": segments,
+        }
+
+
+class CommandTracer:
+    def __init__(self, max_traces: int):
+        self.max_traces = max(max_traces, 1)
+        self._traces: "OrderedDict[int, CommandTrace]" = OrderedDict()  # id de acción -> traza
+        self._histograms: Dict[Tuple[int, str], Dict[str, LatencyHistogram]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"started": 0, "confirmed": 0, "expired": 0, "correlation_mismatch": 0, "untraced_confirms": 0}
+
+    # ---------------------- SALTOS ----------------------
+    def start(self, id_device: int, action: str) -> CommandTrace:
+        """Nueva traza; queda registrada al enlazarla con el id de la acción (`bind`)."""
+        self.stats["started"] += 1
+        return CommandTrace(id_device, action)
+
+    def bind(self, trace: CommandTrace, action_id: int):
+        """Enlaza la traza con la acción recién guardada y marca el commit."""
+        trace.action_id = action_id
+        with self._lock:
+            self._traces[action_id] = trace
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+        self.mark(action_id, "db_commit")
+
+    def mark(self, action_id: int, hop: str, at: Optional[float] = None) -> Optional[CommandTrace]:
+        """
+        Marca un salto (solo la primera vez) y registra en el histograma los
+        tramos que quedan completos con él.
+        """
+        with self._lock:
+            trace = self._traces.get(action_id)
+            if trace is None or hop in trace.marks:
+                return trace
+            trace.marks[hop] = at if at is not None else time.perf_counter()
+            for name, start, end in SEGMENTS:
+                if hop in (start, end) and start in trace.marks and end in trace.marks:
+                    histograms = self._histograms.setdefault((trace.id_device, trace.action), {})
+                    histogram = histograms.get(name)
+                    if histogram is None:
+                        histogram = histograms[name] = LatencyHistogram()
+                    histogram.add(max(trace.marks[end] - trace.marks[start], 0) * 1000)
+            return trace
+
+    def received(self, action_id: int, correlation_id: Optional[str] = None):
+        """El dispositivo avisó (`action_received`) que recibió el comando."""
+        trace = self._check(action_id, correlation_id)
+        if trace is not None:
+            self.mark(action_id, "device_received")
+
+    def confirmed(self, action_id: int, correlation_id: Optional[str] = None, device_elapsed_ms: Optional[float] = None):
+        """Confirmación del dispositivo; con `device_elapsed_ms` se deduce cuándo lo recibió."""
+        trace = self._check(action_id, correlation_id)
+        if trace is None:
+            self.stats["untraced_confirms"] += 1
+            return
+        now = time.perf_counter()
+        try:
+            device_elapsed_ms = float(device_elapsed_ms) if device_elapsed_ms is not None else None
+        except (TypeError, ValueError):
+            device_elapsed_ms = None
+        if device_elapsed_ms is not None and device_elapsed_ms >= 0:
+            received_at = now - device_elapsed_ms / 1000
+            sent_at = trace.marks.get("ws_sent")
+            self.mark(action_id, "device_received", max(received_at, sent_at) if sent_at else received_at)
+        self.mark(action_id, "confirmed", now)
+        if trace.outcome is None:
+            trace.outcome = "confirmed"
+            self.stats["confirmed"] += 1
+
+    def expired(self, action_ids: Iterable[int]):
+        with self._lock:
+            for action_id in action_ids:
+                trace = self._traces.get(action_id)
+                if trace is not None and trace.outcome is None:
+                    trace.outcome = "expired"
+                    self.stats["expired"] += 1
+
+    def _check(self, action_id: int, correlation_id: Optional[str]) -> Optional[CommandTrace]:
+        with self._lock:
+            trace = self._traces.get(action_id)
+        if trace is not None and correlation_id and correlation_id != trace.correlation_id:
+            # Confirmación de otra traza (acción reutilizada tras reinicio): no se mide
+            self.stats["correlation_mismatch"] += 1
+            print(f"⚠️ correlation_id {correlation_id} no corresponde a la acción {action_id}")
+            return None
+        return trace
+
+    # ---------------------- LECTURA ----------------------
+    def get_trace(self, action_id: int) -> Optional[dict]:
+        with self._lock:
+            trace = self._traces.get(action_id)
+            return trace.as_dict() if trace is not None else None
+
+    def latency(self, id_device: Optional[int] = None, action: Optional[str] = None, by_device: bool = False) -> dict:
+        """Histogramas por tramo, filtrados por dispositivo y/o acción."""
+        groups: Dict[tuple, Dict[str, LatencyHistogram]] = {}
+        with self._lock:
+            for (device, action_type), histograms in self._histograms.items():
+                if id_device is not None and device != id_device:
+                    continue
+                if action is not None and action_type != action:
+                    continue
+                key = (device, action_type) if by_device else ()
+                merged = groups.setdefault(key, {})
+                for name, histogram in histograms.items():
+                    merged.setdefault(name, LatencyHistogram()).merge(histogram)
+
+        def render(histograms: Dict[str, LatencyHistogram]) -> dict:
+            return {name: histograms[name].as_dict() for name in SEGMENT_NAMES if name in histograms}
+
+        if not by_device:
+            return {"segments": render(groups.get((), {}))}
+        return {
+            "groups": [
+                {"id_device": device, "action": action_type, "segments": render(histograms)}
+                for (device, action_type), histograms in sorted(groups.items())
+            ]
+        }
+
+    def recent(self, limit: int = 20) -> List[dict]:
+        with self._lock:
+            traces = list(self._traces.values())[-limit:]
+            return [trace.as_dict() for trace in reversed(traces)]
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "traces": len(self._traces), "series": len(self._histograms)}
+
+
+# Instancia global
+command_tracer = CommandTracer(settings.COMMAND_TRACE_MAX)
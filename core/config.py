@@ -12,4 +12,102 @@ class Settings:
     CALLMEBOT_API_KEY: str = os.getenv("CALLMEBOT_API_KEY")
     ADMIN_PHONE_NUMBER: str = os.getenv("ADMIN_PHONE_NUMBER")
 
+    # Base de datos / arranque
+    DB_ECHO: bool = os.getenv("DB_ECHO", "true").lower() == "true"
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_WARM_CONNECTIONS: int = int(os.getenv("DB_WARM_CONNECTIONS", 5))
+
+    # Control de admisión (dispositivos antes que panel)
+    ADMISSION_DEVICE_CONCURRENCY: int = int(os.getenv("ADMISSION_DEVICE_CONCURRENCY", 24))
+    ADMISSION_DEVICE_QUEUE: int = int(os.getenv("ADMISSION_DEVICE_QUEUE", 200))
+    ADMISSION_DEVICE_MAX_WAIT: float = float(os.getenv("ADMISSION_DEVICE_MAX_WAIT", 8))
+    ADMISSION_DASHBOARD_CONCURRENCY: int = int(os.getenv("ADMISSION_DASHBOARD_CONCURRENCY", 8))
+    ADMISSION_DASHBOARD_QUEUE: int = int(os.getenv("ADMISSION_DASHBOARD_QUEUE", 32))
+    ADMISSION_DASHBOARD_MAX_WAIT: float = float(os.getenv("ADMISSION_DASHBOARD_MAX_WAIT", 2))
+    ADMISSION_RETRY_AFTER: int = int(os.getenv("ADMISSION_RETRY_AFTER", 2))
+
+    # Rollups de logs
+    LOG_ROLLUP_FLUSH_SECONDS: float = float(os.getenv("LOG_ROLLUP_FLUSH_SECONDS", 10))
+
+    # Retención de logs (0 desactiva el archivado automático)
+    LOG_RETENTION_DAYS: int = int(os.getenv("LOG_RETENTION_DAYS", 180))
+    LOG_ARCHIVE_DIR: str = os.getenv("LOG_ARCHIVE_DIR", "archives/logs")
+    LOG_ARCHIVE_INTERVAL_HOURS: float = float(os.getenv("LOG_ARCHIVE_INTERVAL_HOURS", 24))
+
+    # Ventana por defecto de /logs/ y /actions/ cuando no se indica rango (0 = todo el historial)
+    QUERY_DEFAULT_WINDOW_DAYS: int = int(os.getenv("QUERY_DEFAULT_WINDOW_DAYS", 30))
+
+    # Compactación de eventos de seguridad repetidos (0 = una fila por evento)
+    SECURITY_COMPACTION_WINDOW_SECONDS: float = float(os.getenv("SECURITY_COMPACTION_WINDOW_SECONDS", 60))
+
+    # Reportes PDF/CSV
+    REPORT_WORKERS: int = int(os.getenv("REPORT_WORKERS", 2))
+    REPORT_CACHE_DIR: str = os.getenv("REPORT_CACHE_DIR", "cache/reports")
+    REPORT_CACHE_MAX_FILES: int = int(os.getenv("REPORT_CACHE_MAX_FILES", 200))
+    REPORT_MAX_DETAIL_ROWS: int = int(os.getenv("REPORT_MAX_DETAIL_ROWS", 5000))
+
+    # Detección de anomalías
+    ANOMALY_MULTI_DOOR_SECONDS: float = float(os.getenv("ANOMALY_MULTI_DOOR_SECONDS", 60))
+    ANOMALY_BURST_COUNT: int = int(os.getenv("ANOMALY_BURST_COUNT", 5))
+    ANOMALY_BURST_SECONDS: float = float(os.getenv("ANOMALY_BURST_SECONDS", 60))
+    ANOMALY_RARE_HOUR_PROBABILITY: float = float(os.getenv("ANOMALY_RARE_HOUR_PROBABILITY", 0.02))
+    ANOMALY_MIN_HOUR_SAMPLES: int = int(os.getenv("ANOMALY_MIN_HOUR_SAMPLES", 50))
+    ANOMALY_COOLDOWN_SECONDS: float = float(os.getenv("ANOMALY_COOLDOWN_SECONDS", 300))
+    ANOMALY_MAX_TRACKED_KEYS: int = int(os.getenv("ANOMALY_MAX_TRACKED_KEYS", 10000))
+
+    # Eventos recientes en memoria por dispositivo
+    RECENT_EVENTS_PER_DEVICE: int = int(os.getenv("RECENT_EVENTS_PER_DEVICE", 50))
+
+    # Resumen de accesos por usuario
+    USER_ACCESS_SUMMARY_FLUSH_SECONDS: float = float(os.getenv("USER_ACCESS_SUMMARY_FLUSH_SECONDS", 5))
+
+    # Cola de comandos a dispositivos
+    COMMAND_TTL_SECONDS: float = float(os.getenv("COMMAND_TTL_SECONDS", 60))
+    COMMAND_RETRY_BASE_SECONDS: float = float(os.getenv("COMMAND_RETRY_BASE_SECONDS", 2))
+    COMMAND_MAX_ATTEMPTS: int = int(os.getenv("COMMAND_MAX_ATTEMPTS", 5))
+    COMMAND_COALESCE_SECONDS: float = float(os.getenv("COMMAND_COALESCE_SECONDS", 3))
+
+    # Trazas de latencia de comandos (acciones recientes en memoria)
+    COMMAND_TRACE_MAX: int = int(os.getenv("COMMAND_TRACE_MAX", 500))
+
+    # Cola de salida por dispositivo: máximo de avisos masivos en espera
+    DEVICE_OUTBOX_BULK_LIMIT: int = int(os.getenv("DEVICE_OUTBOX_BULK_LIMIT", 100))
+
+    # Comandos a grupos de dispositivos
+    GROUP_COMMAND_DEVICE_TIMEOUT_SECONDS: float = float(os.getenv("GROUP_COMMAND_DEVICE_TIMEOUT_SECONDS", 2))
+    GROUP_COMMAND_DEADLINE_SECONDS: float = float(os.getenv("GROUP_COMMAND_DEADLINE_SECONDS", 5))
+
+    # Claves de idempotencia de eventos enviados por los dispositivos
+    IDEMPOTENCY_TTL_HOURS: float = float(os.getenv("IDEMPOTENCY_TTL_HOURS", 24))
+    IDEMPOTENCY_MEMORY_KEYS: int = int(os.getenv("IDEMPOTENCY_MEMORY_KEYS", 5000))
+
+    # Acciones programadas
+    SCHEDULER_TICK_SECONDS: float = float(os.getenv("SCHEDULER_TICK_SECONDS", 1))
+
+    # Cliente HTTP de WhatsApp (CallMeBot)
+    WHATSAPP_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("WHATSAPP_CONNECT_TIMEOUT_SECONDS", 5))
+    WHATSAPP_READ_TIMEOUT_SECONDS: float = float(os.getenv("WHATSAPP_READ_TIMEOUT_SECONDS", 10))
+    WHATSAPP_MAX_CONNECTIONS: int = int(os.getenv("WHATSAPP_MAX_CONNECTIONS", 10))
+    WHATSAPP_KEEPALIVE_SECONDS: float = float(os.getenv("WHATSAPP_KEEPALIVE_SECONDS", 60))
+
+    # Agrupación de notificaciones de acceso (0 = sin agrupar) y límite de envío
+    NOTIFICATION_DIGEST_WINDOW_SECONDS: float = float(os.getenv("NOTIFICATION_DIGEST_WINDOW_SECONDS", 60))
+    NOTIFICATION_RATE_PER_MINUTE: float = float(os.getenv("NOTIFICATION_RATE_PER_MINUTE", 4))
+    NOTIFICATION_BURST: int = int(os.getenv("NOTIFICATION_BURST", 2))
+    NOTIFICATION_DIGEST_MAX_LINES: int = int(os.getenv("NOTIFICATION_DIGEST_MAX_LINES", 10))
+
+    # Outbox de notificaciones: workers de entrega, reintentos y lease de envíos en curso
+    NOTIFICATION_WORKERS: int = int(os.getenv("NOTIFICATION_WORKERS", 2))
+    NOTIFICATION_MAX_ATTEMPTS: int = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", 6))
+    NOTIFICATION_RETRY_BASE_SECONDS: float = float(os.getenv("NOTIFICATION_RETRY_BASE_SECONDS", 5))
+    NOTIFICATION_LEASE_SECONDS: float = float(os.getenv("NOTIFICATION_LEASE_SECONDS", 300))
+
+    # Proveedor de WhatsApp: callmebot, o local (servidor de pruebas de utils/notification_standin.py)
+    NOTIFICATION_PROVIDER: str = os.getenv("NOTIFICATION_PROVIDER", "callmebot")
+    NOTIFICATION_PROVIDER_URL: str = os.getenv("NOTIFICATION_PROVIDER_URL", "http://127.0.0.1:8090/whatsapp.php")
+
+    # Analítica de accesos
+    ANALYTICS_CACHE_TTL_SECONDS: float = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", 300))
+
 settings = Settings()
\ No newline at end of file
@@ -1,14 +1,24 @@
+import hashlib
 from fastapi import Depends
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, Session  # ✅ Solo SQLAlchemy
+from sqlalchemy.schema import CreateColumn
 from core.config import settings
 
+def _engine_options() -> dict:
+    """Opciones del pool según el motor (SQLite no admite pool_size/max_overflow)."""
+    options = {"echo": settings.DB_ECHO, "pool_pre_ping": True}
+    if not settings.DATABASE_URL.startswith("sqlite"):
+        options["pool_size"] = settings.DB_POOL_SIZE
+        options["max_overflow"] = settings.DB_MAX_OVERFLOW
+    return options
+
 # Motor de conexión a la base de datos
-engine = create_engine(settings.DATABASE_URL, echo=True)
+engine = create_engine(settings.DATABASE_URL, **_engine_options())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def create_db_and_tables():
-    """Crea todas las tablas definidas en los modelos si no existen."""
+def _load_models():
+    """Importa todos los modelos para registrar sus tablas en el metadata."""
     from models.users import User
     from models.devices import Device
     from models.tokens import Token
@@ -16,10 +26,153 @@ def create_db_and_tables():
     from models.actions_devices import ActionDevice
     from models.nfc_cards import NFCCard
     from models.access_pins import AccessPin
+    from models.schema_version import SchemaVersion
+    from models.log_rollups import LogRollup
+    from models.alerts import Alert
+    from models.device_groups import DeviceGroup
+    from models.device_group_members import DeviceGroupMember
+    from models.idempotency_keys import IdempotencyKey
+    from models.scheduled_actions import ScheduledAction
+    from models.notification_outbox import NotificationOutbox
+    from models.group_commands import GroupCommand
 
     # Importar Base de SQLAlchemy desde alguno de los modelos
-    from models.users import User
-    User.metadata.create_all(engine)
+    return User.metadata
+
+def schema_fingerprint(metadata) -> str:
+    """
+    Calcula una huella del esquema declarado en los modelos
+    (tablas, columnas, tipos e índices). Cambia cuando cambian los modelos.
+    """
+    parts = []
+    for table in sorted(metadata.tables.values(), key=lambda t: t.name):
+        for column in table.columns:
+            parts.append(f"{table.name}.{column.name}:{column.type}:{column.nullable}")
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            parts.append(f"{table.name}#{index.name}:{','.join(c.name for c in index.columns)}")
+
+    from core.log_search import SEARCH_INDEX_VERSION
+    parts.append(f"log_search:{SEARCH_INDEX_VERSION}")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+def _stored_schema_version(connection):
+    """Lee la versión de esquema almacenada (None si la tabla aún no existe)."""
+    try:
+        row = connection.execute(
+            text("SELECT version FROM schema_version ORDER BY id DESC LIMIT 1")
+        ).first()
+        return row[0] if row else None
+    except Exception:
+        return None
+
+def _sync_schema(connection, metadata):
+    """
+    Crea tablas faltantes y añade columnas/índices nuevos a tablas existentes.
+    create_all no altera tablas existentes, por eso se completan aquí.
+    """
+    metadata.create_all(connection)
+
+    inspector = inspect(connection)
+    for table in metadata.sorted_tables:
+        existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                if not column.nullable and column.server_default is None:
+                    # Las filas existentes no tendrían valor: el ALTER falla (SQLite) o deja 0/'' (MySQL)
+                    raise RuntimeError(
+                        f"La columna nueva {table.name}.{column.name} es NOT NULL sin server_default; "
+                        "defínala nullable o con sa_column_kwargs={'server_default': ...}"
+                    )
+                column_ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}"))
+                print(f"🧱 Columna añadida: {table.name}.{column.name}")
+
+        existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name and index.name not in existing_indexes:
+                index.create(connection)
+                print(f"🧱 Índice creado: {index.name}")
+
+    # Índice de texto completo sobre logs.event (DDL específico del motor)
+    from core.log_search import ensure_search_index
+    ensure_search_index(connection)
+
+def create_db_and_tables() -> dict:
+    """
+    Inicializa el esquema de la base de datos.
+
+    Compara la huella de los modelos con la versión almacenada en
+    `schema_version` y solo ejecuta DDL cuando difieren.
+    """
+    metadata = _load_models()
+    version = schema_fingerprint(metadata)
+
+    with engine.begin() as connection:
+        stored = _stored_schema_version(connection)
+        if stored == version:
+            return {"schema_version": version[:12], "ddl_executed": False}
+
+        _sync_schema(connection, metadata)
+        connection.execute(
+            text("INSERT INTO schema_version (version, applied_at) VALUES (:version, CURRENT_TIMESTAMP)"),
+            {"version": version},
+        )
+
+    return {"schema_version": version[:12], "ddl_executed": True}
+
+def warm_up_pool(connections: int) -> int:
+    """
+    Abre por adelantado `connections` conexiones del pool para que las
+    primeras peticiones no paguen el coste de conexión.
+    """
+    opened = []
+    try:
+        for _ in range(max(connections, 0)):
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            opened.append(conn)
+    finally:
+        for conn in opened:
+            conn.close()  # Devuelve la conexión al pool, no la cierra
+    return len(opened)
+
+def upsert_increment(connection, table, rows, key_columns, increment_columns):
+    """
+    Inserta filas o, si la clave ya existe, suma los valores de `increment_columns`.
+    Usa el upsert nativo del motor (executemany en una sola sentencia).
+    """
+    if not rows:
+        return
+
+    dialect = connection.dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        stmt = stmt.on_duplicate_key_update({
+            col: table.c[col] + stmt.inserted[col] for col in increment_columns
+        })
+        connection.execute(stmt, rows)
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={col: table.c[col] + stmt.excluded[col] for col in increment_columns},
+        )
+        connection.execute(stmt, rows)
+    else:
+        for row in rows:
+            condition = [table.c[col] == row[col] for col in key_columns]
+            result = connection.execute(
+                table.update().where(*condition).values({
+                    col: table.c[col] + row[col] for col in increment_columns
+                })
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(**row))
 
 def get_session():
     """Generador para obtener la sesión de la base de datos."""
@@ -27,4 +180,4 @@ def get_session():
     try:
         yield session
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
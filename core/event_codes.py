@@ -0,0 +1,308 @@
+"""
+Códigos de evento de los logs.
+
+Cada log guarda un código entero pequeño (`event_code`) y sus parámetros en
+columnas tipadas (id_user, id_subject_user, id_card, id_action). El texto se
+genera al leer a partir de la plantilla del código; `Log.event` solo guarda
+un detalle libre corto (por ejemplo, el nombre que envía el dispositivo) o "".
+
+Los logs anteriores a los códigos tienen `event_code` NULL y conservan su
+texto completo; `migrate_legacy_events` los convierte.
+"""
+import re
+import unicodedata
+from enum import IntEnum
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models.actions_devices import ActionDevice
+from models.logs import Log
+from models.nfc_cards import NFCCard
+from models.users import User
+
+
+class EventCode(IntEnum):
+    OTHER = 0
+
+    # Autenticación
+    USER_REGISTERED = 10
+    LOGIN_SUCCESS = 11
+    LOGOUT = 12
+    TOKEN_REFRESHED = 13
+    PASSWORD_CHANGED = 14
+
+    # Seguridad
+    SECURITY_LOGIN_FAILED = 20
+    SECURITY_LOGIN_SUCCESS = 21
+    SECURITY_PASSWORD_CHANGE_FAILED = 22
+    SECURITY_PASSWORD_CHANGED = 23
+    SECURITY_OTHER = 29
+
+    # Credenciales
+    PIN_CREATED = 30
+    NFC_CARD_CREATED = 31
+
+    # Accesos
+    ACCESS_PIN = 40
+    ACCESS_NFC_CARD = 41
+    ACCESS_NFC_LOCAL = 42
+    LOCAL_DOOR_OPEN = 43
+    LOCAL_GARAGE_OPEN = 44
+    LOCAL_OTHER = 45
+    ACCESS_PIN_DENIED = 46
+    ACCESS_NFC_DENIED = 47
+
+    # Acciones remotas
+    ACTION_CREATED = 50
+    ACTION_EXECUTED = 51
+    ACTION_NOT_EXECUTED = 52
+    ACTION_DEVICE_CONFIRMED = 53
+    ACTION_EXPIRED = 54
+    SCHEDULED_ACTION_MISSED = 55
+
+
+# Plantilla y estado resumido de cada código (None = se deduce del detalle)
+EVENT_DEFINITIONS: Dict[int, Tuple[str, Optional[str]]] = {
+    EventCode.OTHER: ("{detail}", None),
+    EventCode.USER_REGISTERED: ("Usuario registrado: {username}", "informativo"),
+    EventCode.LOGIN_SUCCESS: ("Login exitoso - Usuario: {username}", "exitoso"),
+    EventCode.LOGOUT: ("Logout exitoso", "exitoso"),
+    EventCode.TOKEN_REFRESHED: ("Token renovado exitosamente", "exitoso"),
+    EventCode.PASSWORD_CHANGED: ("Contraseña cambiada exitosamente", "exitoso"),
+    EventCode.SECURITY_LOGIN_FAILED: ("SEGURIDAD: Intento de login fallido - Usuario: {username}", "fallido"),
+    EventCode.SECURITY_LOGIN_SUCCESS: ("SEGURIDAD: Login exitoso", "exitoso"),
+    EventCode.SECURITY_PASSWORD_CHANGE_FAILED: ("SEGURIDAD: Intento de cambio de contraseña fallido", "fallido"),
+    EventCode.SECURITY_PASSWORD_CHANGED: ("SEGURIDAD: Contraseña cambiada exitosamente", "exitoso"),
+    EventCode.SECURITY_OTHER: ("SEGURIDAD: {detail}", None),
+    EventCode.PIN_CREATED: ("PIN de acceso creado para usuario {subject_name}", "informativo"),
+    EventCode.NFC_CARD_CREATED: ("Tarjeta NFC '{card_name}' creada para usuario {subject_name}", "informativo"),
+    EventCode.ACCESS_PIN: ("Acceso concedido vía PIN - Usuario: {user_name}", "exitoso"),
+    EventCode.ACCESS_NFC_CARD: ("Acceso concedido vía NFC - Tarjeta: {card_name}", "exitoso"),
+    EventCode.ACCESS_NFC_LOCAL: ("Acceso concedido vía NFC - Usuario: {detail}", "exitoso"),
+    EventCode.LOCAL_DOOR_OPEN: ("Acceso {access_type}: {detail} abrió PUERTA PRINCIPAL", "exitoso"),
+    EventCode.LOCAL_GARAGE_OPEN: ("Acceso {access_type}: {detail} abrió GARAJE", "exitoso"),
+    EventCode.LOCAL_OTHER: ("Acceso {access_type}: {detail}", "informativo"),
+    EventCode.ACCESS_PIN_DENIED: ("Acceso denegado vía PIN - {detail}", "fallido"),
+    EventCode.ACCESS_NFC_DENIED: ("Acceso denegado vía NFC - {detail}", "fallido"),
+    EventCode.ACTION_CREATED: ("Acción '{action}' creada para dispositivo {id_device}", "informativo"),
+    EventCode.ACTION_EXECUTED: ("Acción ejecutada correctamente", "exitoso"),
+    EventCode.ACTION_NOT_EXECUTED: ("Acción marcada como no ejecutada", "informativo"),
+    EventCode.ACTION_DEVICE_CONFIRMED: ("Dispositivo confirmó ejecución de acción '{action}'", "exitoso"),
+    EventCode.ACTION_EXPIRED: ("Acción '{action}' expiró sin confirmación del dispositivo ({detail})", "fallido"),
+    EventCode.SCHEDULED_ACTION_MISSED: ("Acción programada omitida: {detail}", "fallido"),
+}
+
+# Accesos concedidos con una credencial (tarjeta, PIN o NFC del dispositivo)
+CREDENTIAL_ACCESS_CODES = frozenset({
+    EventCode.ACCESS_PIN, EventCode.ACCESS_NFC_CARD, EventCode.ACCESS_NFC_LOCAL,
+})
+ACCESS_GRANTED_CODES = CREDENTIAL_ACCESS_CODES | {EventCode.LOCAL_DOOR_OPEN, EventCode.LOCAL_GARAGE_OPEN}
+ACCESS_DENIED_CODES = frozenset({EventCode.ACCESS_PIN_DENIED, EventCode.ACCESS_NFC_DENIED})
+
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+_PLACEHOLDER_PATTERNS = {"id_device": r"\d+", "access_type": r"\w+"}
+UNKNOWN_NAME = "desconocido"
+
+
+def event_status(event_code: Optional[int]) -> Optional[str]:
+    """Estado fijo del código, o None si depende del detalle."""
+    definition = EVENT_DEFINITIONS.get(event_code) if event_code is not None else None
+    return definition[1] if definition else None
+
+
+# ---------------------- BÚSQUEDA POR TIPO ----------------------
+def _fold(value: str) -> str:
+    normalized = unicodedata.normalize("NFKD", value.lower())
+    return "".join(c for c in normalized if not unicodedata.combining(c))
+
+
+_TEMPLATE_TEXT = {
+    code: _fold(_PLACEHOLDER.sub(" ", template))
+    for code, (template, _) in EVENT_DEFINITIONS.items()
+}
+
+
+def codes_matching(token: str) -> List[int]:
+    """Códigos cuya plantilla contiene la palabra (sin distinguir tildes)."""
+    token = _fold(token)
+    return [int(code) for code, text in _TEMPLATE_TEXT.items() if token in text]
+
+
+def codes_with_placeholder(name: str) -> List[int]:
+    """Códigos cuya plantilla muestra el valor `{name}` (por ejemplo, user_name)."""
+    marker = "{" + name + "}"
+    return [int(code) for code, (template, _) in EVENT_DEFINITIONS.items() if marker in template]
+
+
+# ---------------------- RENDERIZADO ----------------------
+class _Values(dict):
+    def __init__(self, detail: str, **values):
+        super().__init__(**values)
+        self.detail = detail
+
+    def __missing__(self, key):
+        if key == "detail":
+            return self.detail
+        return self.detail or UNKNOWN_NAME
+
+
+class EventRenderer:
+    """
+    Genera el texto de los logs a partir de su código. Carga en bloque los
+    nombres de usuarios, tarjetas y acciones referenciados (una consulta por
+    tabla y lote) y los mantiene en caché durante la petición.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+        self.users: Dict[int, Tuple[str, str]] = {}
+        self.cards: Dict[int, str] = {}
+        self.actions: Dict[int, str] = {}
+
+    def prime(self, rows: Iterable):
+        rows = [r for r in rows if getattr(r, "event_code", None) is not None]
+        user_ids = {
+            uid for r in rows
+            for uid in (r.id_user, r.id_subject_user) if uid is not None
+        } - self.users.keys()
+        card_ids = {r.id_card for r in rows if r.id_card is not None} - self.cards.keys()
+        action_ids = {r.id_action for r in rows if r.id_action is not None} - self.actions.keys()
+
+        if user_ids:
+            for uid, username, name in self.session.query(User.id, User.username, User.name).filter(User.id.in_(user_ids)):
+                self.users[uid] = (username, name)
+        if card_ids:
+            self.cards.update(self.session.query(NFCCard.id, NFCCard.card_name).filter(NFCCard.id.in_(card_ids)).all())
+        if action_ids:
+            self.actions.update(
+                self.session.query(ActionDevice.id, ActionDevice.action).filter(ActionDevice.id.in_(action_ids)).all()
+            )
+
+    def render(self, row) -> str:
+        event_code = getattr(row, "event_code", None)
+        detail = row.event or ""
+        if event_code is None or event_code not in EVENT_DEFINITIONS:
+            return detail  # Log anterior a los códigos: texto completo
+
+        values = _Values(detail, id_device=row.id_device, access_type=row.access_type)
+        if row.id_user in self.users:
+            values["username"], values["user_name"] = self.users[row.id_user]
+        if row.id_subject_user in self.users:
+            values["subject_name"] = self.users[row.id_subject_user][1]
+        if row.id_card in self.cards:
+            values["card_name"] = self.cards[row.id_card]
+        if row.id_action in self.actions:
+            values["action"] = self.actions[row.id_action]
+        text = EVENT_DEFINITIONS[event_code][0].format_map(values)
+        occurrences = getattr(row, "occurrences", None) or 1
+        if occurrences > 1:
+            text += f" (x{occurrences})"
+        return text[:255]
+
+    def render_all(self, rows: List) -> List[str]:
+        self.prime(rows)
+        return [self.render(row) for row in rows]
+
+
+# ---------------------- MIGRACIÓN ----------------------
+def _template_regex(template: str):
+    pattern, pos = "", 0
+    for match in _PLACEHOLDER.finditer(template):
+        pattern += re.escape(template[pos:match.start()])
+        name = match.group(1)
+        pattern += f"(?P<{name}>{_PLACEHOLDER_PATTERNS.get(name, '.+?')})"
+        pos = match.end()
+    pattern += re.escape(template[pos:])
+    return re.compile(pattern + r"\Z", re.DOTALL)
+
+
+# Las plantillas genéricas ({detail} solo) se prueban al final
+_PARSERS = sorted(
+    ((code, _template_regex(template)) for code, (template, _) in EVENT_DEFINITIONS.items()),
+    key=lambda item: item[0] in (EventCode.OTHER, EventCode.SECURITY_OTHER),
+)
+
+
+def parse_event(text: str) -> Tuple[int, Dict[str, str]]:
+    """Código y parámetros de un texto de log heredado."""
+    for code, regex in _PARSERS:
+        match = regex.match(text or "")
+        if match:
+            return int(code), match.groupdict()
+    return int(EventCode.OTHER), {"detail": text or ""}
+
+
+def _unique_lookup(session: Session, column, id_column, value: str) -> Optional[int]:
+    ids = [row[0] for row in session.query(id_column).filter(column == value).limit(2).all()]
+    return ids[0] if len(ids) == 1 else None
+
+
+def migrate_legacy_events(session: Session, chunk_size: int = 2000) -> Dict[str, int]:
+    """
+    Convierte los logs sin `event_code` analizando su texto. Los nombres se
+    resuelven a ids cuando son únicos; si no, quedan como detalle. Procesa
+    por lotes con un commit por lote, así que puede interrumpirse y repetirse.
+    """
+    by_code: Dict[str, int] = {}
+    migrated = 0
+    last_id = 0
+    while True:
+        logs = (
+            session.query(Log)
+            .filter(Log.event_code.is_(None), Log.id > last_id)
+            .order_by(Log.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not logs:
+            break
+
+        names: Dict[tuple, Optional[int]] = {}
+
+        def resolve(kind: str, value: str) -> Optional[int]:
+            key = (kind, value)
+            if key not in names:
+                if kind == "username":
+                    names[key] = _unique_lookup(session, User.username, User.id, value)
+                elif kind == "name":
+                    names[key] = _unique_lookup(session, User.name, User.id, value)
+                else:
+                    names[key] = _unique_lookup(session, NFCCard.card_name, NFCCard.id, value)
+            return names[key]
+
+        for log in logs:
+            code, params = parse_event(log.event)
+            resolved = {}
+            unresolved = []
+            for placeholder, column, kind in (
+                ("username", "id_user", "username"),
+                ("user_name", "id_user", "name"),
+                ("subject_name", "id_subject_user", "name"),
+                ("card_name", "id_card", "card"),
+            ):
+                if placeholder not in params or (column == "id_user" and log.id_user is not None):
+                    continue
+                resolved[column] = resolve(kind, params[placeholder])
+                if resolved[column] is None:
+                    unresolved.append(params[placeholder])
+
+            if len(unresolved) > 1:
+                # Un solo detalle no alcanza para varios nombres: se conserva el texto
+                code, detail = int(EventCode.OTHER), log.event or ""
+            else:
+                detail = unresolved[0] if unresolved else params.get("detail", "")
+                for column, value in resolved.items():
+                    if value is not None:
+                        setattr(log, column, value)
+
+            log.event_code = code
+            log.event = detail[:255]
+            by_code[EventCode(code).name] = by_code.get(EventCode(code).name, 0) + 1
+
+        last_id = logs[-1].id
+        migrated += len(logs)
+        session.commit()
+        session.expunge_all()
+
+    return {"migrated": migrated, "by_code": by_code}
@@ -0,0 +1,119 @@
+"""
+Comandos a grupos de dispositivos (bloqueo de emergencia, "abrir todo").
+
+Un comando de grupo crea una acción por dispositivo en la cola de comandos
+(core/command_queue.py) y las envía en paralelo: todos los dispositivos
+reciben la orden en un solo tiempo de ida y vuelta en lugar de N. Después
+espera las confirmaciones hasta el plazo global y devuelve el estado de
+cada dispositivo. Los comandos que no alcanzaron a confirmarse siguen en la
+cola (reintentos, entrega al reconectar), y su estado se puede volver a
+consultar con el id del comando de grupo: el comando queda en
+`group_commands` y cada acción lo referencia en `id_group_command`, así que
+la consulta funciona desde cualquier proceso y después de un reinicio.
+"""
+import time
+import uuid
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from core.command_queue import command_queue
+from core.config import settings
+from core.event_codes import EventCode
+from models.actions_devices import ActionDevice
+from models.group_commands import GroupCommand
+from models.logs import Log
+
+
+class GroupCommandService:
+    async def dispatch(
+        self,
+        session: Session,
+        group,
+        device_ids: List[int],
+        action: str,
+        id_user: int,
+        device_timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> dict:
+        device_timeout = device_timeout or settings.GROUP_COMMAND_DEVICE_TIMEOUT_SECONDS
+        deadline = deadline or settings.GROUP_COMMAND_DEADLINE_SECONDS
+        started = time.perf_counter()
+
+        command_id = uuid.uuid4().hex[:12]
+        command = GroupCommand(
+            id=command_id, id_group=group.id, group_name=group.name, action=action, id_user=id_user,
+        )
+        session.add(command)
+        # El comando de grupo se guarda en la misma transacción que sus acciones
+        rows, acks = await command_queue.enqueue_many(session, device_ids, action, device_timeout, command_id)
+        try:
+            session.add_all([
+                Log(
+                    id_device=row.id_device,
+                    id_user=id_user,
+                    id_action=row.id,
+                    event_code=EventCode.ACTION_CREATED,
+                    access_type="remote",
+                )
+                for row in rows
+            ])
+            session.commit()
+        except Exception:
+            command_queue.unwatch_acks(acks)
+            raise
+
+        sent_ms = round((time.perf_counter() - started) * 1000, 1)
+        remaining = deadline - (time.perf_counter() - started)
+        await command_queue.wait_for_acks(acks, remaining)
+
+        # Cerrar la transacción para leer las confirmaciones hechas en otras sesiones
+        session.commit()
+        result = self.status(session, command_id)
+        result["sent_ms"] = sent_ms
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        print(
+            f"📡 Comando de grupo {action} → '{group.name}': "
+            f"{result['confirmed']}/{result['total']} confirmados en {result['elapsed_ms']} ms"
+        )
+        return result
+
+    def status(self, session: Session, command_id: str) -> Optional[dict]:
+        """Estado actual de cada dispositivo del comando (leído de actions_devices)."""
+        command = session.get(GroupCommand, command_id)
+        if command is None:
+            return None
+
+        rows = (
+            session.query(ActionDevice)
+            .filter(ActionDevice.id_group_command == command_id)
+            .order_by(ActionDevice.id_device)
+            .all()
+        )
+        devices = []
+        counts = {"confirmed": 0, "sent": 0, "pending": 0, "expired": 0}
+        for row in rows:
+            counts[row.status] = counts.get(row.status, 0) + 1
+            devices.append({
+                "id_device": row.id_device,
+                "action_id": row.id,
+                "status": row.status,
+                "attempts": row.attempts,
+                "last_sent_at": row.last_sent_at,
+            })
+
+        return {
+            "id": command.id,
+            "id_group": command.id_group,
+            "group_name": command.group_name,
+            "action": command.action,
+            "created_at": command.created_at,
+            "total": len(devices),
+            **counts,
+            "complete": counts["confirmed"] == len(devices),
+            "devices": devices,
+        }
+
+
+# Instancia global
+group_commands = GroupCommandService()
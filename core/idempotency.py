@@ -0,0 +1,247 @@
+"""
+Idempotencia de los eventos que envían los dispositivos.
+
+El ESP32 reintenta /actions/access-log cuando vence su timeout de 10 s,
+aunque el servidor sí haya procesado la petición. Cada evento puede traer
+una clave: la cabecera `Idempotency-Key` o el número de secuencia del
+dispositivo (`seq`, junto con la hora del evento si la envía, para que un
+contador reiniciado tras un reboot no choque con eventos viejos). La clave
+es la misma en /actions/access-log y en el lote.
+
+Con la clave se guarda un hash del evento (`payload_hash`): si la misma
+clave llega con otro evento (por ejemplo, un contador reiniciado sin hora
+del dispositivo) se rechaza con `IdempotencyConflict` en lugar de devolver
+la respuesta del evento anterior y perder el nuevo.
+
+- La tabla `idempotency_keys` tiene la clave única: la fila se inserta en la
+  misma transacción que el log, así que aunque dos workers reciban el mismo
+  reintento, solo uno lo procesa. Guarda la respuesta original.
+- En memoria se mantiene una ventana acotada (LRU) de claves recientes y las
+  peticiones en curso: un reintento que llega mientras la original aún se
+  procesa espera su resultado en lugar de repetir inserciones y WhatsApp.
+- Las claves se conservan IDEMPOTENCY_TTL_HOURS horas.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.database import engine
+from core.time_utils import to_naive_utc
+from models.idempotency_keys import IdempotencyKey
+
+
+class IdempotencyConflict(Exception):
+    """La clave ya se usó para un evento distinto."""
+
+    def __init__(self, key: str):
+        super().__init__(f"La clave {key} ya se usó para otro evento")
+        self.key = key
+
+
+def _same_payload(stored_hash: Optional[str], payload_hash: Optional[str]) -> bool:
+    # Las claves guardadas sin hash (versiones anteriores) no se pueden comparar
+    return stored_hash is None or payload_hash is None or stored_hash == payload_hash
+
+
+class IdempotencyStore:
+    def __init__(self, ttl_hours: float, max_keys: int):
+        self.ttl = timedelta(hours=ttl_hours)
+        self.max_keys = max(max_keys, 1)
+        # clave -> (guardada en, respuesta, hash del evento)
+        self._recent: "OrderedDict[str, Tuple[datetime, dict, Optional[str]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "db_hits": 0, "waited": 0, "stored": 0, "purged": 0, "conflicts": 0}
+
+    @staticmethod
+    def make_key(
+        id_device: int,
+        seq: Optional[int] = None,
+        client_key: Optional[str] = None,
+        device_timestamp: Optional[datetime] = None,
+    ) -> Optional[str]:
+        """Clave del evento, o None si el dispositivo no envió ni clave ni secuencia."""
+        if client_key and client_key.strip():
+            return f"{id_device}:k:{client_key.strip()[:140]}"
+        if seq is not None:
+            key = f"{id_device}:s:{seq}"
+            if device_timestamp is not None:
+                key += ":" + to_naive_utc(device_timestamp).strftime("%Y%m%d%H%M%S")
+            return key
+        return None
+
+    @staticmethod
+    def payload_hash(id_device: int, event) -> str:
+        """Hash del contenido del evento (AccessLogCreate o AccessLogEvent), igual en ambos endpoints."""
+        device_timestamp = getattr(event, "device_timestamp", None)
+        content = json.dumps([
+            id_device,
+            event.action,
+            event.id_user,
+            event.access_type,
+            event.user_name,
+            to_naive_utc(device_timestamp).isoformat() if device_timestamp is not None else None,
+        ])
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def _check(self, key: str, stored_hash: Optional[str], payload_hash: Optional[str]):
+        if not _same_payload(stored_hash, payload_hash):
+            self.stats["conflicts"] += 1
+            raise IdempotencyConflict(key)
+
+    # ---------------------- MEMORIA ----------------------
+    def remember(self, key: str, response: dict, payload_hash: Optional[str] = None):
+        with self._lock:
+            self._recent[key] = (datetime.utcnow(), response, payload_hash)
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.max_keys:
+                self._recent.popitem(last=False)
+
+    def lookup(self, key: str) -> Optional[Tuple[dict, Optional[str]]]:
+        """(respuesta original, hash del evento) de una clave reciente en memoria."""
+        with self._lock:
+            entry = self._recent.get(key)
+            if entry is None:
+                return None
+            if datetime.utcnow() - entry[0] > self.ttl:
+                del self._recent[key]
+                return None
+            self.stats["memory_hits"] += 1
+            return entry[1], entry[2]
+
+    async def claim(self, key: str, payload_hash: Optional[str] = None) -> Optional[dict]:
+        """
+        Devuelve la respuesta original si la clave ya se procesó en este worker
+        (esperando a la petición en curso si la hay). Si no, reserva la clave
+        y devuelve None: el llamador debe terminar con `complete` o `release`.
+        Lanza IdempotencyConflict si la clave se usó para otro evento.
+        """
+        while True:
+            previous = self.lookup(key)
+            if previous is not None:
+                response, stored_hash = previous
+                self._check(key, stored_hash, payload_hash)
+                return response
+            future = self._inflight.get(key)
+            if future is None:
+                self._inflight[key] = asyncio.get_running_loop().create_future()
+                return None
+            self.stats["waited"] += 1
+            await asyncio.shield(future)
+
+    def complete(self, key: str, response: dict, payload_hash: Optional[str] = None):
+        self.remember(key, response, payload_hash)
+        self._finish(key)
+
+    def release(self, key: str):
+        """La petición falló: los reintentos en espera vuelven a intentarlo."""
+        self._finish(key)
+
+    def _finish(self, key: str):
+        future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    # ---------------------- BASE DE DATOS ----------------------
+    def insert_key(
+        self, session: Session, key: str, id_device: int, payload_hash: Optional[str] = None
+    ) -> Tuple[Optional[IdempotencyKey], Optional[dict]]:
+        """
+        Inserta la clave en la transacción de la sesión. Devuelve (fila, None) si
+        es nueva o (None, respuesta original) si otro proceso ya la registró.
+        Lanza IdempotencyConflict si la clave registrada es de otro evento.
+        """
+        for _ in range(2):
+            row = IdempotencyKey(key=key, id_device=id_device, payload_hash=payload_hash)
+            session.add(row)
+            try:
+                session.flush()
+                self.stats["stored"] += 1
+                return row, None
+            except IntegrityError:
+                session.rollback()
+
+            existing = session.query(IdempotencyKey).filter(IdempotencyKey.key == key).first()
+            if existing is None:
+                continue
+            if datetime.utcnow() - existing.created_at > self.ttl:
+                # Clave vencida que la limpieza aún no borró: se reutiliza
+                session.delete(existing)
+                session.commit()
+                continue
+            self._check(key, existing.payload_hash, payload_hash)
+            self.stats["db_hits"] += 1
+            return None, json.loads(existing.response or "{}")
+        raise RuntimeError(f"No se pudo registrar la clave de idempotencia {key}")
+
+    def lookup_many(self, session: Session, payload_hashes: Dict[str, Optional[str]]) -> Tuple[Dict[str, dict], Set[str]]:
+        """
+        Para las claves {clave: hash del evento} de un lote devuelve las respuestas
+        originales de las ya procesadas (memoria y luego base) y las claves que
+        se usaron para otro evento.
+        """
+        found = {}
+        conflicts = set()
+        missing = []
+
+        def resolve(key: str, response: dict, stored_hash: Optional[str]):
+            if _same_payload(stored_hash, payload_hashes[key]):
+                found[key] = response
+            else:
+                conflicts.add(key)
+                self.stats["conflicts"] += 1
+
+        for key in payload_hashes:
+            previous = self.lookup(key)
+            if previous is not None:
+                resolve(key, *previous)
+            else:
+                missing.append(key)
+        if missing:
+            cutoff = datetime.utcnow() - self.ttl
+            for key, response, stored_hash in (
+                session.query(IdempotencyKey.key, IdempotencyKey.response, IdempotencyKey.payload_hash)
+                .filter(IdempotencyKey.key.in_(missing), IdempotencyKey.created_at >= cutoff)
+            ):
+                self.stats["db_hits"] += 1
+                resolve(key, json.loads(response or "{}"), stored_hash)
+        return found, conflicts
+
+    def purge(self) -> int:
+        """Borra las claves vencidas de la tabla y de la memoria."""
+        cutoff = datetime.utcnow() - self.ttl
+        table = IdempotencyKey.__table__
+        with engine.begin() as connection:
+            deleted = connection.execute(table.delete().where(table.c.created_at < cutoff)).rowcount or 0
+        with self._lock:
+            for key in [key for key, (stored_at, _, _) in self._recent.items() if stored_at < cutoff]:
+                del self._recent[key]
+        self.stats["purged"] += deleted
+        return deleted
+
+    async def run(self, interval_seconds: float = 3600):
+        """Tarea de fondo: limpieza periódica de claves vencidas."""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                deleted = await asyncio.to_thread(self.purge)
+                if deleted:
+                    print(f"🧹 {deleted} claves de idempotencia vencidas eliminadas")
+            except Exception as e:
+                print(f"❌ Error limpiando claves de idempotencia: {e}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "in_memory": len(self._recent), "in_flight": len(self._inflight)}
+
+
+# Instancia global
+idempotency = IdempotencyStore(settings.IDEMPOTENCY_TTL_HOURS, settings.IDEMPOTENCY_MEMORY_KEYS)
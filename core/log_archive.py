@@ -0,0 +1,448 @@
+"""
+Retención de logs con archivos comprimidos por mes.
+
+Los logs más antiguos que LOG_RETENTION_DAYS se mueven de la tabla `logs` a
+archivos `.lga` en LOG_ARCHIVE_DIR, uno por mes y ejecución. Cada archivo se
+divide en bloques columnares comprimidos con zlib y termina con un índice
+JSON (rango de ids, rango de fechas y dispositivos por bloque). La lectura
+usa mmap: solo se descomprimen los bloques que pueden contener resultados.
+
+Formato:
+    b"LGA1" | bloque 0 | bloque 1 | ... | índice JSON | len(índice) u64 | b"LGA1"
+
+Columnas de cada bloque (little-endian, en este orden):
+    id int64, timestamp int64 (µs UTC), id_device int32, id_user int32 (-1 = NULL),
+    id_action int32 (-1 = NULL), access_type uint8 (código del índice),
+    [versión 2: event_code int16 (-1 = NULL)],
+    [versión 3: occurrences int32],
+    offsets de evento int32[n+1], eventos UTF-8 concatenados
+
+El texto de los eventos se guarda ya generado (con los nombres vigentes al
+archivar), de modo que el archivo no depende de usuarios o tarjetas.
+"""
+import asyncio
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.database import SessionLocal
+from core.event_codes import EventRenderer
+from core.log_rollups import classify_status
+from models.logs import Log
+
+MAGIC = b"LGA1"
+FORMAT_VERSION = 3
+FOOTER = struct.Struct("<Q4s")
+BLOCK_ROWS = 8192
+EPOCH = datetime(1970, 1, 1)
+NULL_ID = -1
+
+
+def _np():
+    # numpy solo se importa cuando se archiva o se consulta el archivo
+    import numpy as np
+    return np
+
+
+def _to_micros(ts: datetime) -> int:
+    return (ts - EPOCH) // timedelta(microseconds=1)
+
+
+def _month_start(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, 1)
+
+
+def _next_month(ts: datetime) -> datetime:
+    return datetime(ts.year + (ts.month == 12), ts.month % 12 + 1, 1)
+
+
+# ---------------------- ESCRITURA ----------------------
+class _ArchiveWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.file = open(self.tmp_path, "wb")
+        self.file.write(MAGIC)
+        self.blocks: List[dict] = []
+        self.access_types: List[str] = []
+        self.ids: List[int] = []
+
+    def _access_code(self, access_type: str) -> int:
+        if access_type not in self.access_types:
+            self.access_types.append(access_type)
+        return self.access_types.index(access_type)
+
+    def write_block(self, rows: List[tuple]):
+        np = _np()
+        ids = np.array([r[0] for r in rows], dtype="<i8")
+        ts = np.array([_to_micros(r[1]) for r in rows], dtype="<i8")
+        devices = np.array([r[2] for r in rows], dtype="<i4")
+        users = np.array([NULL_ID if r[3] is None else r[3] for r in rows], dtype="<i4")
+        actions = np.array([NULL_ID if r[4] is None else r[4] for r in rows], dtype="<i4")
+        access = np.array([self._access_code(r[5] or "") for r in rows], dtype="<u1")
+        codes = np.array([NULL_ID if r[6] is None else r[6] for r in rows], dtype="<i2")
+        occurrences = np.array([r[7] or 1 for r in rows], dtype="<i4")
+
+        encoded = [(r[8] or "").encode("utf-8") for r in rows]
+        offsets = np.zeros(len(rows) + 1, dtype="<i4")
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+
+        payload = b"".join([
+            ids.tobytes(), ts.tobytes(), devices.tobytes(), users.tobytes(),
+            actions.tobytes(), access.tobytes(), codes.tobytes(), occurrences.tobytes(),
+            offsets.tobytes(), b"".join(encoded),
+        ])
+        compressed = zlib.compress(payload, 6)
+
+        self.blocks.append({
+            "offset": self.file.tell(),
+            "length": len(compressed),
+            "rows": len(rows),
+            "id_min": int(ids.min()),
+            "id_max": int(ids.max()),
+            "ts_min": int(ts.min()),
+            "ts_max": int(ts.max()),
+            "devices": sorted(int(d) for d in np.unique(devices)),
+        })
+        self.file.write(compressed)
+        self.ids.extend(int(i) for i in ids)
+
+    def close(self) -> Optional[dict]:
+        if not self.blocks:
+            self.file.close()
+            os.remove(self.tmp_path)
+            return None
+
+        index = {
+            "version": FORMAT_VERSION,
+            "rows": sum(b["rows"] for b in self.blocks),
+            "access_types": self.access_types,
+            "id_min": min(b["id_min"] for b in self.blocks),
+            "id_max": max(b["id_max"] for b in self.blocks),
+            "ts_min": min(b["ts_min"] for b in self.blocks),
+            "ts_max": max(b["ts_max"] for b in self.blocks),
+            "blocks": self.blocks,
+        }
+        index_bytes = json.dumps(index).encode("utf-8")
+        self.file.write(index_bytes)
+        self.file.write(FOOTER.pack(len(index_bytes), MAGIC))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+        return index
+
+
+# ---------------------- LECTURA ----------------------
+class ArchiveFile:
+    """Archivo .lga abierto con mmap; el índice se lee una sola vez."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        index_len, magic = FOOTER.unpack(self._mm[-FOOTER.size:])
+        if magic != MAGIC or self._mm[:4] != MAGIC:
+            raise ValueError(f"Archivo de logs inválido: {path}")
+        start = len(self._mm) - FOOTER.size - index_len
+        self.index = json.loads(self._mm[start:start + index_len])
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def read_block(self, block: dict) -> Dict[str, object]:
+        np = _np()
+        n = block["rows"]
+        raw = zlib.decompress(self._mm[block["offset"]:block["offset"] + block["length"]])
+        columns = {}
+        pos = 0
+        layout = [("id", "<i8"), ("ts", "<i8"), ("id_device", "<i4"),
+                  ("id_user", "<i4"), ("id_action", "<i4"), ("access", "<u1")]
+        if self.index.get("version", 1) >= 2:
+            layout.append(("event_code", "<i2"))
+        if self.index.get("version", 1) >= 3:
+            layout.append(("occurrences", "<i4"))
+        for name, dtype in layout:
+            size = n * np.dtype(dtype).itemsize
+            columns[name] = np.frombuffer(raw, dtype=dtype, count=n, offset=pos)
+            pos += size
+        columns["offsets"] = np.frombuffer(raw, dtype="<i4", count=n + 1, offset=pos)
+        pos += (n + 1) * 4
+        columns["events"] = raw[pos:]
+        if "event_code" not in columns:
+            columns["event_code"] = np.full(n, NULL_ID, dtype="<i2")
+        if "occurrences" not in columns:
+            columns["occurrences"] = np.ones(n, dtype="<i4")
+        return columns
+
+    def event_at(self, columns, i: int) -> str:
+        offsets = columns["offsets"]
+        return columns["events"][offsets[i]:offsets[i + 1]].decode("utf-8")
+
+
+class LogArchiveStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._files: Dict[str, ArchiveFile] = {}
+        self._lock = threading.Lock()
+
+    # ---------- Archivos ----------
+    def _paths(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".lga")
+        )
+
+    def files(self) -> List[ArchiveFile]:
+        """Archivos abiertos, del más reciente al más antiguo."""
+        with self._lock:
+            paths = self._paths()
+            for path in list(self._files):
+                if path not in paths:
+                    self._files.pop(path).close()
+            for path in paths:
+                if path not in self._files:
+                    try:
+                        self._files[path] = ArchiveFile(path)
+                    except Exception as e:
+                        print(f"⚠️ Archivo de logs ignorado {path}: {e}")
+            return sorted(self._files.values(), key=lambda f: f.index["ts_max"], reverse=True)
+
+    # ---------- Consulta ----------
+    def _block_mask(self, archive: ArchiveFile, block: dict, columns, filters: dict):
+        np = _np()
+        mask = np.ones(block["rows"], dtype=bool)
+        if filters.get("id_device"):
+            mask &= columns["id_device"] == filters["id_device"]
+        if filters.get("id_action"):
+            mask &= columns["id_action"] == filters["id_action"]
+        if filters.get("event_code") is not None:
+            mask &= columns["event_code"] == filters["event_code"]
+        if filters.get("access_type"):
+            access_types = archive.index["access_types"]
+            if filters["access_type"] not in access_types:
+                return np.zeros(block["rows"], dtype=bool)
+            mask &= columns["access"] == access_types.index(filters["access_type"])
+        if filters.get("start_ts") is not None:
+            mask &= columns["ts"] >= filters["start_ts"]
+        if filters.get("end_ts") is not None:
+            mask &= columns["ts"] <= filters["end_ts"]
+        if filters.get("event_contains"):
+            needle = filters["event_contains"].lower()
+            for i in np.flatnonzero(mask):
+                if needle not in archive.event_at(columns, i).lower():
+                    mask[i] = False
+        return mask
+
+    def _block_may_match(self, archive: ArchiveFile, block: dict, filters: dict) -> bool:
+        if filters.get("id_device") and filters["id_device"] not in block["devices"]:
+            return False
+        if filters.get("access_type") and filters["access_type"] not in archive.index["access_types"]:
+            return False
+        if filters.get("start_ts") is not None and block["ts_max"] < filters["start_ts"]:
+            return False
+        if filters.get("end_ts") is not None and block["ts_min"] > filters["end_ts"]:
+            return False
+        return True
+
+    def _matches(self, filters: dict) -> Iterator[Tuple[ArchiveFile, dict, object, object]]:
+        """Recorre bloques candidatos (más recientes primero) con su máscara."""
+        for archive in self.files():
+            for block in reversed(archive.index["blocks"]):
+                if not self._block_may_match(archive, block, filters):
+                    continue
+                columns = archive.read_block(block)
+                mask = self._block_mask(archive, block, columns, filters)
+                if mask.any():
+                    yield archive, block, columns, mask
+
+    def query(
+        self,
+        offset: int,
+        limit: int,
+        id_device: Optional[int] = None,
+        access_type: Optional[str] = None,
+        id_action: Optional[int] = None,
+        event_contains: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        event_code: Optional[int] = None,
+        counts: Optional[Dict[tuple, int]] = None,
+    ) -> Tuple[int, List[dict]]:
+        """
+        Devuelve (total, filas) de los logs archivados, más recientes primero.
+        Con `counts`, acumula ahí las ocurrencias de todas las filas que cumplen
+        los filtros por (dispositivo, tipo de acceso, id_action, estado).
+        """
+        np = _np()
+        filters = {
+            "id_device": id_device,
+            "access_type": access_type,
+            "id_action": id_action,
+            "event_contains": event_contains,
+            "start_ts": _to_micros(start_date) if start_date else None,
+            "end_ts": _to_micros(end_date) if end_date else None,
+            "event_code": event_code,
+        }
+
+        total = 0
+        rows: List[dict] = []
+        for archive, block, columns, mask in self._matches(filters):
+            positions = np.flatnonzero(mask)
+            # Más recientes primero dentro del bloque
+            positions = positions[np.argsort(columns["ts"][positions], kind="stable")[::-1]]
+            count = len(positions)
+            access_types = archive.index["access_types"]
+
+            if counts is not None:
+                for i in positions:
+                    action = int(columns["id_action"][i])
+                    code = int(columns["event_code"][i])
+                    key = (
+                        int(columns["id_device"][i]),
+                        access_types[columns["access"][i]],
+                        None if action == NULL_ID else action,
+                        classify_status(archive.event_at(columns, i), None if code == NULL_ID else code),
+                    )
+                    counts[key] = counts.get(key, 0) + int(columns["occurrences"][i])
+
+            start = max(offset - total, 0)
+            if start < count and len(rows) < limit:
+                for i in positions[start:start + (limit - len(rows))]:
+                    user = int(columns["id_user"][i])
+                    action = int(columns["id_action"][i])
+                    code = int(columns["event_code"][i])
+                    rows.append({
+                        "id": int(columns["id"][i]),
+                        "id_device": int(columns["id_device"][i]),
+                        "id_user": None if user == NULL_ID else user,
+                        "id_action": None if action == NULL_ID else action,
+                        "event_code": None if code == NULL_ID else code,
+                        "event": archive.event_at(columns, i),
+                        "access_type": access_types[columns["access"][i]],
+                        "timestamp": EPOCH + timedelta(microseconds=int(columns["ts"][i])),
+                    })
+            total += count
+
+        return total, rows
+
+    def archived_ids(self, path: str) -> List[int]:
+        archive = ArchiveFile(path)
+        try:
+            ids = []
+            for block in archive.index["blocks"]:
+                ids.extend(int(i) for i in archive.read_block(block)["id"])
+            return ids
+        finally:
+            archive.close()
+
+    # ---------- Archivado ----------
+    def _delete_archived(self, session: Session, ids: List[int]):
+        for start in range(0, len(ids), BLOCK_ROWS):
+            chunk = ids[start:start + BLOCK_ROWS]
+            session.query(Log).filter(Log.id.in_(chunk)).delete(synchronize_session=False)
+            session.commit()
+
+    def _finish_pending(self, session: Session):
+        """Completa borrados interrumpidos (archivo escrito pero filas aún en la tabla)."""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".pending"):
+                marker = os.path.join(self.directory, name)
+                path = marker[:-len(".pending")]
+                if os.path.exists(path):
+                    self._delete_archived(session, self.archived_ids(path))
+                os.remove(marker)
+
+    def archive_old_logs(self, session: Session, older_than_days: int) -> Dict[str, int]:
+        """Mueve a archivos los logs con timestamp anterior al corte."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._finish_pending(session)
+
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        oldest = session.query(func.min(Log.timestamp)).filter(Log.timestamp < cutoff).scalar()
+        archived = {}
+
+        month = _month_start(oldest) if oldest else None
+        while month and month < cutoff:
+            month_end = min(_next_month(month), cutoff)
+            rows = (
+                session.query(
+                    Log.id, Log.timestamp, Log.id_device, Log.id_user,
+                    Log.id_action, Log.access_type, Log.event_code, Log.occurrences, Log.event,
+                    Log.id_subject_user, Log.id_card,
+                )
+                .filter(Log.timestamp >= month, Log.timestamp < month_end)
+                .order_by(Log.timestamp, Log.id)
+                .yield_per(BLOCK_ROWS)
+            )
+
+            stamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+            path = os.path.join(self.directory, f"logs-{month:%Y-%m}-{stamp}.lga")
+            writer = _ArchiveWriter(path)
+            # Sesión aparte: la principal tiene abierto el cursor en streaming
+            lookup_session = SessionLocal()
+            renderer = EventRenderer(lookup_session)
+
+            def write(batch):
+                events = renderer.render_all(batch)
+                writer.write_block([tuple(row[:8]) + (event,) for row, event in zip(batch, events)])
+
+            try:
+                batch = []
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) >= BLOCK_ROWS:
+                        write(batch)
+                        batch = []
+                if batch:
+                    write(batch)
+            finally:
+                lookup_session.close()
+            index = writer.close()
+
+            if index:
+                marker = path + ".pending"
+                open(marker, "w").close()
+                self._delete_archived(session, writer.ids)
+                os.remove(marker)
+                archived[f"{month:%Y-%m}"] = index["rows"]
+                print(f"🗄️ {index['rows']} logs de {month:%Y-%m} archivados en {path}")
+
+            month = _next_month(month)
+
+        return archived
+
+    async def run(self, interval_hours: float, older_than_days: int):
+        """Tarea de fondo: archiva periódicamente los logs antiguos."""
+        while True:
+            await asyncio.to_thread(self._run_once, older_than_days)
+            await asyncio.sleep(interval_hours * 3600)
+
+    def _run_once(self, older_than_days: int):
+        session = SessionLocal()
+        try:
+            self.archive_old_logs(session, older_than_days)
+        except Exception as e:
+            session.rollback()
+            print(f"❌ Error archivando logs: {e}")
+        finally:
+            session.close()
+
+
+# Instancia global
+log_archive = LogArchiveStore(settings.LOG_ARCHIVE_DIR)
@@ -0,0 +1,152 @@
+"""
+Suscripción a los logs confirmados en base de datos.
+
+Todas las rutas que escriben `Log` lo hacen con `session.add(...)`; aquí se
+recogen esas filas en `after_flush` y se entregan a los suscriptores solo
+cuando la transacción se confirma (`after_commit`). Las inserciones masivas
+que no pasan por el ORM deben registrarse con `track()`.
+"""
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from core.database import SessionLocal
+
+_PENDING_KEY = "pending_log_records"
+
+
+class LogRecord:
+    """Copia ligera de una fila de `logs`, independiente de la sesión."""
+    __slots__ = (
+        "id", "id_device", "id_user", "id_action", "event", "access_type", "timestamp",
+        "action", "event_code", "id_card", "id_subject_user",
+    )
+
+    def __init__(
+        self,
+        id: Optional[int],
+        id_device: int,
+        id_user: Optional[int],
+        id_action: Optional[int],
+        event: str,
+        access_type: str,
+        timestamp: datetime,
+        action: Optional[str] = None,
+        event_code: Optional[int] = None,
+        id_card: Optional[int] = None,
+        id_subject_user: Optional[int] = None,
+    ):
+        self.id = id
+        self.id_device = id_device
+        self.id_user = id_user
+        self.id_action = id_action
+        self.event = event
+        self.access_type = access_type
+        self.timestamp = timestamp
+        self.action = action
+        self.event_code = event_code
+        self.id_card = id_card
+        self.id_subject_user = id_subject_user
+
+
+_subscribers: List[Callable[[List[LogRecord]], None]] = []
+_occurrence_subscribers: List[Callable[[List[LogRecord]], None]] = []
+
+
+def subscribe(callback: Callable[[List[LogRecord]], None]):
+    """Registra una función que recibe cada lote de logs confirmados."""
+    if callback not in _subscribers:
+        _subscribers.append(callback)
+
+
+def subscribe_occurrences(callback: Callable[[List[LogRecord]], None]):
+    """
+    Registra una función que recibe los eventos repetidos que se compactaron
+    en un log existente (no generan fila nueva, así que no pasan por `subscribe`).
+    """
+    if callback not in _occurrence_subscribers:
+        _occurrence_subscribers.append(callback)
+
+
+def publish_occurrences(records: List[LogRecord]):
+    _deliver(_occurrence_subscribers, records)
+
+
+def track(session: Session, records: List[LogRecord]):
+    """Registra logs insertados sin el ORM para publicarlos al confirmar."""
+    session.info.setdefault(_PENDING_KEY, []).extend(records)
+
+
+def publish(records: List[LogRecord]):
+    """Entrega los registros a los suscriptores (sin pasar por una sesión)."""
+    _deliver(_subscribers, records)
+
+
+def _deliver(subscribers, records: List[LogRecord]):
+    if not records:
+        return
+    for callback in list(subscribers):
+        try:
+            callback(records)
+        except Exception as e:
+            print(f"❌ Error en suscriptor de logs {getattr(callback, '__qualname__', callback)}: {e}")
+
+
+def _action_name(session: Session, log, new_actions: dict) -> Optional[str]:
+    if log.id_action is None:
+        return None
+    if log.id_action in new_actions:
+        return new_actions[log.id_action]
+    action = log.__dict__.get("action_device")
+    if action is None:
+        from models.actions_devices import ActionDevice
+        action = session.identity_map.get(identity_key(ActionDevice, log.id_action))
+    return action.action if action is not None else None
+
+
+def _collect_new_logs(session: Session, flush_context):
+    from models.logs import Log
+    from models.actions_devices import ActionDevice
+
+    new_logs = [obj for obj in session.new if isinstance(obj, Log)]
+    if not new_logs:
+        return
+
+    new_actions = {
+        obj.id: obj.action for obj in session.new
+        if isinstance(obj, ActionDevice) and obj.id is not None
+    }
+    track(session, [
+        LogRecord(
+            id=log.id,
+            id_device=log.id_device,
+            id_user=log.id_user,
+            id_action=log.id_action,
+            event=log.event,
+            access_type=log.access_type,
+            timestamp=log.timestamp or datetime.utcnow(),
+            action=_action_name(session, log, new_actions),
+            event_code=log.event_code,
+            id_card=log.id_card,
+            id_subject_user=log.id_subject_user,
+        )
+        for log in new_logs
+    ])
+
+
+def _publish_committed(session: Session):
+    records = session.info.pop(_PENDING_KEY, None)
+    if records:
+        publish(records)
+
+
+def _discard_pending(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+event.listen(SessionLocal, "after_flush", _collect_new_logs)
+event.listen(SessionLocal, "after_commit", _publish_committed)
+event.listen(SessionLocal, "after_rollback", _discard_pending)
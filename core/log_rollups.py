@@ -0,0 +1,347 @@
+"""
+Rollups incrementales de logs para los campos counts_by_* de /logs/.
+
+Cada log confirmado incrementa un contador en memoria con la clave
+(día, dispositivo, tipo de acceso, acción, estado). Los contadores se
+vuelcan periódicamente a `log_rollups` con un upsert aditivo, de modo que
+varios workers pueden escribir sobre las mismas filas.
+
+Se cuentan ocurrencias, no filas: las repeticiones compactadas en un log
+existente (`occurrences`, "(xN)" en el texto) también suman. Los rollups no
+se descuentan al archivar, así que cubren todo el historial; las lecturas
+los acotan al log más antiguo de la tabla y los archivados se cuentan
+desde los archivos (core/log_archive.py) cuando se piden.
+"""
+import asyncio
+import re
+import threading
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from core import log_events
+from core.database import SessionLocal, engine, upsert_increment
+from core.event_codes import event_status
+from models.actions_devices import ActionDevice
+from models.log_rollups import LogRollup
+from models.logs import Log
+
+NO_ACTION = ""
+
+_FAILED_PATTERN = re.compile(r"fallid|incorrect|denegad|rechazad|inválid|invalid", re.IGNORECASE)
+_SUCCESS_PATTERN = re.compile(r"concedido|exitos|confirm|ejecutada correctamente|abrió", re.IGNORECASE)
+
+
+def classify_status(event: str, event_code: Optional[int] = None) -> str:
+    """Estado resumido de un log: el del código si es fijo, si no a partir del texto."""
+    status = event_status(event_code)
+    if status:
+        return status
+    if not event:
+        return "informativo"
+    if _FAILED_PATTERN.search(event):
+        return "fallido"
+    if _SUCCESS_PATTERN.search(event):
+        return "exitoso"
+    return "informativo"
+
+
+# Clave: (día, id_device, access_type, acción o id_action pendiente de resolver, estado)
+RollupKey = Tuple[date, int, str, object, str]
+
+
+class LogRollupService:
+    def __init__(self):
+        self._pending: Dict[RollupKey, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    # ---------------------- ESCRITURA ----------------------
+    def record(self, records: List[log_events.LogRecord]):
+        """Suscriptor de log_events (logs nuevos y repeticiones compactadas): acumula los conteos en memoria."""
+        with self._lock:
+            for record in records:
+                self._pending[self._key(record)] += 1
+
+    def _key(self, record: log_events.LogRecord) -> RollupKey:
+        if record.action is not None:
+            action = record.action
+        elif record.id_action is not None:
+            action = record.id_action  # Se resuelve al volcar
+        else:
+            action = NO_ACTION
+        return (
+            record.timestamp.date(),
+            record.id_device,
+            (record.access_type or "")[:20],
+            action,
+            classify_status(record.event, record.event_code),
+        )
+
+    def _take_pending(self) -> Dict[RollupKey, int]:
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+        return pending
+
+    def flush(self) -> int:
+        """Vuelca los contadores acumulados a la tabla log_rollups."""
+        pending = self._take_pending()
+        if not pending:
+            return 0
+
+        try:
+            action_ids = {key[3] for key in pending if isinstance(key[3], int)}
+            action_names = {}
+            if action_ids:
+                with SessionLocal() as session:
+                    action_names = dict(
+                        session.query(ActionDevice.id, ActionDevice.action)
+                        .filter(ActionDevice.id.in_(action_ids))
+                        .all()
+                    )
+
+            merged: Dict[tuple, int] = defaultdict(int)
+            for (day, id_device, access_type, action, status), count in pending.items():
+                if isinstance(action, int):
+                    action = action_names.get(action, NO_ACTION)
+                merged[(day, id_device, access_type, action, status)] += count
+
+            rows = [
+                {
+                    "day": day,
+                    "id_device": id_device,
+                    "access_type": access_type,
+                    "action": action,
+                    "status": status,
+                    "count": count,
+                }
+                for (day, id_device, access_type, action, status), count in merged.items()
+            ]
+            with engine.begin() as connection:
+                upsert_increment(
+                    connection,
+                    LogRollup.__table__,
+                    rows,
+                    key_columns=["day", "id_device", "access_type", "action", "status"],
+                    increment_columns=["count"],
+                )
+            return len(rows)
+        except Exception as e:
+            # Devolver los conteos para reintentar en el siguiente volcado
+            with self._lock:
+                for key, count in pending.items():
+                    self._pending[key] += count
+            print(f"❌ Error volcando rollups de logs: {e}")
+            return 0
+
+    async def run(self, interval: float):
+        """Tarea de fondo: vuelca los contadores cada `interval` segundos."""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.flush)
+
+    # ---------------------- LECTURA ----------------------
+    def counts(
+        self,
+        session: Session,
+        id_device: Optional[int] = None,
+        access_type: Optional[str] = None,
+        start_day: Optional[date] = None,
+        end_day: Optional[date] = None,
+    ) -> Dict[str, Dict[str, int]]:
+        """Suma las filas de rollup (y lo pendiente en memoria) que cumplen los filtros."""
+        query = session.query(
+            LogRollup.id_device,
+            LogRollup.access_type,
+            LogRollup.action,
+            LogRollup.status,
+            func.sum(LogRollup.count),
+        )
+        if id_device:
+            query = query.filter(LogRollup.id_device == id_device)
+        if access_type:
+            query = query.filter(LogRollup.access_type == access_type)
+        if start_day:
+            query = query.filter(LogRollup.day >= start_day)
+        if end_day:
+            query = query.filter(LogRollup.day <= end_day)
+        rows = query.group_by(
+            LogRollup.id_device, LogRollup.access_type, LogRollup.action, LogRollup.status
+        ).all()
+
+        result = _empty_counts()
+        for device, a_type, action, status, count in rows:
+            _add_counts(result, device, a_type, action, status, int(count or 0))
+
+        with self._lock:
+            pending = list(self._pending.items())
+        pending = [
+            (key, count) for key, count in pending
+            if not (id_device and key[1] != id_device)
+            and not (access_type and key[2] != access_type)
+            and not (start_day and key[0] < start_day)
+            and not (end_day and key[0] > end_day)
+        ]
+        action_ids = {key[3] for key, _ in pending if isinstance(key[3], int)}
+        action_names = {}
+        if action_ids:
+            action_names = dict(
+                session.query(ActionDevice.id, ActionDevice.action)
+                .filter(ActionDevice.id.in_(action_ids))
+                .all()
+            )
+        for (day, device, a_type, action, status), count in pending:
+            if isinstance(action, int):
+                action = action_names.get(action, NO_ACTION)
+            _add_counts(result, device, a_type, action, status, count)
+
+        return result
+
+    def counts_in_range(
+        self,
+        session: Session,
+        query,
+        id_device: Optional[int] = None,
+        access_type: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        Conteos de un rango de fechas arbitrario sobre los logs de la tabla.
+        Los días completos salen de los rollups; los días parciales de los
+        bordes se agrupan sobre `query` (ya filtrada por el rango), que solo
+        recorre esas horas vía índice. El inicio se acota al log más antiguo
+        de la tabla: los días ya archivados siguen en los rollups.
+        """
+        oldest = session.query(func.min(Log.timestamp)).scalar()
+        if oldest is None or (end is not None and end < oldest):
+            return _empty_counts()
+        if start is None or start < oldest:
+            start = oldest
+
+        first_day = None
+        if start is not None:
+            first_day = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+        last_day = None
+        if end is not None:
+            last_day = end.date() if end.time() == time.max else end.date() - timedelta(days=1)
+
+        if first_day and last_day and first_day > last_day:
+            return self.counts_from_query(query)
+
+        result = self.counts(session, id_device, access_type, first_day, last_day)
+        if start is not None and first_day != start.date():
+            head = query.filter(Log.timestamp < datetime.combine(first_day, time.min))
+            _merge_counts(result, self.counts_from_query(head))
+        if last_day is not None and last_day != end.date():
+            tail = query.filter(Log.timestamp >= datetime.combine(end.date(), time.min))
+            _merge_counts(result, self.counts_from_query(tail))
+        return result
+
+    def counts_from_query(self, query) -> Dict[str, Dict[str, int]]:
+        """
+        Conteos agrupando directamente la consulta filtrada (GROUP BY sobre
+        `logs`). Se usa para los filtros que los rollups no pueden expresar
+        (texto del evento, id_action, event_code) y para los bordes de
+        counts_in_range. No hay tabla precalculada para estos filtros: el coste
+        es del mismo orden que el count() de la paginación y lo acota el rango
+        de fechas de la consulta (en /logs, la ventana QUERY_DEFAULT_WINDOW_DAYS
+        salvo all_history o un rango explícito).
+        """
+        rows = (
+            query.outerjoin(ActionDevice, Log.id_action == ActionDevice.id)
+            .with_entities(
+                Log.id_device, Log.access_type, ActionDevice.action, Log.event_code, Log.event,
+                func.sum(func.coalesce(Log.occurrences, 1)),
+            )
+            .group_by(Log.id_device, Log.access_type, ActionDevice.action, Log.event_code, Log.event)
+            .order_by(None)
+            .all()
+        )
+        result = _empty_counts()
+        for device, a_type, action, event_code, event, count in rows:
+            _add_counts(result, device, a_type, action or NO_ACTION, classify_status(event, event_code), int(count or 0))
+        return result
+
+    def add_archived(self, session: Session, result: Dict[str, Dict[str, int]], archived: Dict[tuple, int]):
+        """Suma a `result` los conteos de logs archivados {(dispositivo, tipo de acceso, id_action, estado): n}."""
+        action_ids = {key[2] for key in archived if key[2] is not None}
+        action_names = {}
+        if action_ids:
+            action_names = dict(
+                session.query(ActionDevice.id, ActionDevice.action)
+                .filter(ActionDevice.id.in_(action_ids))
+                .all()
+            )
+        for (device, a_type, id_action, status), count in archived.items():
+            _add_counts(result, device, a_type, action_names.get(id_action, NO_ACTION), status, count)
+
+    # ---------------------- RECONSTRUCCIÓN ----------------------
+    def rebuild(self, session: Session, chunk_size: int = 5000) -> int:
+        """
+        Recalcula todos los rollups desde la tabla logs (backfill). Pensado para
+        ejecutarse con poco tráfico: los logs escritos durante la reconstrucción
+        pueden quedar contados dos veces.
+        """
+        self._take_pending()
+        totals: Dict[tuple, int] = defaultdict(int)
+        rows = (
+            session.query(
+                Log.timestamp, Log.id_device, Log.access_type, ActionDevice.action, Log.event_code, Log.event,
+                Log.occurrences,
+            )
+            .outerjoin(ActionDevice, Log.id_action == ActionDevice.id)
+            .execution_options(stream_results=True)
+            .yield_per(chunk_size)
+        )
+        for timestamp, device, a_type, action, event_code, event, occurrences in rows:
+            key = (
+                timestamp.date(), device, (a_type or "")[:20], action or NO_ACTION,
+                classify_status(event, event_code),
+            )
+            totals[key] += occurrences or 1
+
+        session.query(LogRollup).delete()
+        session.bulk_insert_mappings(LogRollup, [
+            {
+                "day": day,
+                "id_device": device,
+                "access_type": a_type,
+                "action": action,
+                "status": status,
+                "count": count,
+            }
+            for (day, device, a_type, action, status), count in totals.items()
+        ])
+        session.commit()
+        return len(totals)
+
+
+def _empty_counts() -> Dict[str, Dict[str, int]]:
+    return {
+        "counts_by_device": defaultdict(int),
+        "counts_by_status": defaultdict(int),
+        "counts_by_action_type": defaultdict(int),
+        "counts_by_access_type": defaultdict(int),
+    }
+
+
+def _add_counts(result, device, access_type, action, status, count):
+    result["counts_by_device"][str(device)] += count
+    result["counts_by_status"][status] += count
+    result["counts_by_action_type"][action or "sin_accion"] += count
+    result["counts_by_access_type"][access_type] += count
+
+
+def _merge_counts(result, other):
+    for group, values in other.items():
+        for key, count in values.items():
+            result[group][key] += count
+
+
+# Instancia global
+log_rollups = LogRollupService()
+log_events.subscribe(log_rollups.record)
+log_events.subscribe_occurrences(log_rollups.record)
@@ -0,0 +1,208 @@
+"""
+Búsqueda indexada sobre `Log.event`.
+
+- MySQL: índice FULLTEXT `ft_logs_event` con MATCH ... AGAINST en modo booleano.
+- SQLite: tabla virtual FTS5 `logs_fts` (contenido externo) mantenida por triggers.
+- Otros motores: se mantiene el ILIKE de siempre.
+
+La búsqueda es por palabras y prefijos de palabra ("conced" encuentra
+"concedido"), no por subcadenas arbitrarias dentro de una palabra.
+
+Como el texto de los logs con código se genera al leer, el índice solo cubre
+el detalle libre; las palabras de las plantillas y los nombres de usuarios y
+tarjetas se traducen a filtros de igualdad sobre `event_code`, `id_user`,
+`id_subject_user` e `id_card`. Un nombre solo cuenta en los códigos cuya
+plantilla lo muestra (`{username}`, `{user_name}`, `{subject_name}`,
+`{card_name}`): así se encuentran exactamente los logs cuyo texto lo contiene.
+"""
+import re
+from typing import List
+
+from sqlalchemy import Float, Integer, and_, cast, func, null, or_, select, text, union_all
+
+from core.event_codes import codes_matching, codes_with_placeholder
+from models.logs import Log
+from models.nfc_cards import NFCCard
+from models.users import User
+
+# Cambiar este valor fuerza la resincronización del esquema en el arranque
+SEARCH_INDEX_VERSION = "1"
+
+# innodb_ft_min_token_size por defecto es 3: tokens más cortos no están indexados
+MIN_TOKEN_LENGTH = 3
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+_SQLITE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5(
+        event, content='logs', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS logs_fts_ai AFTER INSERT ON logs BEGIN
+        INSERT INTO logs_fts(rowid, event) VALUES (new.id, new.event);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS logs_fts_ad AFTER DELETE ON logs BEGIN
+        INSERT INTO logs_fts(logs_fts, rowid, event) VALUES ('delete', old.id, old.event);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS logs_fts_au AFTER UPDATE OF event ON logs BEGIN
+        INSERT INTO logs_fts(logs_fts, rowid, event) VALUES ('delete', old.id, old.event);
+        INSERT INTO logs_fts(rowid, event) VALUES (new.id, new.event);
+    END""",
+    "INSERT INTO logs_fts(logs_fts) VALUES ('rebuild')",
+]
+
+_fts_available = {}
+
+# Máximo de usuarios/tarjetas a los que se traduce una palabra
+MAX_NAME_MATCHES = 200
+
+# (marcador de la plantilla, columna del nombre, columna del log que lo referencia)
+_NAME_PLACEHOLDERS = (
+    ("username", User.username, Log.id_user),
+    ("user_name", User.name, Log.id_user),
+    ("subject_name", User.name, Log.id_subject_user),
+)
+
+
+def ensure_search_index(connection):
+    """Crea el índice de texto completo según el motor (idempotente)."""
+    dialect = connection.dialect.name
+    try:
+        if dialect == "mysql":
+            exists = connection.execute(text(
+                "SELECT COUNT(*) FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = 'logs' "
+                "AND index_name = 'ft_logs_event'"
+            )).scalar()
+            if not exists:
+                connection.execute(text("ALTER TABLE logs ADD FULLTEXT INDEX ft_logs_event (event)"))
+                print("🧱 Índice FULLTEXT creado: ft_logs_event")
+        elif dialect == "sqlite":
+            for statement in _SQLITE_FTS_DDL:
+                connection.execute(text(statement))
+            print("🧱 Índice FTS5 sincronizado: logs_fts")
+    except Exception as e:
+        print(f"⚠️ No se pudo crear el índice de búsqueda de logs: {e}")
+
+
+def _search_tokens(term: str) -> List[str]:
+    return [t for t in _TOKEN_PATTERN.findall(term) if len(t) >= MIN_TOKEN_LENGTH]
+
+
+def _structured_condition(session, term: str):
+    """
+    Condición equivalente sobre las columnas tipadas: cada palabra debe
+    aparecer en la plantilla del código o en el nombre del usuario / tarjeta.
+    None si alguna palabra no corresponde a nada.
+    """
+    conditions = []
+    for token in _TOKEN_PATTERN.findall(term):
+        options = []
+        codes = codes_matching(token)
+        if codes:
+            options.append(Log.event_code.in_(codes))
+
+        pattern = f"%{token}%"
+        for placeholder, name_column, log_column in _NAME_PLACEHOLDERS:
+            user_ids = [
+                row[0] for row in session.query(User.id)
+                .filter(name_column.ilike(pattern))
+                .limit(MAX_NAME_MATCHES)
+            ]
+            if user_ids:
+                options.append(and_(
+                    Log.event_code.in_(codes_with_placeholder(placeholder)), log_column.in_(user_ids)
+                ))
+
+        card_ids = [
+            row[0] for row in session.query(NFCCard.id)
+            .filter(NFCCard.card_name.ilike(pattern))
+            .limit(MAX_NAME_MATCHES)
+        ]
+        if card_ids:
+            options.append(and_(
+                Log.event_code.in_(codes_with_placeholder("card_name")), Log.id_card.in_(card_ids)
+            ))
+
+        if not options:
+            return None
+        conditions.append(or_(*options))
+    return and_(*conditions) if conditions else None
+
+
+def _sqlite_fts_available(session) -> bool:
+    bind = session.get_bind()
+    if bind not in _fts_available:
+        _fts_available[bind] = bool(session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'logs_fts'")
+        ).first())
+    return _fts_available[bind]
+
+
+def _matches(text_ids, structured, best):
+    """
+    Ids (y relevancia) de los logs que cumplen la búsqueda de texto o la
+    estructurada. Cada rama es una consulta aparte con su propio índice
+    (FULLTEXT / FTS5, event_code + id_user ...) y se unen por id: un OR en
+    el WHERE impediría usar el índice de texto completo.
+    """
+    if structured is None:
+        return text_ids.subquery("matches")
+    structured_ids = select(Log.id.label("id"), cast(null(), Float).label("rank")).where(structured)
+    found = union_all(text_ids, structured_ids).subquery("found")
+    return (
+        select(found.c.id, best(found.c.rank).label("rank"))
+        .group_by(found.c.id)
+        .subquery("matches")
+    )
+
+
+def apply_event_search(query, session, term: str, order: str = "recent"):
+    """
+    Aplica el filtro `event_contains` usando el índice disponible.
+    `order` puede ser "recent" (más nuevos primero) o "relevance".
+    """
+    dialect = session.get_bind().dialect.name
+    tokens = _search_tokens(term)
+    recent = (Log.timestamp.desc(), Log.id.desc())
+
+    # Si hay palabras demasiado cortas para el índice, se verifican con ILIKE
+    # sobre las filas ya acotadas por el índice
+    substring_check = Log.event.ilike(f"%{term}%")
+    has_short_tokens = len(tokens) != len(_TOKEN_PATTERN.findall(term))
+    structured = _structured_condition(session, term)
+
+    if tokens and dialect == "mysql":
+        from sqlalchemy.dialects.mysql import match
+        boolean_query = " ".join(f"+{token}*" for token in tokens)
+        relevance = match(Log.event, against=boolean_query).in_boolean_mode()
+        text_ids = select(Log.id.label("id"), cast(relevance, Float).label("rank")).where(
+            and_(relevance, substring_check) if has_short_tokens else relevance
+        )
+        matches = _matches(text_ids, structured, func.max)
+        query = query.join(matches, matches.c.id == Log.id)
+        if order == "relevance":
+            return query.order_by(matches.c.rank.is_(None), matches.c.rank.desc(), *recent)
+        return query.order_by(*recent)
+
+    if tokens and dialect == "sqlite" and _sqlite_fts_available(session):
+        fts_query = " ".join(f'"{token}"*' for token in tokens)
+        fts = (
+            text("SELECT rowid AS id, bm25(logs_fts) AS rank FROM logs_fts WHERE logs_fts MATCH :fts_query")
+            .bindparams(fts_query=fts_query)
+            .columns(id=Integer, rank=Float)
+            .subquery("fts")
+        )
+        if has_short_tokens:
+            text_ids = select(Log.id.label("id"), fts.c.rank).join(fts, fts.c.id == Log.id).where(substring_check)
+        else:
+            text_ids = select(fts.c.id, fts.c.rank)
+        # bm25: menor es más relevante
+        matches = _matches(text_ids, structured, func.min)
+        query = query.join(matches, matches.c.id == Log.id)
+        if order == "relevance":
+            return query.order_by(matches.c.rank.is_(None), matches.c.rank.asc(), *recent)
+        return query.order_by(*recent)
+
+    # Sin índice (o término demasiado corto): búsqueda por subcadena sobre la tabla
+    condition = or_(substring_check, structured) if structured is not None else substring_check
+    return query.filter(condition).order_by(*recent)
@@ -0,0 +1,183 @@
+"""
+Agrupación de notificaciones de acceso y límite de envío por WhatsApp.
+
+CallMeBot limita a los remitentes que envían ráfagas, y en un cambio de
+turno el teléfono del administrador recibe decenas de mensajes. El
+agregador:
+
+- Envía de inmediato la primera notificación de un periodo tranquilo y
+  abre una ventana de NOTIFICATION_DIGEST_WINDOW_SECONDS. Lo que llega
+  dentro de la ventana se acumula y sale al cerrarla como un resumen
+  ("5 accesos en los últimos 60 s: ..."); si solo hubo uno, sale el
+  mensaje normal.
+- Cada envío toma una ficha de un token bucket (NOTIFICATION_RATE_PER_MINUTE,
+  ráfaga NOTIFICATION_BURST). Sin fichas, el resumen espera y sigue
+  acumulando.
+- Las notificaciones críticas (emergencias) no esperan ventana ni fichas.
+
+Cada notificación puede traer una clave (id de la fila en el outbox de
+core/notification_outbox.py); tras cada envío se llama a `on_delivered`
+con las claves que incluía y si se entregó.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, List, Optional
+
+from core.time_utils import format_colombia_time
+
+Sender = Callable[[str], Awaitable[bool]]
+DeliveryHook = Callable[[List[Any], bool], Awaitable[None]]
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = max(rate_per_minute, 0.001) / 60  # fichas por segundo
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def take(self):
+        """Toma una ficha sin esperar (envíos críticos); el saldo no baja de cero."""
+        self._refill()
+        self.tokens = max(self.tokens - 1, 0)
+
+    def seconds_until_token(self) -> float:
+        self._refill()
+        return max((1 - self.tokens) / self.rate, 0)
+
+
+class _PendingEvent:
+    __slots__ = ("received_at", "line", "message", "key")
+
+    def __init__(self, line: str, message: str, key: Any = None, received_at: Optional[datetime] = None):
+        self.received_at = received_at or datetime.utcnow()
+        self.line = line
+        self.message = message
+        self.key = key
+
+
+class NotificationAggregator:
+    def __init__(self, send: Sender, window_seconds: float, rate_per_minute: float, burst: int, max_lines: int):
+        self._send = send
+        self.window_seconds = window_seconds
+        self.max_lines = max(max_lines, 1)
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self._pending: List[_PendingEvent] = []
+        self._overflow: List[Any] = []  # Claves de los eventos que no caben en el resumen: solo se cuentan
+        self.on_delivered: Optional[DeliveryHook] = None
+        self._window_until: Optional[float] = None  # Fin de la ventana abierta (monotónico)
+        self.stats = {
+            "received": 0, "sent_immediately": 0, "digests": 0, "digested_events": 0,
+            "critical": 0, "throttled": 0, "failed": 0,
+        }
+
+    # ---------------------- ENTRADA ----------------------
+    async def add(self, line: str, message: str, key: Any = None, at: Optional[datetime] = None) -> bool:
+        """
+        Registra una notificación: `message` es el texto completo si sale sola,
+        `line` su renglón en un resumen (con la hora `at` del evento).
+        Devuelve si se envió o quedó en cola.
+        """
+        self.stats["received"] += 1
+        now = time.monotonic()
+        window_open = self._window_until is not None and now < self._window_until
+        if self.window_seconds <= 0 or (not window_open and not self._pending and self.bucket.try_take()):
+            self._window_until = now + self.window_seconds
+            self.stats["sent_immediately"] += 1
+            return await self._deliver(message, [key])
+
+        if len(self._pending) < self.max_lines:
+            self._pending.append(_PendingEvent(line, message, key, at))
+        else:
+            self._overflow.append(key)
+        if not window_open and self._window_until is None:
+            self._window_until = now + self.window_seconds
+        return True
+
+    async def send_critical(self, message: str) -> bool:
+        """Envío inmediato, sin ventana ni espera de fichas."""
+        self.stats["critical"] += 1
+        self.bucket.take()
+        return await self._deliver(message)
+
+    # ---------------------- SALIDA ----------------------
+    async def _deliver(self, message: str, keys: Optional[List[Any]] = None) -> bool:
+        sent = await self._send(message)
+        if not sent:
+            self.stats["failed"] += 1
+        keys = [key for key in keys or () if key is not None]
+        if keys and self.on_delivered is not None:
+            await self.on_delivered(keys, sent)
+        return sent
+
+    def _digest(self) -> str:
+        total = len(self._pending) + len(self._overflow)
+        # Con el envío limitado, el periodo puede ser más largo que la ventana
+        span = (datetime.utcnow() - self._pending[0].received_at).total_seconds()
+        message = f"🚪 *Sistema de Acceso NFC*\n\n"
+        message += f"📋 *{total} accesos en los últimos {int(max(span, self.window_seconds))} s*\n"
+        for event in self._pending:
+            message += f"• {format_colombia_time(event.received_at, '%H:%M:%S')} {event.line}\n"
+        if self._overflow:
+            message += f"• ... y {len(self._overflow)} más\n"
+        return message
+
+    async def flush(self, force: bool = False) -> bool:
+        """
+        Envía lo acumulado como un mensaje (o un resumen). Sin fichas espera al
+        siguiente intento, salvo con `force` (apagado).
+        """
+        if not self._pending:
+            self._window_until = None
+            return False
+        if not self.bucket.try_take():
+            if not force:
+                self.stats["throttled"] += 1
+                return False
+            self.bucket.take()
+
+        if len(self._pending) == 1 and not self._overflow:
+            message = self._pending[0].message
+        else:
+            message = self._digest()
+            self.stats["digests"] += 1
+            self.stats["digested_events"] += len(self._pending) + len(self._overflow)
+        keys = [event.key for event in self._pending] + self._overflow
+        self._pending, self._overflow = [], []
+        # Lo que llegue justo después entra en una nueva ventana
+        self._window_until = time.monotonic() + self.window_seconds
+        await self._deliver(message, keys)
+        return True
+
+    async def run(self, poll_seconds: float = 1.0):
+        """Tarea de fondo: cierra las ventanas vencidas y envía sus resúmenes."""
+        while True:
+            await asyncio.sleep(poll_seconds)
+            try:
+                if self._window_until is not None and time.monotonic() >= self._window_until:
+                    if not await self.flush() and self._pending:
+                        # Sin fichas: reintentar cuando haya una
+                        self._window_until = time.monotonic() + self.bucket.seconds_until_token()
+            except Exception as e:
+                print(f"❌ Error enviando resumen de notificaciones: {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "pending": len(self._pending) + len(self._overflow),
+            "tokens": round(self.bucket.tokens, 2),
+            "window_seconds": self.window_seconds,
+        }
@@ -0,0 +1,297 @@
+"""
+Outbox de notificaciones de WhatsApp.
+
+Los handlers no envían: agregan una fila a `notification_outbox` en la
+misma transacción que el `Log` del evento (`notification_outbox.add`) y
+despiertan al despachador. Así la latencia de la petición no depende del
+proveedor, y una notificación confirmada en la base no se pierde aunque el
+proceso se reinicie.
+
+- El despachador reclama filas vencidas (UPDATE condicionado a
+  status='pending': con varios procesos cada fila la toma uno solo) y las
+  reparte a NOTIFICATION_WORKERS workers asyncio.
+- Los accesos pasan por el agregador (core/notification_aggregator.py), que
+  informa qué filas salieron en cada mensaje o resumen; las emergencias se
+  envían directo.
+- Un envío fallido vuelve a `pending` con espera exponencial; al llegar a
+  NOTIFICATION_MAX_ATTEMPTS queda `dead` (dead letter) para revisión.
+- Cada reclamo deja en `claimed_at` un lease que sirve de ficha: mientras la
+  fila espera en la cola o en el agregador (ventana del resumen, límite de
+  envío) el despachador lo renueva, y el resultado solo se guarda si la
+  ficha sigue siendo la del reclamo. Una fila en `sending` con el lease
+  vencido (proceso caído con la notificación en memoria) vuelve a `pending`:
+  la entrega es al menos una vez.
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, or_, update
+from sqlalchemy.orm import Session
+
+from core.command_tracing import command_tracer
+from core.config import settings
+from core.database import SessionLocal
+from core.whatsapp_service import whatsapp_service
+from models.notification_outbox import NotificationOutbox
+
+CLAIM_BATCH = 50
+
+
+def _lease_now() -> datetime:
+    # Segundos enteros: DATETIME de MySQL no guarda fracciones y `claimed_at`
+    # se compara por igualdad como ficha del reclamo
+    return datetime.utcnow().replace(microsecond=0)
+
+
+class _Claimed:
+    __slots__ = ("id", "kind", "payload", "attempts", "id_action", "created_at", "claimed_at")
+
+    def __init__(self, row: NotificationOutbox, claimed_at: datetime):
+        self.id = row.id
+        self.kind = row.kind
+        self.payload = json.loads(row.payload or "{}")
+        self.attempts = row.attempts or 0
+        self.id_action = row.id_action
+        self.created_at = row.created_at
+        self.claimed_at = claimed_at  # Ficha del reclamo (y del lease vigente)
+
+
+class NotificationOutboxService:
+    def __init__(self, workers: int, max_attempts: int, retry_base_seconds: float, lease_seconds: float):
+        self.workers = max(workers, 1)
+        self.max_attempts = max(max_attempts, 1)
+        self.retry_base_seconds = retry_base_seconds
+        self.lease = timedelta(seconds=lease_seconds)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._held: Dict[int, _Claimed] = {}  # Filas reclamadas por este proceso y aún sin resultado
+        self._lease_lock: Optional[asyncio.Lock] = None
+        self.stats = {"queued": 0, "sent": 0, "retried": 0, "dead": 0, "reclaimed": 0, "renewed": 0, "stale": 0}
+
+    # ---------------------- ALTA ----------------------
+    def add(self, session: Session, kind: str, payload: dict, id_action: Optional[int] = None) -> NotificationOutbox:
+        """Agrega la notificación a la transacción de la sesión (sin commit)."""
+        row = NotificationOutbox(kind=kind, payload=json.dumps(payload), id_action=id_action)
+        session.add(row)
+        self.stats["queued"] += 1
+        if id_action is not None:
+            command_tracer.mark(id_action, "notify_start")
+        return row
+
+    def add_access(
+        self, session: Session, user_name: str, access_type: str, door: str = None, id_action: int = None,
+        event_time: datetime = None,
+    ):
+        """`event_time` (UTC) es la hora del acceso; sin ella se anuncia con la del alta."""
+        payload = {"user_name": user_name, "access_type": access_type, "door": door}
+        if event_time is not None:
+            payload["event_time"] = event_time.isoformat()
+        return self.add(session, "access", payload, id_action)
+
+    def wake(self):
+        """Avisa al despachador que hay filas nuevas (seguro desde cualquier hilo)."""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    # ---------------------- RECLAMO ----------------------
+    def _claim(self) -> List[_Claimed]:
+        now = datetime.utcnow()
+        claimed_at = _lease_now()
+        table = NotificationOutbox.__table__
+        with SessionLocal() as session:
+            reclaimed = session.execute(
+                update(table)
+                .where(table.c.status == "sending", table.c.claimed_at < now - self.lease)
+                .values(status="pending")
+            ).rowcount
+            if reclaimed:
+                self.stats["reclaimed"] += reclaimed
+                print(f"♻️ {reclaimed} notificaciones sin confirmar de entrega vuelven a la cola")
+
+            rows = (
+                session.query(NotificationOutbox)
+                .filter(
+                    NotificationOutbox.status == "pending",
+                    or_(NotificationOutbox.next_attempt_at.is_(None), NotificationOutbox.next_attempt_at <= now),
+                )
+                .order_by(NotificationOutbox.id)
+                .limit(CLAIM_BATCH)
+                .all()
+            )
+            claimed = []
+            for row in rows:
+                result = session.execute(
+                    update(table)
+                    .where(table.c.id == row.id, table.c.status == "pending")
+                    .values(status="sending", claimed_at=claimed_at)
+                )
+                if result.rowcount:
+                    claimed.append(_Claimed(row, claimed_at))
+            session.commit()
+        return claimed
+
+    # ---------------------- ENTREGA ----------------------
+    async def _deliver(self, item: _Claimed):
+        payload = item.payload
+        # Hora del evento (p. ej. accesos sin conexión reenviados después); si no, la del alta
+        at = datetime.fromisoformat(payload["event_time"]) if payload.get("event_time") else item.created_at
+        if item.kind == "emergency":
+            message = whatsapp_service.emergency_message(payload.get("action"), payload.get("user_name"), item.created_at)
+            sent = await whatsapp_service.aggregator.send_critical(message)
+            await self.finish([item.id], sent)
+        elif item.kind == "access":
+            line, message = whatsapp_service.access_message(
+                payload.get("user_name"), payload.get("access_type"), payload.get("door"), at
+            )
+            # El agregador llama a `finish` cuando el mensaje (o su resumen) sale
+            await whatsapp_service.aggregator.add(line, message, key=item.id, at=at)
+        else:
+            await whatsapp_service.aggregator.add(
+                payload.get("line") or payload.get("message", "")[:80],
+                payload.get("message", ""),
+                key=item.id,
+                at=at,
+            )
+
+    async def finish(self, keys: List[Any], sent: bool):
+        """Resultado de un envío: entregadas, o reintento / dead letter."""
+        items = [self._held.pop(key) for key in keys if key in self._held]
+        if not items:
+            return
+        if self._lease_lock is None:
+            await asyncio.to_thread(self._mark, items, sent)
+        else:
+            async with self._lease_lock:
+                await asyncio.to_thread(self._mark, items, sent)
+        if sent:
+            for item in items:
+                if item.id_action is not None:
+                    command_tracer.mark(item.id_action, "notified")
+
+    def _mark(self, items: List[_Claimed], sent: bool):
+        now = datetime.utcnow()
+        table = NotificationOutbox.__table__
+        with SessionLocal() as session:
+            for item in items:
+                if sent:
+                    values = {"status": "sent", "sent_at": now, "attempts": item.attempts + 1}
+                else:
+                    count = item.attempts + 1
+                    if count >= self.max_attempts:
+                        values = {"status": "dead", "attempts": count, "last_error": "Sin entrega tras agotar los reintentos"}
+                    else:
+                        delay = self.retry_base_seconds * 2 ** (count - 1)
+                        values = {
+                            "status": "pending", "attempts": count,
+                            "next_attempt_at": now + timedelta(seconds=delay),
+                            "last_error": "El proveedor rechazó o no respondió",
+                        }
+                # Solo si la fila sigue con nuestro reclamo: si el lease venció y
+                # otro pase la volvió a tomar, el resultado es de ese pase
+                updated = session.execute(
+                    update(table)
+                    .where(table.c.id == item.id, table.c.status == "sending", table.c.claimed_at == item.claimed_at)
+                    .values(**values)
+                ).rowcount
+                if not updated:
+                    self.stats["stale"] += 1
+                    print(f"⚠️ Notificación {item.id}: el reclamo ya no es vigente, resultado descartado")
+                elif values["status"] == "sent":
+                    self.stats["sent"] += 1
+                elif values["status"] == "dead":
+                    self.stats["dead"] += 1
+                    print(f"☠️ Notificación {item.id} descartada tras {values['attempts']} intentos")
+                else:
+                    self.stats["retried"] += 1
+            session.commit()
+
+    # ---------------------- LEASE ----------------------
+    async def _renew_leases(self):
+        """Renueva el lease de las filas retenidas (cola o agregador) antes de que venza."""
+        now = _lease_now()
+        due = [item for item in self._held.values() if now - item.claimed_at >= self.lease / 2]
+        if not due:
+            return
+        async with self._lease_lock:
+            renewed = await asyncio.to_thread(self._renew, due, now)
+        for item in due:
+            if item.id in renewed:
+                item.claimed_at = now
+            elif self._held.get(item.id) is item:
+                # Otro pase ya la reclamó: el resultado de este no se guardará
+                del self._held[item.id]
+                print(f"⚠️ Notificación {item.id}: lease perdido")
+
+    def _renew(self, items: List[_Claimed], now: datetime) -> set:
+        table = NotificationOutbox.__table__
+        renewed = set()
+        with SessionLocal() as session:
+            for item in items:
+                if session.execute(
+                    update(table)
+                    .where(table.c.id == item.id, table.c.status == "sending", table.c.claimed_at == item.claimed_at)
+                    .values(claimed_at=now)
+                ).rowcount:
+                    renewed.add(item.id)
+            session.commit()
+        self.stats["renewed"] += len(renewed)
+        return renewed
+
+    # ---------------------- TAREAS ----------------------
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            item = await queue.get()
+            try:
+                await self._deliver(item)
+            except Exception as e:
+                print(f"❌ Error entregando notificación {item.id}: {e}")
+                await self.finish([item.id], False)
+            finally:
+                queue.task_done()
+
+    async def run(self, poll_seconds: float = 1.0):
+        """Despachador: reclama filas vencidas y las reparte al pool de workers."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._lease_lock = asyncio.Lock()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=CLAIM_BATCH)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.workers)]
+        try:
+            while True:
+                try:
+                    await self._renew_leases()
+                    for item in await asyncio.to_thread(self._claim):
+                        self._held[item.id] = item
+                        await queue.put(item)
+                except Exception as e:
+                    print(f"❌ Error leyendo el outbox de notificaciones: {e}")
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    def get_stats(self) -> dict:
+        counts = {}
+        with SessionLocal() as session:
+            for status, count in (
+                session.query(NotificationOutbox.status, func.count(NotificationOutbox.id))
+                .group_by(NotificationOutbox.status)
+            ):
+                counts[status] = count
+        return {**self.stats, "by_status": counts, "in_flight": len(self._held)}
+
+
+# Instancia global
+notification_outbox = NotificationOutboxService(
+    settings.NOTIFICATION_WORKERS,
+    settings.NOTIFICATION_MAX_ATTEMPTS,
+    settings.NOTIFICATION_RETRY_BASE_SECONDS,
+    settings.NOTIFICATION_LEASE_SECONDS,
+)
+whatsapp_service.aggregator.on_delivered = notification_outbox.finish
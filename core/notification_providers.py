@@ -0,0 +1,63 @@
+"""
+Proveedores de envío de WhatsApp.
+
+WhatsAppService (core/whatsapp_service.py) maneja el cliente HTTP, los
+tiempos máximos y los errores; el proveedor solo dice a dónde y con qué
+parámetros se envía cada mensaje. NOTIFICATION_PROVIDER elige uno:
+
+- `callmebot`: la API real (requiere CALLMEBOT_API_KEY y ADMIN_PHONE_NUMBER).
+- `local`: el servidor de pruebas de utils/notification_standin.py en
+  NOTIFICATION_PROVIDER_URL, que imita la API de CallMeBot con latencia,
+  errores y límite de envío configurables. Sirve para pruebas de carga
+  (utils/notification_benchmark.py) sin mandar mensajes reales.
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+from core.config import settings
+
+CALLMEBOT_URL = "https://api.callmebot.com/whatsapp.php"
+
+
+class NotificationProvider(ABC):
+    name = "base"
+
+    @abstractmethod
+    def is_configured(self) -> bool:
+        ...
+
+    @abstractmethod
+    def build_request(self, message: str) -> Tuple[str, Dict[str, str]]:
+        """(url, parámetros de la consulta) del envío de `message`."""
+
+
+class CallMeBotProvider(NotificationProvider):
+    name = "callmebot"
+
+    def __init__(self, api_key: Optional[str], phone: Optional[str], url: str = CALLMEBOT_URL):
+        self.api_key = api_key
+        self.phone = phone
+        self.url = url
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key and self.phone)
+
+    def build_request(self, message: str) -> Tuple[str, Dict[str, str]]:
+        return self.url, {"phone": self.phone, "text": message, "apikey": self.api_key}
+
+
+class LocalProvider(CallMeBotProvider):
+    """Misma API que CallMeBot contra el servidor local de pruebas; no necesita credenciales."""
+    name = "local"
+
+    def __init__(self, url: str):
+        super().__init__("local", "local", url)
+
+
+def build_provider(name: Optional[str] = None) -> NotificationProvider:
+    name = (name or settings.NOTIFICATION_PROVIDER).lower()
+    if name == "local":
+        return LocalProvider(settings.NOTIFICATION_PROVIDER_URL)
+    if name != "callmebot":
+        print(f"⚠️ Proveedor de notificaciones desconocido '{name}', se usa CallMeBot")
+    return CallMeBotProvider(settings.CALLMEBOT_API_KEY, settings.ADMIN_PHONE_NUMBER)
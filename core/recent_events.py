@@ -0,0 +1,167 @@
+"""
+Últimos eventos por dispositivo, en memoria.
+
+Cada dispositivo tiene un buffer circular de capacidad fija
+(RECENT_EVENTS_PER_DEVICE) con registros compactos (__slots__). Se llena con
+los mismos logs confirmados que publica core/log_events, así que cualquier
+ruta que escriba `Log` lo alimenta sin cambios. Al arrancar se rellena desde
+la base (una consulta por dispositivo sobre ix_logs_device_timestamp); a
+partir de ahí `/devices/{id}/recent` responde sin tocar la tabla de logs.
+
+El texto del evento se genera una sola vez por registro, la primera vez que
+se consulta, y queda guardado en el propio registro.
+"""
+import threading
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from typing import Deque, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from core import log_events
+from core.config import settings
+from core.event_codes import EventRenderer
+
+RECENT_FIELDS = (
+    "id", "timestamp", "id_device", "id_user", "id_action", "access_type",
+    "event_code", "id_subject_user", "id_card", "occurrences", "last_timestamp",
+)
+
+
+class RecentEvent:
+    __slots__ = RECENT_FIELDS + ("event", "text")
+
+    def __init__(self, source, occurrences: int = 1, last_timestamp: Optional[datetime] = None):
+        self.id = source.id
+        self.timestamp = source.timestamp
+        self.id_device = source.id_device
+        self.id_user = source.id_user
+        self.id_action = source.id_action
+        self.access_type = source.access_type
+        self.event_code = source.event_code
+        self.id_subject_user = getattr(source, "id_subject_user", None)
+        self.id_card = getattr(source, "id_card", None)
+        self.occurrences = occurrences
+        self.last_timestamp = last_timestamp
+        self.event = source.event or ""  # Detalle guardado en el log
+        self.text: Optional[str] = None  # Texto generado (caché)
+
+    def as_dict(self) -> dict:
+        return {**{field: getattr(self, field) for field in RECENT_FIELDS}, "event": self.text}
+
+
+class RecentEventBuffer:
+    def __init__(self, capacity: int):
+        self.capacity = max(capacity, 1)
+        self._buffers: Dict[int, Deque[RecentEvent]] = {}
+        self._by_id: Dict[int, RecentEvent] = {}  # Solo registros presentes en algún buffer
+        self._lock = threading.Lock()
+        self.stats = {"appended": 0, "occurrences": 0, "backfilled": 0, "rendered": 0}
+
+    # ---------------------- ESCRITURA ----------------------
+    def _append(self, entry: RecentEvent):
+        buffer = self._buffers.get(entry.id_device)
+        if buffer is None:
+            buffer = self._buffers[entry.id_device] = deque(maxlen=self.capacity)
+        if len(buffer) == self.capacity:
+            oldest = buffer[0]
+            if oldest.id is not None:
+                self._by_id.pop(oldest.id, None)
+        buffer.append(entry)
+        if entry.id is not None:
+            self._by_id[entry.id] = entry
+
+    def on_logs(self, records: List[log_events.LogRecord]):
+        """Suscriptor de log_events: agrega los logs confirmados."""
+        with self._lock:
+            for record in records:
+                self._append(RecentEvent(record))
+            self.stats["appended"] += len(records)
+
+    def on_occurrences(self, records: List[log_events.LogRecord]):
+        """Repeticiones compactadas: actualizan el contador del log original."""
+        with self._lock:
+            for record in records:
+                entry = self._by_id.get(record.id) if record.id is not None else None
+                if entry is None:
+                    continue
+                entry.occurrences += 1
+                entry.last_timestamp = record.timestamp
+                entry.text = None
+                self.stats["occurrences"] += 1
+
+    def backfill(self) -> int:
+        """Carga los últimos logs de cada dispositivo desde la base."""
+        from core.database import SessionLocal
+        with SessionLocal() as session:
+            return self._backfill(session)
+
+    def _backfill(self, session: Session) -> int:
+        from models.devices import Device
+        from models.logs import Log
+
+        loaded = 0
+        for (device_id,) in session.query(Device.id).all():
+            rows = (
+                session.query(Log)
+                .filter(Log.id_device == device_id)
+                .order_by(Log.timestamp.desc(), Log.id.desc())
+                .limit(self.capacity)
+                .all()
+            )
+            entries = [RecentEvent(row, row.occurrences or 1, row.last_timestamp) for row in reversed(rows)]
+            loaded += len(entries)
+
+            with self._lock:
+                # Los logs que llegaron mientras se consultaba ya están en el buffer
+                live = list(self._buffers.get(device_id, ()))
+                live_ids = {entry.id for entry in live if entry.id is not None}
+                merged = [entry for entry in entries if entry.id not in live_ids] + live
+                merged.sort(key=lambda entry: (entry.timestamp, entry.id or 0))
+
+                for entry in self._buffers.get(device_id, ()):
+                    if entry.id is not None:
+                        self._by_id.pop(entry.id, None)
+                self._buffers[device_id] = deque(maxlen=self.capacity)
+                for entry in merged[-self.capacity:]:
+                    self._append(entry)
+
+        self.stats["backfilled"] += loaded
+        return loaded
+
+    # ---------------------- LECTURA ----------------------
+    def recent(self, device_id: int, limit: Optional[int] = None) -> List[RecentEvent]:
+        """Últimos `limit` eventos del dispositivo, del más reciente al más antiguo."""
+        with self._lock:
+            buffer = self._buffers.get(device_id)
+            if not buffer:
+                return []
+            return list(islice(reversed(buffer), limit or self.capacity))
+
+    def render(self, entries: List[RecentEvent]) -> List[dict]:
+        """Diccionarios de salida; solo consulta nombres de los registros aún sin texto."""
+        missing = [entry for entry in entries if entry.text is None]
+        if missing:
+            from core.database import SessionLocal
+            with SessionLocal() as session:
+                texts = EventRenderer(session).render_all(missing)
+            for entry, text in zip(missing, texts):
+                entry.text = text
+            self.stats["rendered"] += len(missing)
+        return [entry.as_dict() for entry in entries]
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "capacity": self.capacity,
+                "devices": len(self._buffers),
+                "buffered": sum(len(buffer) for buffer in self._buffers.values()),
+            }
+
+
+# Instancia global
+recent_events = RecentEventBuffer(settings.RECENT_EVENTS_PER_DEVICE)
+log_events.subscribe(recent_events.on_logs)
+log_events.subscribe_occurrences(recent_events.on_occurrences)
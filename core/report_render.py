@@ -0,0 +1,94 @@
+"""
+Renderizado de reportes a PDF / CSV.
+
+Este módulo se ejecuta dentro de los procesos del pool de reportes: solo
+depende de la librería estándar y de reportlab, y recibe datos ya preparados
+(listas de strings y números), nunca sesiones ni modelos.
+"""
+import csv
+import io
+from typing import Dict
+
+
+def render_report(fmt: str, payload: Dict) -> bytes:
+    """Punto de entrada del pool: devuelve el archivo completo en bytes."""
+    if fmt == "csv":
+        return _render_csv(payload)
+    return _render_pdf(payload)
+
+
+def _render_csv(payload: Dict) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([payload["title"]])
+    writer.writerow([payload["subtitle"]])
+    writer.writerow([])
+    writer.writerow(payload["summary_columns"])
+    writer.writerows(payload["summary_rows"])
+    writer.writerow([])
+    writer.writerow(payload["detail_columns"])
+    writer.writerows(payload["detail_rows"])
+    if payload.get("detail_truncated"):
+        writer.writerow([payload["detail_truncated"]])
+    # BOM para que Excel abra el archivo como UTF-8
+    return ("\ufeff" + buffer.getvalue()).encode("utf-8")
+
+
+def _render_pdf(payload: Dict) -> bytes:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, Spacer
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=landscape(A4),
+        leftMargin=1.5 * cm,
+        rightMargin=1.5 * cm,
+        topMargin=1.5 * cm,
+        bottomMargin=1.5 * cm,
+        title=payload["title"],
+    )
+    styles = getSampleStyleSheet()
+    cell_style = styles["BodyText"].clone("cell", fontSize=7, leading=8)
+
+    table_style = [
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1f3a5f")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, -1), 7),
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#eef2f7")]),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ]
+
+    def table(columns, rows):
+        data = [columns] + [
+            [Paragraph(str(value), cell_style) if isinstance(value, str) and len(value) > 30 else value for value in row]
+            for row in rows
+        ]
+        result = LongTable(data, repeatRows=1)
+        result.setStyle(table_style)
+        return result
+
+    story = [
+        Paragraph(payload["title"], styles["Title"]),
+        Paragraph(payload["subtitle"], styles["Normal"]),
+        Paragraph(f"Generado: {payload['generated_at']}", styles["Normal"]),
+        Spacer(1, 0.5 * cm),
+        Paragraph("Resumen", styles["Heading2"]),
+        table(payload["summary_columns"], payload["summary_rows"]),
+        Spacer(1, 0.5 * cm),
+        Paragraph("Detalle de accesos", styles["Heading2"]),
+    ]
+    if payload["detail_rows"]:
+        story.append(table(payload["detail_columns"], payload["detail_rows"]))
+    else:
+        story.append(Paragraph("Sin accesos en el período.", styles["Normal"]))
+    if payload.get("detail_truncated"):
+        story.append(Paragraph(payload["detail_truncated"], styles["Italic"]))
+
+    doc.build(story)
+    return buffer.getvalue()
@@ -0,0 +1,274 @@
+"""
+Reportes mensuales de accesos por usuario y por dispositivo.
+
+Los datos se leen en un hilo (consultas a la base) y el PDF/CSV se genera en
+un pool de procesos (core/report_render.py), así reportlab nunca bloquea el
+event loop. Los archivos terminados quedan en disco bajo una clave
+(tipo, filtros, formato, marca de agua); la marca de agua es el conteo y el
+id máximo de los logs del período, de modo que un reporte solo se vuelve a
+generar cuando llegan logs nuevos a su rango.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from core.access_analytics import ACCESS_TYPES
+from core.config import settings
+from core.database import SessionLocal
+from core.event_codes import EventRenderer
+from core.report_render import render_report
+from core.time_utils import colombia_month_range, format_colombia_time, format_colombia_time_for_display
+from models.devices import Device
+from models.logs import Log
+from models.users import User
+
+REPORT_TYPES = ("user", "device")
+REPORT_FORMATS = ("pdf", "csv")
+ACCESS_LABELS = {"nfc": "NFC", "pin": "PIN", "local": "Local"}
+
+
+class ReportService:
+    def __init__(self, cache_dir: str, workers: int, max_files: int):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.max_files = max_files
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {"cache_hits": 0, "renders": 0, "errors": 0}
+
+    # ---------------------- POOL ----------------------
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=max(self.workers, 1))
+            return self._pool
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    # ---------------------- DATOS ----------------------
+    def _base_query(self, session: Session, report_type: str, start: datetime, end: datetime,
+                    id_user: Optional[int], id_device: Optional[int]):
+        query = session.query(Log).filter(
+            Log.timestamp >= start,
+            Log.timestamp < end,
+            Log.access_type.in_(ACCESS_TYPES),
+        )
+        if report_type == "user":
+            query = query.filter(Log.id_user.isnot(None))
+        if id_user:
+            query = query.filter(Log.id_user == id_user)
+        if id_device:
+            query = query.filter(Log.id_device == id_device)
+        return query
+
+    def watermark(self, query) -> Tuple[int, int]:
+        """(conteo, id máximo) de los logs del reporte: cambia si llegan logs nuevos."""
+        count, max_id = query.with_entities(func.count(Log.id), func.max(Log.id)).order_by(None).one()
+        return int(count or 0), int(max_id or 0)
+
+    def build_payload(self, session: Session, report_type: str, year: int, month: int,
+                      id_user: Optional[int], id_device: Optional[int]) -> Dict:
+        """Agrega los logs del mes y prepara los datos planos para el renderizador."""
+        start, end = colombia_month_range(year, month)
+        query = self._base_query(session, report_type, start, end, id_user, id_device)
+        rows = (
+            query.with_entities(
+                Log.timestamp, Log.id_device, Log.id_user, Log.access_type, Log.event_code,
+                Log.event, Log.id_subject_user, Log.id_card, Log.id_action, Log.occurrences,
+            )
+            .order_by(Log.timestamp, Log.id)
+            .yield_per(5000)
+        )
+
+        groups: Dict[int, dict] = defaultdict(lambda: {
+            "total": 0, "by_type": Counter(), "days": set(), "others": set(), "first": None, "last": None,
+        })
+        detail = []
+        total_rows = 0
+        for row in rows:
+            total_rows += 1
+            key = row.id_user if report_type == "user" else row.id_device
+            group = groups[key]
+            group["total"] += 1
+            group["by_type"][row.access_type] += 1
+            group["days"].add(format_colombia_time(row.timestamp, "%Y-%m-%d"))
+            group["others"].add(row.id_device if report_type == "user" else row.id_user)
+            group["first"] = group["first"] or row.timestamp
+            group["last"] = row.timestamp
+            if len(detail) < settings.REPORT_MAX_DETAIL_ROWS:
+                detail.append(row)
+
+        user_ids = {row.id_user for row in detail if row.id_user} | (set(groups) if report_type == "user" else set())
+        device_ids = {row.id_device for row in detail} | (set(groups) if report_type == "device" else set())
+        users = {
+            uid: f"{name} ({username})"
+            for uid, name, username in session.query(User.id, User.name, User.username).filter(User.id.in_(user_ids))
+        } if user_ids else {}
+        devices = dict(
+            session.query(Device.id, Device.name).filter(Device.id.in_(device_ids)).all()
+        ) if device_ids else {}
+
+        def user_label(uid):
+            return users.get(uid, f"Usuario {uid}") if uid else "-"
+
+        def device_label(did):
+            return devices.get(did, f"Dispositivo {did}")
+
+        summary_rows = []
+        for key, group in sorted(groups.items(), key=lambda item: item[1]["total"], reverse=True):
+            summary_rows.append([
+                user_label(key) if report_type == "user" else device_label(key),
+                group["total"],
+                *[group["by_type"].get(access_type, 0) for access_type in ACCESS_TYPES],
+                len(group["days"]),
+                len({other for other in group["others"] if other}),
+                format_colombia_time_for_display(group["first"]),
+                format_colombia_time_for_display(group["last"]),
+            ])
+
+        events = EventRenderer(session).render_all(detail)
+        detail_rows = [
+            [
+                format_colombia_time_for_display(row.timestamp),
+                user_label(row.id_user),
+                device_label(row.id_device),
+                ACCESS_LABELS.get(row.access_type, row.access_type),
+                event,
+            ]
+            for row, event in zip(detail, events)
+        ]
+
+        subject = "usuario" if report_type == "user" else "dispositivo"
+        filters = []
+        if id_user:
+            filters.append(f"usuario {user_label(id_user)}")
+        if id_device:
+            filters.append(f"dispositivo {device_label(id_device)}")
+        subtitle = f"Período: {month:02d}/{year} (hora Colombia) - {total_rows} accesos"
+        if filters:
+            subtitle += " - Filtro: " + ", ".join(filters)
+
+        return {
+            "title": f"Reporte mensual de accesos por {subject}",
+            "subtitle": subtitle,
+            "generated_at": format_colombia_time_for_display(datetime.utcnow()),
+            "summary_columns": [
+                "Usuario" if report_type == "user" else "Dispositivo",
+                "Accesos",
+                *[ACCESS_LABELS[access_type] for access_type in ACCESS_TYPES],
+                "Días con acceso",
+                "Dispositivos" if report_type == "user" else "Usuarios distintos",
+                "Primer acceso",
+                "Último acceso",
+            ],
+            "summary_rows": summary_rows,
+            "detail_columns": ["Fecha y hora", "Usuario", "Dispositivo", "Tipo", "Evento"],
+            "detail_rows": detail_rows,
+            "detail_truncated": (
+                f"Detalle limitado a los primeros {len(detail_rows)} de {total_rows} accesos."
+                if total_rows > len(detail_rows) else None
+            ),
+        }
+
+    # ---------------------- CACHÉ ----------------------
+    def _cache_path(self, report_type: str, year: int, month: int, fmt: str,
+                    id_user: Optional[int], id_device: Optional[int], watermark: Tuple[int, int]) -> str:
+        key = json.dumps([report_type, year, month, fmt, id_user, id_device, list(watermark)])
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.cache_dir, f"{report_type}-{year}-{month:02d}-{digest}.{fmt}")
+
+    def _evict(self):
+        files = [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(REPORT_FORMATS)
+        ]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _store(self, path: str, data: bytes):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    # ---------------------- API ----------------------
+    async def get_report(self, report_type: str, year: int, month: int, fmt: str,
+                         id_user: Optional[int] = None, id_device: Optional[int] = None) -> Tuple[str, bool]:
+        """Devuelve (ruta del archivo, si salió de caché)."""
+        def locate():
+            with SessionLocal() as session:
+                start, end = colombia_month_range(year, month)
+                query = self._base_query(session, report_type, start, end, id_user, id_device)
+                return self._cache_path(report_type, year, month, fmt, id_user, id_device, self.watermark(query))
+
+        path = await asyncio.to_thread(locate)
+        if os.path.exists(path):
+            os.utime(path)  # Reciente para la política LRU
+            self.stats["cache_hits"] += 1
+            return path, True
+
+        # Peticiones simultáneas del mismo reporte comparten una sola generación
+        task = self._inflight.get(path)
+        if task is None:
+            task = asyncio.ensure_future(self._render(path, report_type, year, month, fmt, id_user, id_device))
+            self._inflight[path] = task
+            task.add_done_callback(lambda _: self._inflight.pop(path, None))
+        await asyncio.shield(task)
+        return path, False
+
+    async def _render(self, path: str, report_type: str, year: int, month: int, fmt: str,
+                      id_user: Optional[int], id_device: Optional[int]):
+        def prepare():
+            with SessionLocal() as session:
+                return self.build_payload(session, report_type, year, month, id_user, id_device)
+
+        try:
+            payload = await asyncio.to_thread(prepare)
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(self._executor(), render_report, fmt, payload)
+            await asyncio.to_thread(self._store, path, data)
+            self.stats["renders"] += 1
+            print(f"📄 Reporte generado: {os.path.basename(path)} ({len(data)} bytes)")
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"❌ Error generando reporte: {e}")
+            raise
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "rendering": len(self._inflight),
+            "workers": self.workers,
+            "cache_dir": self.cache_dir,
+        }
+
+
+# Instancia global
+report_service = ReportService(
+    settings.REPORT_CACHE_DIR,
+    settings.REPORT_WORKERS,
+    settings.REPORT_CACHE_MAX_FILES,
+)
@@ -338,24 +338,42 @@ def sanitize_input(input_string: str, max_length: int = 255) -> str:
     return input_string
 
 # ---------------------- FUNCIONES DE AUDITORÍA ----------------------
-def log_security_event(session: Session, event: str, user_id: int = None, details: str = None):
+def log_security_event(
+    session: Session,
+    event,
+    user_id: int = None,
+    details: str = None,
+    access_type: str = "security",
+    device_id: int = 1,
+):
     """
-    Registra un evento de seguridad en los logs.
+    Registra un evento de seguridad en los logs (compactando repeticiones).
+    `event` es un EventCode; un texto libre se guarda como SECURITY_OTHER.
     """
     try:
         from models.logs import Log
+        from core.event_codes import EventCode
+        
+        if isinstance(event, EventCode):
+            event_code, detail = event, details or ""
+        else:
+            event_code = EventCode.SECURITY_OTHER
+            detail = f"{event} - {details}" if details else event
+        
+        if settings.SECURITY_COMPACTION_WINDOW_SECONDS > 0:
+            from core.security_compaction import security_compactor
+            security_compactor.record(session, event_code, user_id, device_id, detail[:255], access_type)
+            return
         
         log_entry = Log(
-            id_device=1,  # Sistema principal
+            id_device=device_id,  # 1 = sistema principal
             id_user=user_id,
-            event=f"SEGURIDAD: {event}",
-            access_type="security",
+            event_code=event_code,
+            event=detail[:255],
+            access_type=access_type,
             timestamp=datetime.utcnow()
         )
         
-        if details:
-            log_entry.event += f" - {details}"
-        
         session.add(log_entry)
         session.commit()
         
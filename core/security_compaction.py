@@ -0,0 +1,161 @@
+"""
+Compactación de eventos de seguridad repetidos.
+
+La primera ocurrencia de (código, usuario, dispositivo, detalle) dentro de una
+ventana se escribe enseguida como un log normal. Las siguientes solo
+incrementan un contador en memoria. Al cerrarse la ventana, el mismo log se
+actualiza con `occurrences` y `last_timestamp`. Una ráfaga de miles de
+intentos fallidos queda en una fila y dos escrituras por ventana.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from core import log_events
+from core.config import settings
+from core.database import engine
+from models.logs import Log
+
+# (event_code, id_user, id_device, detalle)
+CompactionKey = Tuple[int, Optional[int], int, str]
+
+
+class _Window:
+    __slots__ = ("opened_at", "log_id", "count", "flushed_count", "first_timestamp", "last_timestamp", "access_type")
+
+    def __init__(self, now: datetime, access_type: str):
+        self.opened_at = time.monotonic()
+        self.log_id: Optional[int] = None
+        self.count = 1
+        self.flushed_count = 1
+        self.first_timestamp = now
+        self.last_timestamp = now
+        self.access_type = access_type
+
+
+class SecurityEventCompactor:
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._windows: Dict[CompactionKey, _Window] = {}
+        self._lock = threading.Lock()
+        self.stats = {"events": 0, "rows_written": 0, "compacted": 0}
+
+    def record(
+        self,
+        session: Session,
+        event_code: int,
+        user_id: Optional[int],
+        device_id: int,
+        detail: str,
+        access_type: str = "security",
+    ):
+        """Registra una ocurrencia; solo escribe en la base si abre ventana."""
+        key = (int(event_code), user_id, device_id, detail)
+        now = datetime.utcnow()
+
+        with self._lock:
+            self.stats["events"] += 1
+            stale = self._windows.get(key)
+            compacted = stale is not None and time.monotonic() - stale.opened_at < self.window_seconds
+            if compacted:
+                stale.count += 1
+                stale.last_timestamp = now
+                self.stats["compacted"] += 1
+            else:
+                window = self._windows[key] = _Window(now, access_type)
+
+        if compacted:
+            # La repetición no genera fila, pero los detectores la necesitan
+            log_events.publish_occurrences([log_events.LogRecord(
+                id=stale.log_id,
+                id_device=device_id,
+                id_user=user_id,
+                id_action=None,
+                event=detail,
+                access_type=access_type,
+                timestamp=now,
+                event_code=int(event_code),
+            )])
+            return
+
+        if stale and stale.count > stale.flushed_count:
+            # Ventana vencida que la tarea de fondo aún no había cerrado
+            self._write(key, stale)
+
+        log_entry = Log(
+            id_device=device_id,
+            id_user=user_id,
+            event_code=event_code,
+            event=detail,
+            access_type=access_type,
+            timestamp=now,
+        )
+        session.add(log_entry)
+        session.commit()
+
+        with self._lock:
+            window.log_id = log_entry.id
+            self.stats["rows_written"] += 1
+
+    # ---------------------- CIERRE DE VENTANAS ----------------------
+    def _write(self, key: CompactionKey, window: _Window):
+        event_code, user_id, device_id, detail = key
+        try:
+            with engine.begin() as connection:
+                if window.log_id is not None:
+                    connection.execute(
+                        update(Log.__table__)
+                        .where(Log.__table__.c.id == window.log_id)
+                        .values(occurrences=window.count, last_timestamp=window.last_timestamp)
+                    )
+                else:
+                    # La escritura inicial falló: se inserta la fila completa
+                    connection.execute(Log.__table__.insert().values(
+                        id_device=device_id,
+                        id_user=user_id,
+                        event_code=event_code,
+                        event=detail,
+                        access_type=window.access_type,
+                        timestamp=window.first_timestamp,
+                        occurrences=window.count,
+                        last_timestamp=window.last_timestamp,
+                    ))
+                    self.stats["rows_written"] += 1
+            window.flushed_count = window.count
+        except Exception as e:
+            print(f"❌ Error compactando eventos de seguridad: {e}")
+
+    def flush(self, force: bool = False) -> int:
+        """Cierra las ventanas vencidas (o todas con `force`)."""
+        now = time.monotonic()
+        with self._lock:
+            expired: List[Tuple[CompactionKey, _Window]] = [
+                (key, window) for key, window in self._windows.items()
+                if force or now - window.opened_at >= self.window_seconds
+            ]
+            for key, _ in expired:
+                self._windows.pop(key, None)
+
+        for key, window in expired:
+            if window.count > window.flushed_count:
+                self._write(key, window)
+        return len(expired)
+
+    async def run(self, interval: float = 1.0):
+        """Tarea de fondo: cierra las ventanas a medida que vencen."""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.flush)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "open_windows": len(self._windows), "window_seconds": self.window_seconds}
+
+
+# Instancia global
+security_compactor = SecurityEventCompactor(settings.SECURITY_COMPACTION_WINDOW_SECONDS)
@@ -0,0 +1,32 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Any
+
+class StartupReport:
+    """Registra el tiempo de cada fase del arranque del backend."""
+
+    def __init__(self):
+        self.phases: List[Dict[str, Any]] = []
+        self.details: Dict[str, Any] = {}
+        self._started = time.perf_counter()
+        self.total_ms: float = 0.0
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+            self.phases.append({"phase": name, "ms": elapsed_ms})
+
+    def finish(self):
+        self.total_ms = round((time.perf_counter() - self._started) * 1000, 1)
+
+    def print_summary(self):
+        print(f"⏱️ Arranque completado en {self.total_ms} ms")
+        for item in self.phases:
+            print(f"   • {item['phase']}: {item['ms']} ms")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"total_ms": self.total_ms, "phases": self.phases, **self.details}
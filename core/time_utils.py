@@ -27,4 +27,46 @@ def format_colombia_time_for_display(utc_time: datetime) -> str:
     """
     Formato más legible para interfaz de usuario
     """
-    return format_colombia_time(utc_time, "%d/%m/%Y %I:%M:%S %p")
\ No newline at end of file
+    return format_colombia_time(utc_time, "%d/%m/%Y %I:%M:%S %p")
+
+def to_naive_utc(value: datetime) -> datetime:
+    """
+    Normaliza una fecha a UTC sin zona horaria (como se guardan en la base de datos).
+    Las fechas sin zona se asumen ya en UTC.
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def resolve_query_range(start: datetime = None, end: datetime = None, window_days: int = 0):
+    """
+    Devuelve (inicio, fin) en UTC sin zona para filtrar consultas. Sin inicio,
+    se usa la medianoche UTC `window_days` días antes del fin (o de hoy);
+    con `window_days` 0 el rango queda abierto.
+    """
+    if end is not None:
+        end = to_naive_utc(end)
+    if start is not None:
+        start = to_naive_utc(start)
+    elif window_days > 0:
+        anchor = (end or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+        start = anchor - timedelta(days=window_days)
+    return start, end
+
+def colombia_month_range(year: int, month: int):
+    """
+    Límites en UTC sin zona de un mes calendario en hora Colombia:
+    (inicio inclusive, fin exclusivo).
+    """
+    colombia_tz = timezone(timedelta(hours=-5))
+    start = datetime(year, month, 1, tzinfo=colombia_tz)
+    end = datetime(year + (month == 12), month % 12 + 1, 1, tzinfo=colombia_tz)
+    return to_naive_utc(start), to_naive_utc(end)
+
+def colombia_to_utc(local_time: datetime) -> datetime:
+    """
+    Convierte una hora local de Colombia (sin zona) a UTC sin zona.
+    Colombia no tiene horario de verano: el desfase es siempre UTC-5.
+    """
+    colombia_tz = timezone(timedelta(hours=-5))
+    return to_naive_utc(local_time.replace(tzinfo=colombia_tz))
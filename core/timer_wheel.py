@@ -0,0 +1,103 @@
+"""
+Rueda de temporizadores jerárquica (hierarchical timing wheel).
+
+Cada nivel tiene SLOTS ranuras; una ranura del nivel 0 es un tick, una del
+nivel 1 son SLOTS ticks, y así sucesivamente. Un temporizador se guarda en
+el nivel más bajo que alcanza su vencimiento, y cuando el reloj entra en la
+ranura de un nivel superior sus temporizadores bajan (cascada) al nivel que
+les corresponde. Programar y cancelar son O(1), y avanzar un tick solo
+toca la ranura actual: miles de temporizadores pendientes no cuestan nada
+mientras no venzan.
+
+Con 64 ranuras, 4 niveles y ticks de 1 s el horizonte es de ~194 días; lo
+que vence más lejos espera en una lista aparte hasta acercarse.
+"""
+import math
+from typing import Dict, Hashable, List, Tuple
+
+SLOTS = 64
+
+
+class TimerWheel:
+    def __init__(self, start: float, tick_seconds: float = 1.0, levels: int = 4):
+        self.tick_seconds = tick_seconds
+        self.levels = levels
+        self._current = int(start // tick_seconds)  # Último tick procesado
+        self._wheels: List[List[Dict[Hashable, int]]] = [
+            [{} for _ in range(SLOTS)] for _ in range(levels)
+        ]
+        self._overflow: Dict[Hashable, int] = {}
+        self._where: Dict[Hashable, Tuple[int, int]] = {}  # id -> (nivel, ranura); nivel -1 = overflow
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, timer_id: Hashable) -> bool:
+        return timer_id in self._where
+
+    def schedule(self, timer_id: Hashable, when: float):
+        """Programa (o reprograma) `timer_id` para el instante `when` (segundos epoch)."""
+        self.cancel(timer_id)
+        # Lo ya vencido sale en el próximo tick
+        self._place(timer_id, max(math.ceil(when / self.tick_seconds), self._current + 1))
+
+    def cancel(self, timer_id: Hashable) -> bool:
+        location = self._where.pop(timer_id, None)
+        if location is None:
+            return False
+        level, slot = location
+        if level < 0:
+            self._overflow.pop(timer_id, None)
+        else:
+            self._wheels[level][slot].pop(timer_id, None)
+        return True
+
+    def _place(self, timer_id: Hashable, tick: int):
+        delta = tick - self._current
+        for level in range(self.levels):
+            if delta < SLOTS ** (level + 1):
+                slot = (tick // SLOTS ** level) % SLOTS
+                self._wheels[level][slot][timer_id] = tick
+                self._where[timer_id] = (level, slot)
+                return
+        self._overflow[timer_id] = tick
+        self._where[timer_id] = (-1, 0)
+
+    def _cascade(self, level: int):
+        slot = (self._current // SLOTS ** level) % SLOTS
+        timers, self._wheels[level][slot] = self._wheels[level][slot], {}
+        for timer_id, tick in timers.items():
+            self._place(timer_id, tick)
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Avanza el reloj hasta `now` y devuelve los temporizadores vencidos, en orden."""
+        target = int(now // self.tick_seconds)
+        fired: List[Hashable] = []
+        while self._current < target:
+            if not self._where:
+                self._current = target
+                break
+            self._current += 1
+            # De arriba hacia abajo: un nivel alto puede bajar timers a la ranura actual de uno inferior
+            if self._overflow and self._current % SLOTS ** (self.levels - 1) == 0:
+                overflow, self._overflow = self._overflow, {}
+                for timer_id, tick in overflow.items():
+                    self._place(timer_id, tick)
+            for level in range(self.levels - 1, 0, -1):
+                if self._current % SLOTS ** level == 0:
+                    self._cascade(level)
+
+            slot = self._current % SLOTS
+            due, self._wheels[0][slot] = self._wheels[0][slot], {}
+            for timer_id in due:
+                self._where.pop(timer_id, None)
+                fired.append(timer_id)
+        return fired
+
+    def get_stats(self) -> dict:
+        return {
+            "timers": len(self._where),
+            "per_level": [sum(len(slot) for slot in wheel) for wheel in self._wheels],
+            "overflow": len(self._overflow),
+            "tick_seconds": self.tick_seconds,
+        }
@@ -0,0 +1,190 @@
+"""
+Resumen de accesos por usuario, desnormalizado en la tabla `users`.
+
+Columnas: último acceso a una puerta (`last_access_at`), dispositivo de ese
+acceso (`last_access_device`) y accesos del mes en curso
+(`month_access_count`, válido para `month_access_period`, AAAA-MM en hora
+Colombia). Los accesos concedidos que publica core/log_events se acumulan en
+memoria y se vuelcan cada pocos segundos con un UPDATE por usuario que suma
+al contador (o lo reinicia si cambió el mes), así que varios workers pueden
+escribir sobre las mismas filas. `rebuild` recalcula todo desde `logs`.
+"""
+import asyncio
+import threading
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import and_, bindparam, case, func, or_, update
+from sqlalchemy.orm import Session
+
+from core import log_events
+from core.database import SessionLocal, engine
+from core.event_codes import ACCESS_GRANTED_CODES
+from core.time_utils import colombia_month_range, format_colombia_time, get_current_colombia_time
+from models.logs import Log
+from models.users import User
+
+# (id_user, período AAAA-MM) -> [conteo, último timestamp, dispositivo del último]
+SummaryKey = Tuple[int, str]
+
+
+def _period(timestamp: datetime) -> str:
+    return format_colombia_time(timestamp, "%Y-%m")
+
+
+def _update_statement():
+    users = User.__table__
+    newer = or_(users.c.last_access_at.is_(None), users.c.last_access_at < bindparam("b_last"))
+    # Orden explícito: MySQL evalúa las asignaciones de izquierda a derecha con
+    # los valores ya actualizados, así que cada columna se calcula antes de
+    # modificar las columnas de las que depende.
+    return (
+        update(users)
+        .where(users.c.id == bindparam("b_id"))
+        .ordered_values(
+            (users.c.month_access_count, case(
+                (users.c.month_access_period == bindparam("b_period"),
+                 users.c.month_access_count + bindparam("b_count")),
+                (or_(users.c.month_access_period.is_(None),
+                     users.c.month_access_period < bindparam("b_period")),
+                 bindparam("b_count")),
+                else_=users.c.month_access_count,
+            )),
+            (users.c.month_access_period, case(
+                (or_(users.c.month_access_period.is_(None),
+                     users.c.month_access_period < bindparam("b_period")),
+                 bindparam("b_period")),
+                else_=users.c.month_access_period,
+            )),
+            (users.c.last_access_device, case(
+                (newer, bindparam("b_device")), else_=users.c.last_access_device,
+            )),
+            (users.c.last_access_at, case(
+                (newer, bindparam("b_last")), else_=users.c.last_access_at,
+            )),
+        )
+    )
+
+
+class UserAccessSummary:
+    def __init__(self):
+        self._pending: Dict[SummaryKey, list] = {}
+        self._lock = threading.Lock()
+        self.stats = {"accesses": 0, "flushes": 0, "rows_updated": 0, "rebuilds": 0}
+
+    # ---------------------- ESCRITURA ----------------------
+    def record(self, records: List[log_events.LogRecord]):
+        """Suscriptor de log_events: acumula los accesos concedidos por usuario."""
+        with self._lock:
+            for record in records:
+                if record.id_user is None or record.event_code not in ACCESS_GRANTED_CODES:
+                    continue
+                self.stats["accesses"] += 1
+                key = (record.id_user, _period(record.timestamp))
+                entry = self._pending.get(key)
+                if entry is None:
+                    self._pending[key] = [1, record.timestamp, record.id_device]
+                    continue
+                entry[0] += 1
+                if record.timestamp >= entry[1]:
+                    entry[1], entry[2] = record.timestamp, record.id_device
+
+    def flush(self) -> int:
+        """Vuelca los accesos acumulados a las columnas de `users`."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        # Los meses anteriores primero, para que el reinicio del contador sea correcto
+        rows = [
+            {"b_id": user_id, "b_period": period, "b_count": count, "b_last": last, "b_device": device}
+            for (user_id, period), (count, last, device) in sorted(pending.items(), key=lambda item: item[0][1])
+        ]
+        try:
+            with engine.begin() as connection:
+                connection.execute(_update_statement(), rows)
+            self.stats["flushes"] += 1
+            self.stats["rows_updated"] += len(rows)
+            return len(rows)
+        except Exception as e:
+            # Devolver los accesos para reintentar en el siguiente volcado
+            with self._lock:
+                for key, (count, last, device) in pending.items():
+                    entry = self._pending.setdefault(key, [0, last, device])
+                    entry[0] += count
+                    if last >= entry[1]:
+                        entry[1], entry[2] = last, device
+            print(f"❌ Error volcando resumen de accesos por usuario: {e}")
+            return 0
+
+    async def run(self, interval: float):
+        """Tarea de fondo: vuelca el resumen cada `interval` segundos."""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.flush)
+
+    # ---------------------- RECONSTRUCCIÓN ----------------------
+    def rebuild(self) -> dict:
+        """Recalcula el resumen de todos los usuarios a partir de `logs`."""
+        self.flush()
+        with SessionLocal() as session:
+            result = self._rebuild(session)
+        self.stats["rebuilds"] += 1
+        return result
+
+    def _rebuild(self, session: Session) -> dict:
+        now = get_current_colombia_time()
+        period = now.strftime("%Y-%m")
+        start, end = colombia_month_range(now.year, now.month)
+        granted = Log.event_code.in_([int(code) for code in ACCESS_GRANTED_CODES])
+
+        month_counts = dict(
+            session.query(Log.id_user, func.count(Log.id))
+            .filter(granted, Log.id_user.isnot(None), Log.timestamp >= start, Log.timestamp < end)
+            .group_by(Log.id_user)
+            .all()
+        )
+
+        # Último acceso por usuario y el dispositivo de esa fila
+        latest = (
+            session.query(Log.id_user.label("id_user"), func.max(Log.timestamp).label("last"))
+            .filter(granted, Log.id_user.isnot(None))
+            .group_by(Log.id_user)
+            .subquery()
+        )
+        last_access = {}
+        for user_id, timestamp, device_id, log_id in (
+            session.query(Log.id_user, Log.timestamp, Log.id_device, Log.id)
+            .join(latest, and_(Log.id_user == latest.c.id_user, Log.timestamp == latest.c.last))
+            .filter(granted)
+        ):
+            current = last_access.get(user_id)
+            if current is None or log_id > current[2]:
+                last_access[user_id] = (timestamp, device_id, log_id)
+
+        users = session.query(User).all()
+        for user in users:
+            timestamp, device_id, _ = last_access.get(user.id, (None, None, None))
+            user.last_access_at = timestamp
+            user.last_access_device = device_id
+            user.month_access_period = period
+            user.month_access_count = month_counts.get(user.id, 0)
+        session.commit()
+
+        print(f"🔄 Resumen de accesos reconstruido para {len(users)} usuarios")
+        return {
+            "users": len(users),
+            "users_with_access": len(last_access),
+            "month": period,
+            "month_accesses": sum(month_counts.values()),
+        }
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "pending_users": len(self._pending)}
+
+
+# Instancia global
+user_access_summary = UserAccessSummary()
+log_events.subscribe(user_access_summary.record)
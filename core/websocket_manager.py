@@ -1,17 +1,155 @@
+"""
+Conexiones WebSocket de dispositivos y del panel.
+
+Los mensajes a un dispositivo pasan por su cola de salida con clases de
+prioridad: `critical` (EMERGENCY, NFC_DISABLE, aperturas, acceso por PIN y
+respuestas al propio dispositivo), `normal` (resto de comandos y cambios de
+estado de acciones) y `bulk` (avisos de login, renovación de token, registro
+de tarjetas; la única clase que se descarta si se acumula). Un escritor por
+dispositivo envía siempre primero lo más urgente, así que en un enlace
+congestionado una emergencia no espera detrás de los avisos. Todo lo que
+se escribe en el WebSocket de un dispositivo pasa por ese escritor. Se mide
+la espera en cola y la entrega por clase.
+"""
 from fastapi import WebSocket
-from typing import List, Dict, Any
+from collections import deque
+from typing import List, Dict, Any, Deque, Optional, Tuple
 import json
 import asyncio
+import time
+
+from core.command_tracing import LatencyHistogram
+from core.config import settings
+
+PRIORITY_CRITICAL, PRIORITY_NORMAL, PRIORITY_BULK = 0, 1, 2
+PRIORITY_NAMES = ("critical", "normal", "bulk")
+
+CRITICAL_ACTIONS = frozenset({"EMERGENCY", "NFC_DISABLE", "DOOR_OPEN", "GARAGE_OPEN"})
+CRITICAL_MESSAGE_TYPES = frozenset({"pin_access"})  # Alguien espera en la puerta
+BULK_MESSAGE_TYPES = frozenset({"login", "token_refreshed", "nfc_registration"})
+
+
+def action_priority(action: Optional[str]) -> int:
+    return PRIORITY_CRITICAL if action in CRITICAL_ACTIONS else PRIORITY_NORMAL
+
+
+def message_priority(message: Dict[str, Any]) -> int:
+    """Clase de prioridad de un mensaje según su acción o su tipo."""
+    action = message.get("action_type") or message.get("command")
+    if action:
+        return action_priority(action)
+    if message.get("type") in CRITICAL_MESSAGE_TYPES:
+        return PRIORITY_CRITICAL
+    if message.get("type") in BULK_MESSAGE_TYPES or message.get("event") in BULK_MESSAGE_TYPES:
+        return PRIORITY_BULK
+    return PRIORITY_NORMAL
+
+
+class _OutboundMessage:
+    __slots__ = ("text", "priority", "enqueued_at", "future", "started", "cancelled")
+
+    def __init__(self, text: str, priority: int):
+        self.text = text
+        self.priority = priority
+        self.enqueued_at = time.perf_counter()
+        self.future = asyncio.get_running_loop().create_future()
+        self.started = False
+        self.cancelled = False
+
+    def finish(self, sent: bool):
+        if not self.future.done():
+            self.future.set_result(sent)
+
+
+class _DeviceOutbox:
+    """
+    Cola de salida de un dispositivo: una fila por prioridad y un único
+    escritor que siempre toma primero la fila más urgente. Un mensaje que
+    ya se está escribiendo no se interrumpe, pero nada urgente espera
+    detrás de lo que aún está en cola.
+    """
+
+    def __init__(self, manager: "ConnectionManager", device_id: int, websocket: WebSocket):
+        self.manager = manager
+        self.device_id = device_id
+        self.websocket = websocket
+        self.queues: Tuple[Deque[_OutboundMessage], ...] = tuple(deque() for _ in PRIORITY_NAMES)
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.task = asyncio.create_task(self._writer())
+
+    def depths(self) -> Dict[str, int]:
+        return {name: len(queue) for name, queue in zip(PRIORITY_NAMES, self.queues) if queue}
+
+    def put(self, message: _OutboundMessage):
+        if self.closed:
+            message.finish(False)
+            return
+        queue = self.queues[message.priority]
+        if message.priority == PRIORITY_BULK and len(queue) >= settings.DEVICE_OUTBOX_BULK_LIMIT:
+            # Enlace congestionado: se descarta el aviso masivo más viejo
+            queue.popleft().finish(False)
+            self.manager.outbound_stats["bulk"]["dropped"] += 1
+        queue.append(message)
+        self.ready.set()
+
+    def _next(self) -> Optional[_OutboundMessage]:
+        for queue in self.queues:
+            while queue:
+                message = queue.popleft()
+                if not message.cancelled:
+                    return message
+        return None
+
+    async def _writer(self):
+        while True:
+            await self.ready.wait()
+            message = self._next()
+            if message is None:
+                self.ready.clear()
+                continue
+
+            message.started = True
+            counts = self.manager.outbound_stats[PRIORITY_NAMES[message.priority]]
+            started = time.perf_counter()
+            self.manager._queue_wait[message.priority].add((started - message.enqueued_at) * 1000)
+            try:
+                await self.websocket.send_text(message.text)
+            except Exception as e:
+                counts["failed"] += 1
+                message.finish(False)
+                print(f"❌ Error enviando al dispositivo {self.device_id}: {e}")
+                self.manager.disconnect(self.websocket, device_id=self.device_id)
+                return
+            counts["sent"] += 1
+            self.manager._delivery[message.priority].add((time.perf_counter() - message.enqueued_at) * 1000)
+            message.finish(True)
+
+    def close(self):
+        self.closed = True
+        self.task.cancel()
+        for queue in self.queues:
+            while queue:
+                queue.popleft().finish(False)
+
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
         self.device_connections: Dict[int, WebSocket] = {}  # 🔹 Dispositivos conectados por ID
+        self._outboxes: Dict[int, _DeviceOutbox] = {}
+        self.outbound_stats = {name: {"sent": 0, "failed": 0, "dropped": 0, "expired": 0} for name in PRIORITY_NAMES}
+        self._queue_wait = [LatencyHistogram() for _ in PRIORITY_NAMES]
+        self._delivery = [LatencyHistogram() for _ in PRIORITY_NAMES]
 
     async def connect(self, websocket: WebSocket, device_id: int = None):
         await websocket.accept()
         if device_id is not None:
+            previous = self._outboxes.pop(device_id, None)
+            if previous is not None:
+                previous.close()
             self.device_connections[device_id] = websocket
+            self._outboxes[device_id] = _DeviceOutbox(self, device_id, websocket)
             print(f"✅ Dispositivo {device_id} conectado ({len(self.device_connections)} dispositivos)")
         else:
             self.active_connections.append(websocket)
@@ -21,17 +159,22 @@ class ConnectionManager:
         if device_id is not None and device_id in self.device_connections:
             if self.device_connections[device_id] == websocket:
                 del self.device_connections[device_id]
+                outbox = self._outboxes.pop(device_id, None)
+                if outbox is not None:
+                    outbox.close()
                 print(f"❌ Dispositivo {device_id} desconectado ({len(self.device_connections)} restantes)")
         else:
             if websocket in self.active_connections:
                 self.active_connections.remove(websocket)
                 print(f"❌ Cliente desconectado ({len(self.active_connections)} restantes)")
 
-    async def send_json(self, websocket: WebSocket, message: Dict[str, Any]):
+    async def send_json(self, websocket: WebSocket, message: Dict[str, Any]) -> bool:
         try:
             await websocket.send_text(json.dumps(message))
+            return True
         except Exception as e:
             print(f"[Error al enviar mensaje WS] {e}")
+            return False
 
     async def broadcast_json(self, message: Dict[str, Any]):
         disconnected = []
@@ -44,18 +187,65 @@ class ConnectionManager:
         for ws in disconnected:
             self.disconnect(ws)
 
-    async def send_to_device(self, device_id: int, message: Dict[str, Any]):
-        """Envia mensaje solo a un dispositivo específico"""
-        ws = self.device_connections.get(device_id)
-        if ws:
-            try:
-                await self.send_json(ws, message)
-                print(f"✅ Mensaje enviado al dispositivo {device_id}: {message}")
-            except Exception as e:
-                print(f"❌ Error enviando al dispositivo {device_id}: {e}")
-                self.device_connections.pop(device_id, None)
-        else:
+    async def send_to_device(self, device_id: int, message: Dict[str, Any], priority: Optional[int] = None) -> bool:
+        """
+        Envia mensaje solo a un dispositivo específico, por su cola de salida.
+        Sin prioridad explícita se deduce del mensaje. Devuelve si se pudo enviar.
+        """
+        if device_id not in self._outboxes:
             print(f"⚠️ No hay conexión activa para el dispositivo {device_id}")
+            return False
+        if priority is None:
+            priority = message_priority(message)
+        if await self._enqueue(device_id, json.dumps(message), priority):
+            print(f"✅ Mensaje enviado al dispositivo {device_id}: {message}")
+            return True
+        print(f"❌ Error enviando al dispositivo {device_id}")
+        return False
+
+    async def send_text_to_device(
+        self, device_id: int, text: str, timeout: float = None, priority: int = PRIORITY_NORMAL,
+    ) -> bool:
+        """
+        Envía un mensaje ya serializado a un dispositivo, con tiempo máximo opcional
+        (espera en la cola más escritura). Para difusiones: el JSON se arma una sola
+        vez fuera de aquí.
+        """
+        return await self._enqueue(device_id, text, priority, timeout)
+
+    async def _enqueue(self, device_id: int, text: str, priority: int, timeout: float = None) -> bool:
+        outbox = self._outboxes.get(device_id)
+        if outbox is None:
+            return False
+        message = _OutboundMessage(text, priority)
+        outbox.put(message)
+        try:
+            return await asyncio.wait_for(asyncio.shield(message.future), timeout)
+        except asyncio.TimeoutError:
+            if not message.started:
+                # Aún en cola: no se enviará
+                message.cancelled = True
+                self.outbound_stats[PRIORITY_NAMES[priority]]["expired"] += 1
+            print(f"⏱️ Tiempo agotado enviando al dispositivo {device_id}")
+            return False
+
+    def get_outbound_stats(self) -> dict:
+        """Envíos, descartes y latencias por clase de prioridad; mensajes en cola por dispositivo."""
+        return {
+            "classes": {
+                name: {
+                    **counts,
+                    "queue_wait": self._queue_wait[index].as_dict(),
+                    "delivery": self._delivery[index].as_dict(),
+                }
+                for index, (name, counts) in enumerate(self.outbound_stats.items())
+            },
+            "queued": {
+                device_id: outbox.depths()
+                for device_id, outbox in self._outboxes.items()
+                if any(outbox.queues)
+            },
+        }
 
 # Instancia global
 manager = ConnectionManager()
\ No newline at end of file
@@ -1,41 +1,94 @@
-import requests
+"""
+Notificaciones por WhatsApp (CallMeBot, o el proveedor de
+core/notification_providers.py que indique NOTIFICATION_PROVIDER).
+
+Usa un único cliente httpx asíncrono compartido: conexiones reutilizadas
+(keep-alive) y tiempos máximos de conexión y lectura, así que un envío
+nunca bloquea el event loop ni se queda colgado. El cliente se abre y se
+cierra desde el lifespan de main.py; si se usa antes (scripts), se crea
+al primer envío.
+"""
+from datetime import datetime
+from typing import Optional, Tuple
+
+import httpx
+
 from core.config import settings
+from core.notification_aggregator import NotificationAggregator
+from core.notification_providers import NotificationProvider, build_provider
 from core.time_utils import get_current_colombia_time, format_colombia_time_for_display
 
+
 class WhatsAppService:
-    def __init__(self):
-        self.api_key = settings.CALLMEBOT_API_KEY
-        self.admin_phone = settings.ADMIN_PHONE_NUMBER
+    def __init__(self, provider: Optional[NotificationProvider] = None):
+        self.provider = provider or build_provider()
+        self._client: Optional[httpx.AsyncClient] = None
+        # Las notificaciones de acceso se agrupan; las emergencias salen directo
+        self.aggregator = NotificationAggregator(
+            self.send_notification,
+            settings.NOTIFICATION_DIGEST_WINDOW_SECONDS,
+            settings.NOTIFICATION_RATE_PER_MINUTE,
+            settings.NOTIFICATION_BURST,
+            settings.NOTIFICATION_DIGEST_MAX_LINES,
+        )
+
+    def _build_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                settings.WHATSAPP_READ_TIMEOUT_SECONDS,
+                connect=settings.WHATSAPP_CONNECT_TIMEOUT_SECONDS,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.WHATSAPP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.WHATSAPP_MAX_CONNECTIONS,
+                keepalive_expiry=settings.WHATSAPP_KEEPALIVE_SECONDS,
+            ),
+        )
+
+    def start(self):
+        """Abre el cliente HTTP compartido (lifespan de main.py)."""
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+
+    async def close(self):
+        """Cierra el cliente y sus conexiones abiertas."""
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        self.start()
+        return self._client
 
     async def send_notification(self, message: str):
-        """Envía notificación por WhatsApp usando CallMeBot API"""
-        if not self.api_key or not self.admin_phone:
+        """Envía notificación por WhatsApp usando la API del proveedor configurado"""
+        if not self.provider.is_configured():
             print("⚠️ Configuración de WhatsApp no disponible")
             return False
 
         try:
-            url = f"https://api.callmebot.com/whatsapp.php"
-            params = {
-                'phone': self.admin_phone,
-                'text': message,
-                'apikey': self.api_key
-            }
-            
-            response = requests.get(url, params=params)
+            url, params = self.provider.build_request(message)
+
+            client = self._get_client()
+            response = await client.get(url, params=params)
             if response.status_code == 200:
                 print("✅ Notificación WhatsApp enviada")
                 return True
             else:
                 print(f"❌ Error enviando WhatsApp: {response.status_code}")
                 return False
-                
+
+        except httpx.TimeoutException as e:
+            print(f"⏱️ Tiempo agotado enviando WhatsApp ({type(e).__name__})")
+            return False
         except Exception as e:
             print(f"❌ Error en servicio WhatsApp: {e}")
             return False
 
-    async def send_access_notification(self, user_name: str, access_type: str, door: str = None):
-        """Envía notificación de acceso"""
-        timestamp = format_colombia_time_for_display(get_current_colombia_time())
+    @staticmethod
+    def access_message(user_name: str, access_type: str, door: str = None, at: datetime = None) -> Tuple[str, str]:
+        """(renglón para resumen, mensaje completo) de un acceso ocurrido en `at` (UTC)."""
+        timestamp = format_colombia_time_for_display(at or get_current_colombia_time())
         message = f"🚪 *Sistema de Acceso NFC*\n\n"
         message += f"👤 *Usuario:* {user_name}\n"
         message += f"🔑 *Tipo de acceso:* {access_type}\n"
@@ -43,19 +96,32 @@ class WhatsAppService:
             message += f"🚪 *Puerta:* {door}\n"
         message += f"🕐 *Fecha/Hora:* {timestamp}\n"
         message += f"📍 *Sistema activo*"
-        
-        return await self.send_notification(message)
 
-    async def send_emergency_notification(self, action: str, user_name: str):
-        """Envía notificación de emergencia"""
-        timestamp = format_colombia_time_for_display(get_current_colombia_time())
+        line = f"{user_name} - {access_type}" + (f" - {door}" if door else "")
+        return line, message
+
+    @staticmethod
+    def emergency_message(action: str, user_name: str, at: datetime = None) -> str:
+        timestamp = format_colombia_time_for_display(at or get_current_colombia_time())
         message = f"🚨 *ALERTA DEL SISTEMA NFC*\n\n"
         message += f"⚠️ *Acción:* {action}\n"
         message += f"👤 *Usuario:* {user_name}\n"
         message += f"🕐 *Fecha/Hora:* {timestamp}\n"
         message += f"🔴 *Sistema en modo emergencia*"
-        
-        return await self.send_notification(message)
+        return message
+
+    async def send_access_notification(self, user_name: str, access_type: str, door: str = None):
+        """
+        Envía notificación de acceso, agrupada con las demás de la ventana
+        (core/notification_aggregator.py). Devuelve si se envió o quedó en cola.
+        Los handlers usan el outbox (core/notification_outbox.py) para no perderla.
+        """
+        line, message = self.access_message(user_name, access_type, door)
+        return await self.aggregator.add(line, message)
+
+    async def send_emergency_notification(self, action: str, user_name: str):
+        """Envía notificación de emergencia (inmediata, sin agrupar)"""
+        return await self.aggregator.send_critical(self.emergency_message(action, user_name))
 
 # Instancia global
 whatsapp_service = WhatsAppService()
\ No newline at end of file
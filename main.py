@@ -3,7 +3,20 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import asyncio
 
-from core.database import create_db_and_tables
+from core.database import create_db_and_tables, warm_up_pool
+from core.startup import StartupReport
+from core.admission import AdmissionControlMiddleware
+from core.log_rollups import log_rollups
+from core.log_archive import log_archive
+from core.security_compaction import security_compactor
+from core.reports import report_service
+from core.anomaly_detector import anomaly_detector
+from core.recent_events import recent_events
+from core.user_access_summary import user_access_summary
+from core.command_queue import command_queue
+from core.idempotency import idempotency
+from core.action_scheduler import action_scheduler
+from core.notification_outbox import notification_outbox
 from core.config import settings
 from core.whatsapp_service import whatsapp_service
 from core.time_utils import get_current_colombia_time, format_colombia_time_for_display
@@ -11,7 +24,8 @@ from core.time_utils import get_current_colombia_time, format_colombia_time_for_
 # Importar routers
 from routers import (
     auth, users, devices, logs, actions, 
-    health, ws_device, nfc_cards, access_pins
+    health, ws_device, nfc_cards, access_pins, analytics, reports,
+    alerts, ws_dashboard, device_groups, scheduled_actions, notifications
 )
 
 async def send_startup_notification():
@@ -39,9 +53,68 @@ async def send_startup_notification():
 async def lifespan(app: FastAPI):
     # Startup
     print("🚀 Iniciando Sistema de Acceso NFC Inteligente...")
-    print("📋 Creando tablas de base de datos...")
-    create_db_and_tables()
-    print("✅ Base de datos inicializada")
+    report = StartupReport()
+
+    print("📋 Verificando versión del esquema de base de datos...")
+    with report.phase("schema"):
+        schema = create_db_and_tables()
+    report.details.update(schema)
+    if schema["ddl_executed"]:
+        print(f"✅ Esquema actualizado (versión {schema['schema_version']})")
+    else:
+        print(f"✅ Esquema al día (versión {schema['schema_version']}), sin DDL")
+
+    with report.phase("pool_warmup"):
+        warmed = await asyncio.to_thread(warm_up_pool, settings.DB_WARM_CONNECTIONS)
+    report.details["warm_connections"] = warmed
+    print(f"✅ Pool de conexiones precalentado ({warmed} conexiones)")
+
+    with report.phase("recent_events"):
+        loaded = await asyncio.to_thread(recent_events.backfill)
+    report.details["recent_events"] = loaded
+    print(f"✅ Eventos recientes cargados en memoria ({loaded} eventos)")
+
+    with report.phase("command_queue"):
+        pending_commands = await asyncio.to_thread(command_queue.load)
+    report.details["pending_commands"] = pending_commands
+    print(f"✅ Cola de comandos cargada ({pending_commands} pendientes)")
+
+    with report.phase("scheduler"):
+        scheduled = await asyncio.to_thread(action_scheduler.load)
+    report.details["scheduled_actions"] = scheduled
+    print(
+        f"✅ Acciones programadas: {scheduled['armed']} activas, "
+        f"{scheduled['caught_up']} a recuperar, {scheduled['missed']} omitidas"
+    )
+
+    # Cliente HTTP compartido para WhatsApp (conexiones reutilizadas)
+    whatsapp_service.start()
+
+    # Primera medición de CPU: la primera llamada de cpu_percent siempre da 0.0
+    _prime_cpu_percent()
+
+    report.finish()
+    report.print_summary()
+    app.state.startup_report = report
+    app.state.started_at = get_current_colombia_time()
+
+    # Tareas de fondo
+    background_tasks = [
+        asyncio.create_task(log_rollups.run(settings.LOG_ROLLUP_FLUSH_SECONDS)),
+        asyncio.create_task(anomaly_detector.run()),
+        asyncio.create_task(command_queue.run()),
+        asyncio.create_task(user_access_summary.run(settings.USER_ACCESS_SUMMARY_FLUSH_SECONDS)),
+        asyncio.create_task(idempotency.run()),
+        asyncio.create_task(action_scheduler.run()),
+        asyncio.create_task(whatsapp_service.aggregator.run()),
+        asyncio.create_task(notification_outbox.run()),
+    ]
+    if settings.SECURITY_COMPACTION_WINDOW_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(security_compactor.run()))
+    if settings.LOG_RETENTION_DAYS > 0:
+        background_tasks.append(asyncio.create_task(
+            log_archive.run(settings.LOG_ARCHIVE_INTERVAL_HOURS, settings.LOG_RETENTION_DAYS)
+        ))
     
     # Enviar notificación de inicio (de forma asíncrona sin bloquear)
     asyncio.create_task(send_startup_notification())
@@ -52,6 +125,14 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("🔴 Apagando sistema...")
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await asyncio.to_thread(security_compactor.flush, True)
+    await asyncio.to_thread(log_rollups.flush)
+    await asyncio.to_thread(user_access_summary.flush)
+    report_service.shutdown()
+    await whatsapp_service.aggregator.flush(force=True)
     
     # Opcional: Enviar notificación de apagado
     try:
@@ -66,6 +147,7 @@ async def lifespan(app: FastAPI):
         print("✅ Notificación de apagado enviada por WhatsApp")
     except Exception as e:
         print(f"❌ Error enviando notificación de apagado: {e}")
+    await whatsapp_service.close()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -74,6 +156,10 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Control de admisión: el tráfico de las puertas tiene su propio presupuesto.
+# Se registra antes que CORS para que las respuestas 503 lleven cabeceras CORS.
+app.add_middleware(AdmissionControlMiddleware)
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -82,7 +168,6 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
 # Incluir routers
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -93,6 +178,13 @@ app.include_router(health.router)
 app.include_router(ws_device.router)
 app.include_router(nfc_cards.router)
 app.include_router(access_pins.router)
+app.include_router(analytics.router)
+app.include_router(reports.router)
+app.include_router(alerts.router)
+app.include_router(ws_dashboard.router)
+app.include_router(device_groups.router)
+app.include_router(scheduled_actions.router)
+app.include_router(notifications.router)
 
 @app.get("/")
 async def root():
@@ -141,28 +233,43 @@ async def test_whatsapp():
             "timestamp": format_colombia_time_for_display(get_current_colombia_time())
         }
 
-@app.get("/system-info")
-async def system_info():
-    """Información detallada del sistema"""
-    import platform
-    import psutil
-    from datetime import datetime
-    
-    # Información del sistema
-    system_info = {
-        "python_version": platform.python_version(),
-        "platform": platform.platform(),
-        "processor": platform.processor(),
-        "system": platform.system(),
-        "machine": platform.machine(),
-    }
-    
-    # Uso de recursos
+_platform_info = None
+
+def _get_platform_info() -> dict:
+    """Carga perezosa (una sola vez) de la información de la plataforma."""
+    global _platform_info
+    if _platform_info is None:
+        import platform
+        _platform_info = {
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "system": platform.system(),
+            "machine": platform.machine(),
+        }
+    return _platform_info
+
+def _prime_cpu_percent():
+    """Inicia la ventana de medición de psutil.cpu_percent (si psutil está instalado)."""
+    try:
+        import psutil
+    except ImportError:
+        return
+    psutil.cpu_percent(interval=None)
+
+def _get_resources():
+    """Uso de recursos; psutil es opcional y se importa solo al consultarlo."""
+    try:
+        import psutil
+    except ImportError:
+        return None
+
     memory = psutil.virtual_memory()
     disk = psutil.disk_usage('/')
-    
-    resources = {
-        "cpu_percent": psutil.cpu_percent(interval=1),
+    return {
+        # interval=None no bloquea el event loop (mide desde la llamada anterior;
+        # la primera se hace al arrancar, en _prime_cpu_percent)
+        "cpu_percent": psutil.cpu_percent(interval=None),
         "memory_total_gb": round(memory.total / (1024**3), 2),
         "memory_used_gb": round(memory.used / (1024**3), 2),
         "memory_percent": memory.percent,
@@ -170,11 +277,18 @@ async def system_info():
         "disk_used_gb": round(disk.used / (1024**3), 2),
         "disk_percent": disk.percent,
     }
-    
+
+@app.get("/system-info")
+async def system_info():
+    """Información detallada del sistema"""
+    report = getattr(app.state, "startup_report", None)
+    started_at = getattr(app.state, "started_at", None)
+
     return {
-        "system": system_info,
-        "resources": resources,
-        "startup_time": format_colombia_time_for_display(get_current_colombia_time()),
+        "system": _get_platform_info(),
+        "resources": _get_resources(),
+        "startup_time": format_colombia_time_for_display(started_at) if started_at else None,
+        "startup": report.as_dict() if report else None,
         "project_name": settings.PROJECT_NAME,
         "version": "1.0.0"
     }
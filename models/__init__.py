@@ -5,4 +5,13 @@ from .tokens import Token
 from .logs import Log
 from .actions_devices import ActionDevice
 from .nfc_cards import NFCCard
-from .access_pins import AccessPin
\ No newline at end of file
+from .access_pins import AccessPin
+from .schema_version import SchemaVersion
+from .log_rollups import LogRollup
+from .alerts import Alert
+from .device_groups import DeviceGroup
+from .device_group_members import DeviceGroupMember
+from .idempotency_keys import IdempotencyKey
+from .scheduled_actions import ScheduledAction
+from .notification_outbox import NotificationOutbox
+from .group_commands import GroupCommand
\ No newline at end of file
@@ -1,9 +1,16 @@
 from datetime import datetime
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 from typing import List, Optional
 
 class ActionDevice(SQLModel, table=True):
     __tablename__ = "actions_devices"
+    __table_args__ = (
+        Index("ix_actions_devices_device_created", "id_device", "created_at"),
+        Index("ix_actions_devices_created", "created_at"),
+        Index("ix_actions_devices_device_status", "id_device", "status"),
+        Index("ix_actions_devices_group_command", "id_group_command"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     id_device: int = Field(foreign_key="devices.id")
@@ -11,6 +18,15 @@ class ActionDevice(SQLModel, table=True):
     executed: bool = Field(default=False)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+    # Cola de comandos (core/command_queue.py). NULL en acciones anteriores a la cola
+    status: Optional[str] = Field(default="pending", max_length=20)  # pending, sent, confirmed, expired
+    seq: Optional[int] = None  # Secuencia por dispositivo
+    attempts: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    last_sent_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+    correlation_id: Optional[str] = Field(default=None, max_length=32)  # Traza de latencia (core/command_tracing.py)
+    id_group_command: Optional[str] = Field(default=None, max_length=12)  # Comando de grupo que la creó (group_commands)
+
     device: "Device" = Relationship(back_populates="actions")
     logs: List["Log"] = Relationship(back_populates="action_device")
 
@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+class Alert(SQLModel, table=True):
+    """Anomalía detectada sobre los eventos de acceso."""
+    __tablename__ = "alerts"
+    __table_args__ = (
+        Index("ix_alerts_created", "created_at"),
+        Index("ix_alerts_kind_created", "kind", "created_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str = Field(max_length=40)  # multi_door, denied_burst, login_failed_burst, unusual_hour
+    severity: str = Field(default="media", max_length=20)  # baja, media, alta
+    message: str = Field(max_length=255)
+    id_device: Optional[int] = None
+    id_user: Optional[int] = None
+    id_card: Optional[int] = None
+    details: Optional[str] = Field(default=None, max_length=1000)  # JSON
+    event_timestamp: datetime  # Hora del evento que disparó la alerta
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    acknowledged: bool = Field(default=False)
+    acknowledged_at: Optional[datetime] = None
+    acknowledged_by: Optional[int] = None
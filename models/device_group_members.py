@@ -0,0 +1,7 @@
+from sqlmodel import Field, SQLModel
+
+class DeviceGroupMember(SQLModel, table=True):
+    __tablename__ = "device_group_members"
+
+    id_group: int = Field(foreign_key="device_groups.id", primary_key=True)
+    id_device: int = Field(foreign_key="devices.id", primary_key=True)
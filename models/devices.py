@@ -11,6 +11,7 @@ class Device(SQLModel, table=True):
     direction: Optional[str] = Field(default=None, max_length=15)
     nfc_reader_active: bool = Field(default=True)
     emergency_mode: bool = Field(default=False)
+    command_seq: Optional[int] = None  # Última secuencia de comando asignada (core/command_queue.py)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
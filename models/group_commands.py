@@ -0,0 +1,14 @@
+from datetime import datetime
+from typing import Optional
+from sqlmodel import Field, SQLModel
+
+class GroupCommand(SQLModel, table=True):
+    """Comando enviado a un grupo de dispositivos; sus acciones apuntan aquí (actions_devices.id_group_command)."""
+    __tablename__ = "group_commands"
+
+    id: str = Field(primary_key=True, max_length=12)
+    id_group: int  # Sin FK: el historial se conserva aunque se elimine el grupo
+    group_name: str = Field(max_length=50)  # Nombre al momento del envío
+    action: str = Field(max_length=100)
+    id_user: Optional[int] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,18 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+class IdempotencyKey(SQLModel, table=True):
+    """Eventos ya procesados que envía un dispositivo, para ignorar sus reintentos."""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        Index("ix_idempotency_keys_created", "created_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    key: str = Field(max_length=160, unique=True)  # dispositivo + secuencia, o clave del cliente
+    id_device: Optional[int] = None
+    response: Optional[str] = Field(default=None, max_length=1000)  # JSON de la respuesta original
+    payload_hash: Optional[str] = Field(default=None, max_length=64)  # sha256 del evento, para detectar claves reutilizadas
+    created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,19 @@
+from datetime import date
+from typing import Optional
+from sqlalchemy import UniqueConstraint
+from sqlmodel import Field, SQLModel
+
+class LogRollup(SQLModel, table=True):
+    """Conteos de logs agregados por día × dispositivo × tipo de acceso × acción × estado."""
+    __tablename__ = "log_rollups"
+    __table_args__ = (
+        UniqueConstraint("day", "id_device", "access_type", "action", "status", name="uq_log_rollups_bucket"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    day: date = Field(index=True)
+    id_device: int
+    access_type: str = Field(max_length=20)
+    action: str = Field(default="", max_length=100)
+    status: str = Field(max_length=20)
+    count: int = Field(default=0)
@@ -1,12 +1,22 @@
 from datetime import datetime
 from typing import Optional
+from sqlalchemy import Index, SmallInteger
 from sqlmodel import Relationship, SQLModel, Field
 
 class Log(SQLModel, table=True):
     __tablename__ = "logs"
+    __table_args__ = (
+        # Filtros por rango de fechas, solos o combinados con el dispositivo
+        Index("ix_logs_device_timestamp", "id_device", "timestamp"),
+        Index("ix_logs_timestamp", "timestamp"),
+        Index("ix_logs_event_code_timestamp", "event_code", "timestamp"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
-    event: str = Field(max_length=255)
+    # Código del evento (core/event_codes.py); el texto se genera al leer.
+    # NULL = log anterior a los códigos, con el texto completo en `event`
+    event_code: Optional[int] = Field(default=None, sa_type=SmallInteger)
+    event: str = Field(default="", max_length=255)  # Detalle libre (nombre enviado por el dispositivo, etc.)
     
     # Claves Foráneas
     id_device: int = Field(foreign_key="devices.id")
@@ -14,6 +24,14 @@ class Log(SQLModel, table=True):
     id_action: Optional[int] = Field(default=None, foreign_key="actions_devices.id")
     access_type: str = Field(default="remote")  # nfc, pin, remote
 
+    # Parámetros del evento (sin FK: la tarjeta puede borrarse y el log se conserva)
+    id_subject_user: Optional[int] = None  # Usuario afectado cuando no es quien actúa
+    id_card: Optional[int] = None
+
+    # Eventos repetidos compactados: `timestamp` es la primera ocurrencia
+    occurrences: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+    last_timestamp: Optional[datetime] = None
+
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     
     # Relaciones Bidireccionales
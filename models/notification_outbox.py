@@ -0,0 +1,23 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+class NotificationOutbox(SQLModel, table=True):
+    """Notificación de WhatsApp pendiente de entrega (se escribe junto con el log que la origina)."""
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        Index("ix_notification_outbox_status_next", "status", "next_attempt_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str = Field(max_length=20)  # access, emergency, message
+    payload: str = Field(max_length=2000)  # JSON con los datos del mensaje
+    status: str = Field(default="pending", max_length=20)  # pending, sending, sent, dead
+    attempts: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    next_attempt_at: Optional[datetime] = None  # NULL = en cuanto haya un worker libre
+    claimed_at: Optional[datetime] = None  # Inicio del envío en curso (lease)
+    last_error: Optional[str] = Field(default=None, max_length=255)
+    id_action: Optional[int] = None  # Acción que la originó (traza de latencia)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    sent_at: Optional[datetime] = None
@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+class ScheduledAction(SQLModel, table=True):
+    """Acción programada para un dispositivo (única, diaria o semanal, en hora Colombia)."""
+    __tablename__ = "scheduled_actions"
+    __table_args__ = (
+        Index("ix_scheduled_actions_enabled_next", "enabled", "next_run_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(max_length=100)
+    id_device: int = Field(foreign_key="devices.id")
+    action: str = Field(max_length=100)
+    kind: str = Field(max_length=10)  # once, daily, weekly
+    time_of_day: Optional[str] = Field(default=None, max_length=5)  # HH:MM hora Colombia (daily, weekly)
+    weekdays: Optional[str] = Field(default=None, max_length=20)  # "0,1,2,3,4" (lunes = 0; weekly)
+    run_at: Optional[datetime] = None  # UTC (once)
+    catch_up_minutes: int = Field(default=15, sa_column_kwargs={"server_default": "15"})
+    enabled: bool = Field(default=True)
+    next_run_at: Optional[datetime] = None  # UTC; NULL = sin próximas ejecuciones
+    last_run_at: Optional[datetime] = None
+    last_action_id: Optional[int] = None
+    id_user: int = Field(foreign_key="users.id")  # Quién la programó (autor de la acción)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,10 @@
+from datetime import datetime
+from typing import Optional
+from sqlmodel import Field, SQLModel
+
+class SchemaVersion(SQLModel, table=True):
+    __tablename__ = "schema_version"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    version: str = Field(max_length=64)
+    applied_at: datetime = Field(default_factory=datetime.utcnow)
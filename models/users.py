@@ -17,6 +17,13 @@ class User(SQLModel, table=True):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     last_connection: Optional[datetime] = None
 
+    # Resumen de accesos a puertas (core/user_access_summary.py); se mantiene
+    # de forma incremental para listar usuarios sin agregar sobre `logs`
+    last_access_at: Optional[datetime] = None
+    last_access_device: Optional[int] = None
+    month_access_period: Optional[str] = Field(default=None, max_length=7)  # AAAA-MM, hora Colombia
+    month_access_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+
     # Relaciones
     tokens: List["Token"] = Relationship(back_populates="user")
     logs: List["Log"] = Relationship(back_populates="user")
@@ -4,10 +4,11 @@ from datetime import datetime
 from typing import List
 
 from core.database import get_session
-from core.security import get_current_user
+from core.security import get_current_user, log_security_event
 from models.access_pins import AccessPin
 from models.users import User
 from models.logs import Log
+from core.event_codes import EventCode
 from schemas.pins_schema import (
     AccessPinCreate, AccessPinRead, AccessPinUpdate, 
     PinValidation, PinVerification
@@ -48,7 +49,8 @@ async def create_access_pin(
     log = Log(
         id_device=1,
         id_user=user.id,
-        event=f"PIN de acceso creado para usuario {user_data.name}",
+        id_subject_user=user_data.id,
+        event_code=EventCode.PIN_CREATED,
         access_type="remote"
     )
     session.add(log)
@@ -133,6 +135,7 @@ async def validate_pin(
     ).first()
 
     if not pin:
+        log_security_event(session, EventCode.ACCESS_PIN_DENIED, details="PIN no válido", access_type="pin")
         return PinValidation(
             valid=False,
             message="PIN no válido o desactivado"
@@ -141,6 +144,7 @@ async def validate_pin(
     # ✅ CORREGIDO: Usar session.query() de SQLAlchemy
     user = session.query(User).filter(User.id == pin.id_user).first()
     if not user or not user.status:
+        log_security_event(session, EventCode.ACCESS_PIN_DENIED, pin.id_user, "Usuario desactivado", access_type="pin")
         return PinValidation(
             valid=False,
             message="Usuario desactivado"
@@ -160,7 +164,7 @@ async def validate_pin(
     log = Log(
         id_device=1,
         id_user=user.id,
-        event=f"Acceso concedido vía PIN - Usuario: {user.name}",
+        event_code=EventCode.ACCESS_PIN,
         access_type="pin"
     )
     session.add(log)
@@ -1,20 +1,63 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Optional
+import json
+import zlib
+from core import log_events
+from core.event_codes import EventCode
+from core.config import settings
+from core.command_queue import command_queue, OPEN_STATUSES
+from core.command_tracing import command_tracer
 from core.database import get_session
+from core.idempotency import IdempotencyConflict, idempotency
+from core.notification_outbox import notification_outbox
 from core.security import get_current_user
+from core.time_utils import format_colombia_time, resolve_query_range, to_naive_utc
 from models.actions_devices import ActionDevice
 from models.devices import Device
+from models.idempotency_keys import IdempotencyKey
 from models.logs import Log
 from models.users import User
-from schemas.actions_schema import ActionDeviceCreate, ActionDeviceRead, ActionDeviceUpdate
-from schemas.access_log_schema import AccessLogCreate
-from core.whatsapp_service import whatsapp_service
+from schemas.actions_schema import ActionDeviceCreate, ActionDeviceRead, ActionDeviceUpdate, DeviceConfirmation
+from schemas.access_log_schema import AccessLogCreate, AccessLogBatch, AccessLogBatchResponse
 
 router = APIRouter(prefix="/actions", tags=["Actions Devices"])
 
-async def enviar_notificacion_whatsapp(action_type: str, user_id: int, session: Session):
-    """Envía notificación por WhatsApp cuando se abre una puerta"""
+DOOR_ACTIONS = ["DOOR_OPEN", "GARAGE_OPEN"]
+MAX_BATCH_BYTES = 2 * 1024 * 1024
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+def describe_access(action_type: str, access_type: str, user_name: str):
+    """
+    Devuelve (código de evento, detalle, access_type del log, nombre de puerta)
+    para un acceso local. El detalle es el nombre que envía el dispositivo.
+    """
+    door_name = "PUERTA PRINCIPAL" if action_type == "DOOR_OPEN" else "GARAJE"
+    access_type_log = "local"
+    detail = user_name
+
+    if action_type == "NFC_ACCESS":
+        event_code = EventCode.ACCESS_NFC_LOCAL
+        access_type_log = "nfc"
+    elif action_type == "DOOR_OPEN":
+        event_code = EventCode.LOCAL_DOOR_OPEN
+    elif action_type == "GARAGE_OPEN":
+        event_code = EventCode.LOCAL_GARAGE_OPEN
+    else:
+        event_code = EventCode.LOCAL_OTHER
+        detail = f"{user_name} - Acción: {action_type}"
+
+    return event_code, detail[:255], access_type_log, door_name
+
+def enviar_notificacion_whatsapp(action_type: str, user_id: int, session: Session, id_action: Optional[int] = None):
+    """
+    Deja en el outbox la notificación por WhatsApp de una apertura de puerta o
+    emergencia. Entra en la transacción de la sesión: se entrega en segundo
+    plano solo si el log del evento se confirma (core/notification_outbox.py).
+    """
     try:
         # Obtener información del usuario
         user = session.query(User).filter(User.id == user_id).first()
@@ -23,79 +66,76 @@ async def enviar_notificacion_whatsapp(action_type: str, user_id: int, session:
             return
         
         user_name = user.name
+        if action_type == "EMERGENCY":
+            notification_outbox.add(session, "emergency", {"action": action_type, "user_name": user_name}, id_action)
+            return
+
         door_name = "PUERTA PRINCIPAL" if action_type == "DOOR_OPEN" else "GARAJE"
-        
-        # Enviar notificación
-        success = await whatsapp_service.send_access_notification(
-            user_name=user_name,
-            access_type="APERTURA REMOTA",
-            door=door_name
-        )
-        
-        if success:
-            print(f"✅ Notificación WhatsApp enviada para {user_name} - {door_name}")
-        else:
-            print(f"❌ Error enviando notificación WhatsApp para {user_name}")
+        notification_outbox.add_access(session, user_name, "APERTURA REMOTA", door_name, id_action)
             
     except Exception as e:
         print(f"❌ Error en notificación WhatsApp: {e}")
 
-@router.post("/", response_model=ActionDeviceRead)
-async def create_action(
-    data: ActionDeviceCreate,
-    session: Session = Depends(get_session),
-    user = Depends(get_current_user),
+async def dispatch_action(
+    session: Session,
+    id_device: int,
+    action: str,
+    id_user: int,
+    access_type: str = "remote",
+    trace=None,
 ):
-    """Crea una acción para un dispositivo específico."""
-    print(f"📥 Datos recibidos: {data.dict()}")
-    
-    device = session.query(Device).filter(Device.id == data.id_device).first()
-    if not device:
-        raise HTTPException(status_code=404, detail="Dispositivo no encontrado")
+    """
+    Camino común de las acciones hacia un dispositivo (API y acciones
+    programadas): cola de comandos, notificación WhatsApp y log.
+    Devuelve (acción, si se reutilizó un comando pendiente).
+    """
+    trace = trace or command_tracer.start(id_device, action)
 
-    new_action = ActionDevice(
-        id_device=data.id_device,
-        action=data.action,
-        executed=False,
-        created_at=datetime.utcnow(),
-    )
-    
-    session.add(new_action)
-    session.commit()
-    session.refresh(new_action)
+    # La cola guarda el comando, lo envía si el dispositivo está conectado y
+    # lo reintenta o entrega al reconectar hasta que se confirme o venza
+    new_action, coalesced = await command_queue.enqueue(session, id_device, action, trace)
+    if coalesced:
+        return new_action, True
 
-    # Enviar notificación WhatsApp si es apertura de puerta
-    if data.action in ["DOOR_OPEN", "GARAGE_OPEN"]:
-        await enviar_notificacion_whatsapp(data.action, user.id, session)
+    if new_action.status == "sent":
+        print(f"✅ Acción enviada por WebSocket al dispositivo {id_device}")
+    else:
+        print(f"📥 Acción {new_action.id} en cola hasta que el dispositivo {id_device} se conecte")
 
-    # Enviar al WebSocket
-    from core.websocket_manager import manager
-    payload = {
-        "type": "action_execute",
-        "action_id": new_action.id,
-        "id_device": new_action.id_device,
-        "action_type": new_action.action,
-        "timestamp": new_action.created_at.isoformat(),
-    }
-    
-    try:
-        await manager.send_to_device(data.id_device, payload)
-        print(f"✅ Acción enviada por WebSocket al dispositivo {data.id_device}")
-    except Exception as e:
-        print(f"⚠️ No se pudo enviar al dispositivo {data.id_device}: {e}")
+    # Notificación WhatsApp si es apertura de puerta o emergencia (se confirma junto con el log)
+    if action in ["DOOR_OPEN", "GARAGE_OPEN", "EMERGENCY"]:
+        enviar_notificacion_whatsapp(action, id_user, session, new_action.id)
 
     # Crear log
     log = Log(
-        id_device=data.id_device,
-        id_user=user.id,
+        id_device=id_device,
+        id_user=id_user,
         id_action=new_action.id,
-        event=f"Acción '{data.action}' creada para dispositivo {data.id_device}",
-        access_type="remote"
+        event_code=EventCode.ACTION_CREATED,
+        access_type=access_type
     )
     session.add(log)
     session.commit()
+    notification_outbox.wake()
 
     print(f"✅ Acción creada exitosamente: ID {new_action.id}")
+    return new_action, False
+
+@router.post("/", response_model=ActionDeviceRead)
+async def create_action(
+    data: ActionDeviceCreate,
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """Crea una acción para un dispositivo específico."""
+    trace = command_tracer.start(data.id_device, data.action)
+    print(f"📥 Datos recibidos: {data.dict()}")
+    
+    device = session.query(Device).filter(Device.id == data.id_device).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Dispositivo no encontrado")
+
+    new_action, _ = await dispatch_action(session, data.id_device, data.action, user.id, trace=trace)
     return new_action
 
 @router.put("/{action_id}", response_model=ActionDeviceRead)
@@ -112,16 +152,19 @@ async def update_action_status(
 
     if update.executed is not None:
         action.executed = update.executed
+        if action.executed and action.status in OPEN_STATUSES:
+            action.status = "confirmed"
+            command_queue.discard(action.id, action.id_device)
 
     session.add(action)
 
-    log_message = "Acción ejecutada correctamente" if action.executed else "Acción marcada como no ejecutada"
+    event_code = EventCode.ACTION_EXECUTED if action.executed else EventCode.ACTION_NOT_EXECUTED
 
     log = Log(
         id_device=action.id_device,
         id_user=user.id,
         id_action=action.id,
-        event=log_message,
+        event_code=event_code,
         access_type="remote"
     )
     session.add(log)
@@ -150,19 +193,80 @@ def list_actions(
     user = Depends(get_current_user),
     id_device: int | None = None,
     executed: bool | None = None,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    all_history: bool = False,
     limit: int = 20,
     offset: int = 0,
 ):
-    """Obtiene todas las acciones con filtros opcionales."""
+    """
+    Obtiene las acciones con filtros opcionales, más recientes primero.
+    Sin start_date se limita a los últimos QUERY_DEFAULT_WINDOW_DAYS días,
+    salvo que se pida all_history.
+    """
+    start_date, end_date = resolve_query_range(
+        start_date, end_date, 0 if all_history else settings.QUERY_DEFAULT_WINDOW_DAYS
+    )
+    if start_date and end_date and end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date debe ser posterior a start_date")
+
     query = session.query(ActionDevice)
     if id_device:
         query = query.filter(ActionDevice.id_device == id_device)
+    if start_date:
+        query = query.filter(ActionDevice.created_at >= start_date)
+    if end_date:
+        query = query.filter(ActionDevice.created_at <= end_date)
     if executed is not None:
         query = query.filter(ActionDevice.executed == executed)
 
-    results = query.offset(offset).limit(limit).all()
+    results = (
+        query.order_by(ActionDevice.created_at.desc(), ActionDevice.id.desc())
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
     return results
 
+@router.get("/latency")
+def get_command_latency(
+    id_device: Optional[int] = None,
+    action: Optional[str] = None,
+    by_device: bool = False,
+    user = Depends(get_current_user),
+):
+    """
+    Histogramas de latencia de los comandos por tramo (commit en base, envío
+    por WebSocket, recepción y ejecución en el dispositivo, notificación y
+    total), con percentiles aproximados. Con by_device se separa por
+    dispositivo y tipo de acción.
+    """
+    return {
+        "id_device": id_device,
+        "action": action,
+        **command_tracer.latency(id_device, action, by_device),
+        "stats": command_tracer.get_stats(),
+    }
+
+@router.get("/latency/recent")
+def get_recent_traces(
+    limit: int = Query(20, ge=1, le=200),
+    user = Depends(get_current_user),
+):
+    """Últimas trazas de comandos con el tiempo de cada salto."""
+    return {"data": command_tracer.recent(limit)}
+
+@router.get("/{action_id}/trace")
+def get_action_trace(
+    action_id: int,
+    user = Depends(get_current_user),
+):
+    """Traza de latencia de una acción (solo las recientes, en memoria)."""
+    trace = command_tracer.get_trace(action_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="No hay traza para esta acción")
+    return trace
+
 @router.get("/{action_id}", response_model=ActionDeviceRead)
 def get_action(
     action_id: int,
@@ -188,60 +292,64 @@ def delete_action(
 
     session.delete(action)
     session.commit()
+    command_queue.discard(action_id, action.id_device)
     return
 
 @router.post("/device/confirm/{action_id}")
 async def confirm_action_execution(
     action_id: int,
+    confirmation: Optional[DeviceConfirmation] = None,
     session: Session = Depends(get_session),
 ):
     """
     Endpoint llamado por el IoT (ESP32, Arduino, etc.)
     cuando confirma que la acción fue ejecutada físicamente.
+    El cuerpo (correlation_id, device_elapsed_ms) es opcional.
     """
-    action = session.query(ActionDevice).filter(ActionDevice.id == action_id).first()
+    confirmation = confirmation or DeviceConfirmation()
+    action = await command_queue.confirm(
+        action_id, session, confirmation.correlation_id, confirmation.device_elapsed_ms
+    )
     if not action:
         raise HTTPException(status_code=404, detail="Acción no encontrada")
 
-    action.executed = True
-    session.add(action)
-
-    log = Log(
-        id_device=action.id_device,
-        id_user=None,
-        id_action=action.id,
-        event=f"Dispositivo confirmó ejecución de acción '{action.action}'",
-        access_type="remote"
-    )
-    session.add(log)
-    session.commit()
-
-    from core.websocket_manager import manager
-    payload = {
-        "event": "action_confirmed",
-        "action_id": action.id,
-        "id_device": action.id_device,
-        "action_type": action.action,
-        "status": "executed",
-    }
-    
-    try:
-        await manager.broadcast_json(payload)
-    except Exception as e:
-        print(f"⚠️ Error al broadcast confirmación: {e}")
-
     return {"message": "Acción confirmada por el dispositivo", "action_id": action.id}
 
 @router.post("/access-log")
 async def log_access_and_notify(
     data: AccessLogCreate,
     session: Session = Depends(get_session),
+    idempotency_key: Optional[str] = Header(None),
 ):
     """
-    Endpoint para registrar accesos locales (desde Arduino) y enviar notificaciones WhatsApp
+    Endpoint para registrar accesos locales (desde Arduino) y enviar notificaciones WhatsApp.
+    Con `seq` o la cabecera `Idempotency-Key`, un reintento del mismo evento
+    devuelve la respuesta original sin volver a registrar ni notificar; la
+    misma clave con otro evento responde 409. Con `seq` conviene enviar
+    `device_timestamp`, para que un contador reiniciado no choque con eventos viejos.
     """
+    key = idempotency.make_key(data.id_device, data.seq, idempotency_key, data.device_timestamp)
+    payload_hash = idempotency.payload_hash(data.id_device, data) if key else None
+    if key:
+        try:
+            previous = await idempotency.claim(key, payload_hash)
+        except IdempotencyConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if previous is not None:
+            print(f"🔁 Reintento de acceso ignorado ({key})")
+            return {**previous, "duplicate": True}
+
     try:
         print(f"📥 Log de acceso recibido: {data.dict()}")
+
+        key_row = None
+        if key:
+            key_row, previous = idempotency.insert_key(session, key, data.id_device, payload_hash)
+            if previous is not None:
+                # Otro worker ya procesó este evento
+                idempotency.complete(key, previous, payload_hash)
+                print(f"🔁 Reintento de acceso ignorado ({key})")
+                return {**previous, "duplicate": True}
         
         user_id = data.id_user
         user_name = data.user_name
@@ -253,7 +361,8 @@ async def log_access_and_notify(
             access_type = access_type[:20]
         
         # Determinar nombre de la puerta y tipo de evento
-        door_name = "PUERTA PRINCIPAL" if action_type == "DOOR_OPEN" else "GARAJE"
+        event_code, log_detail, access_type_log, door_name = describe_access(action_type, access_type, user_name)
+        event_time = _device_time_to_utc(data.device_timestamp, datetime.utcnow())
         
         # PRIMERO: Crear acción en actions_devices para tener un id_action (SOLO para aperturas de puertas)
         action_id = None
@@ -262,60 +371,280 @@ async def log_access_and_notify(
                 id_device=data.id_device,
                 action=action_type,
                 executed=True,  # Se marca como ejecutada inmediatamente en accesos locales
-                created_at=datetime.utcnow(),
+                status="confirmed",  # No pasa por la cola de comandos
+                created_at=event_time,
             )
             session.add(new_action)
             session.flush()  # Para obtener el ID sin hacer commit completo
             action_id = new_action.id
             print(f"✅ Acción creada con ID: {action_id}")
         
-        # Enviar notificación WhatsApp (solo para aperturas de puertas)
+        # Notificación WhatsApp (solo para aperturas de puertas): queda en el
+        # outbox con el log y se entrega en segundo plano
         success = False
         if action_type in ["DOOR_OPEN", "GARAGE_OPEN"]:
-            success = await whatsapp_service.send_access_notification(
-                user_name=user_name,
-                access_type=f"APERTURA {access_type.upper()}",
-                door=door_name
+            notification_outbox.add_access(
+                session, user_name, f"APERTURA {access_type.upper()}", door_name, action_id, event_time
             )
-            
-            if success:
-                print(f"✅ Notificación WhatsApp enviada para acceso local: {user_name} - {door_name}")
-            else:
-                print(f"❌ Error enviando notificación WhatsApp para acceso local")
+            success = True
         
         # Crear log en base de datos CON action_id (solo para aperturas de puertas)
-        log_event = ""
-        access_type_log = "local"
-        
-        if action_type == "NFC_ACCESS":
-            log_event = f"Acceso concedido vía NFC - Usuario: {user_name}"
-            access_type_log = "nfc"
-            # Para NFC_ACCESS, no creamos acción en actions_devices, por eso action_id es NULL
-        elif action_type == "DOOR_OPEN":
-            log_event = f"Acceso {access_type}: {user_name} abrió PUERTA PRINCIPAL"
-        elif action_type == "GARAGE_OPEN":
-            log_event = f"Acceso {access_type}: {user_name} abrió GARAJE"
-        else:
-            log_event = f"Acceso {access_type}: {user_name} - Acción: {action_type}"
-        
+        # Para NFC_ACCESS no se crea acción en actions_devices, por eso action_id es NULL
         log = Log(
             id_device=data.id_device,
             id_user=user_id if user_id != 0 else None,
             id_action=action_id,  # Será NULL para NFC_ACCESS, y tendrá valor para DOOR_OPEN/GARAGE_OPEN
-            event=log_event,
-            access_type=access_type_log
+            event_code=event_code,
+            event=log_detail,
+            access_type=access_type_log,
+            timestamp=event_time,
         )
         session.add(log)
-        session.commit()
-        
-        return {
+
+        result = {
             "success": True,
             "message": "Acceso registrado y notificación enviada",
             "notification_sent": success,
             "action_id": action_id
         }
-        
+        if key_row is not None:
+            key_row.response = json.dumps(result)
+        session.commit()
+        notification_outbox.wake()
+        if key:
+            idempotency.complete(key, result, payload_hash)
+
+        return result
+
+    except IdempotencyConflict as e:
+        # Otro worker registró un evento distinto con la misma clave
+        session.rollback()
+        idempotency.release(key)
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         print(f"❌ Error en log de acceso: {e}")
         session.rollback()
-        raise HTTPException(status_code=500, detail=f"Error procesando acceso: {str(e)}")
\ No newline at end of file
+        if key:
+            idempotency.release(key)
+        raise HTTPException(status_code=500, detail=f"Error procesando acceso: {str(e)}")
+
+def _device_time_to_utc(value, received_at: datetime) -> datetime:
+    """Normaliza la hora del dispositivo a UTC sin zona; sin hora, usa la de recepción."""
+    if value is None:
+        return received_at
+    value = to_naive_utc(value)
+    # Un reloj adelantado no puede registrar eventos en el futuro
+    if value > received_at + MAX_CLOCK_SKEW:
+        return received_at
+    return value
+
+async def _read_batch_body(request: Request) -> bytes:
+    body = await request.body()
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        try:
+            decompressor = zlib.decompressobj(wbits=31)
+            body = decompressor.decompress(body, MAX_BATCH_BYTES + 1)
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="Cuerpo gzip inválido")
+    if len(body) > MAX_BATCH_BYTES:
+        raise HTTPException(status_code=413, detail="Lote demasiado grande")
+    return body
+
+def _insert_logs(session: Session, log_rows: list) -> list:
+    """
+    Inserta los logs del lote y devuelve sus ids en el mismo orden (los
+    suscriptores de log_events los necesitan). Con RETURNING ordenado es un
+    solo executemany; MySQL no lo tiene y se inserta fila por fila.
+    """
+    table = Log.__table__
+    if session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        return list(session.scalars(insert(table).returning(table.c.id, sort_by_parameter_order=True), log_rows))
+    return [session.execute(insert(table).values(**row)).inserted_primary_key[0] for row in log_rows]
+
+def _queue_batch_notification(session: Session, openings: list) -> bool:
+    """Una sola notificación por lote para no saturar WhatsApp al vaciar el buffer."""
+    if not openings:
+        return False
+    if len(openings) == 1:
+        user_name, access_type, door_name, event_time = openings[0]
+        notification_outbox.add_access(
+            session, user_name, f"APERTURA {access_type.upper()}", door_name, event_time=event_time
+        )
+        return True
+
+    message = f"🚪 *Sistema de Acceso NFC*\n\n"
+    message += f"📦 *{len(openings)} aperturas sincronizadas desde el dispositivo*\n"
+    for user_name, access_type, door_name, event_time in openings[:10]:
+        message += f"• {format_colombia_time(event_time, '%H:%M')} {user_name} - {door_name} ({access_type})\n"
+    if len(openings) > 10:
+        message += f"• ... y {len(openings) - 10} más\n"
+    line = f"{len(openings)} aperturas sincronizadas desde el dispositivo"
+    notification_outbox.add(session, "message", {"line": line, "message": message})
+    return True
+
+@router.post("/access-log/batch", response_model=AccessLogBatchResponse)
+async def ingest_access_log_batch(
+    request: Request,
+    session: Session = Depends(get_session),
+):
+    """
+    Registra en una sola transacción un lote ordenado de accesos del
+    dispositivo (por ejemplo, el buffer acumulado sin WiFi). Acepta el cuerpo
+    comprimido con `Content-Encoding: gzip`, conserva la hora de cada evento
+    en el dispositivo y devuelve un acuse por evento.
+    """
+    body = await _read_batch_body(request)
+    try:
+        batch = AccessLogBatch.parse_raw(body)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Lote inválido: {str(e)}")
+
+    device = session.query(Device).filter(Device.id == batch.id_device).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Dispositivo no encontrado")
+
+    # Eventos con secuencia ya registrados (reintento del lote completo o parcial);
+    # la misma clave con otro contenido es un conflicto y no se registra
+    event_keys = {
+        index: idempotency.make_key(batch.id_device, event.seq, device_timestamp=event.device_timestamp)
+        for index, event in enumerate(batch.events)
+        if event.seq is not None
+    }
+    event_hashes = {index: idempotency.payload_hash(batch.id_device, batch.events[index]) for index in event_keys}
+    previous, conflicting_keys = idempotency.lookup_many(
+        session, {key: event_hashes[index] for index, key in event_keys.items()}
+    )
+    duplicates = {}
+    conflicts = set()
+    seen_keys = {}
+    for index, key in event_keys.items():
+        if key in conflicting_keys:
+            conflicts.add(index)
+        elif key in previous:
+            duplicates[index] = previous[key]
+        elif key in seen_keys:
+            # Repetido dentro del mismo lote
+            if seen_keys[key] == event_hashes[index]:
+                duplicates[index] = None
+            else:
+                conflicts.add(index)
+        seen_keys.setdefault(key, event_hashes[index])
+    skipped = set(duplicates) | conflicts
+
+    received_at = datetime.utcnow()
+    referenced_users = {e.id_user for e in batch.events if e.id_user}
+    known_users = set()
+    if referenced_users:
+        known_users = {
+            row[0] for row in session.query(User.id).filter(User.id.in_(referenced_users)).all()
+        }
+
+    try:
+        # 1) Acciones de apertura (necesitan id para enlazar el log)
+        actions = {}
+        for index, event in enumerate(batch.events):
+            if event.action in DOOR_ACTIONS and index not in skipped:
+                actions[index] = ActionDevice(
+                    id_device=batch.id_device,
+                    action=event.action,
+                    executed=True,
+                    status="confirmed",
+                    created_at=_device_time_to_utc(event.device_timestamp, received_at),
+                )
+        if actions:
+            session.add_all(actions.values())
+            session.flush()
+
+        # 2) Logs en un único executemany (fila por fila en MySQL, ver _insert_logs)
+        log_rows = []
+        records = []
+        openings = []
+        for index, event in enumerate(batch.events):
+            if index in skipped:
+                continue
+            access_type = event.access_type[:20]
+            event_code, log_detail, access_type_log, door_name = describe_access(event.action, access_type, event.user_name)
+            action = actions.get(index)
+            row = {
+                "event_code": int(event_code),
+                "event": log_detail,
+                "id_device": batch.id_device,
+                "id_user": event.id_user if event.id_user in known_users else None,
+                "id_action": action.id if action else None,
+                "access_type": access_type_log,
+                "timestamp": _device_time_to_utc(event.device_timestamp, received_at),
+            }
+            log_rows.append(row)
+            records.append(log_events.LogRecord(
+                id=None, action=event.action if action else None, **row
+            ))
+            if action:
+                openings.append((event.user_name, access_type, door_name, row["timestamp"]))
+
+        if log_rows:
+            for record, log_id in zip(records, _insert_logs(session, log_rows)):
+                record.id = log_id
+            log_events.track(session, records)
+
+        # 3) Claves de idempotencia de los eventos nuevos, en la misma transacción
+        new_keys = {
+            index: key for index, key in event_keys.items() if index not in skipped
+        }
+        key_responses = {
+            key: {"action_id": actions[index].id if index in actions else None}
+            for index, key in new_keys.items()
+        }
+        if new_keys:
+            session.execute(insert(IdempotencyKey), [
+                {
+                    "key": key,
+                    "id_device": batch.id_device,
+                    "response": json.dumps(key_responses[key]),
+                    "payload_hash": event_hashes[index],
+                    "created_at": received_at,
+                }
+                for index, key in new_keys.items()
+            ])
+
+        # 4) Notificación del lote en el outbox, confirmada junto con los logs
+        notification_sent = _queue_batch_notification(session, openings)
+        session.commit()
+    except IntegrityError:
+        # Otro worker registró los mismos eventos al mismo tiempo
+        session.rollback()
+        raise HTTPException(status_code=409, detail="Lote ya en proceso; reintente para recibir los acuses")
+    except Exception as e:
+        session.rollback()
+        print(f"❌ Error en lote de accesos: {e}")
+        raise HTTPException(status_code=500, detail=f"Error procesando lote: {str(e)}")
+
+    for index, key in new_keys.items():
+        idempotency.remember(key, key_responses[key], event_hashes[index])
+    print(
+        f"📦 Lote de {len(log_rows)} accesos registrado para dispositivo {batch.id_device}"
+        + (f" ({len(duplicates)} repetidos ignorados)" if duplicates else "")
+        + (f" ({len(conflicts)} secuencias en conflicto)" if conflicts else "")
+    )
+
+    notification_outbox.wake()
+
+    return AccessLogBatchResponse(
+        success=True,
+        received=len(batch.events),
+        stored=len(log_rows),
+        duplicates=len(duplicates),
+        conflicts=len(conflicts),
+        notification_sent=notification_sent,
+        acks=[
+            {
+                "index": index,
+                "seq": event.seq,
+                "status": "conflict" if index in conflicts else "duplicate" if index in duplicates else "ok",
+                "action_id": (
+                    (duplicates[index] or key_responses[event_keys[index]]).get("action_id") if index in duplicates
+                    else actions[index].id if index in actions else None
+                ),
+            }
+            for index, event in enumerate(batch.events)
+        ],
+    )
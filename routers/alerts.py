@@ -0,0 +1,65 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import Session
+from core.database import get_session
+from core.security import get_current_user
+from core.anomaly_detector import anomaly_detector, alert_to_dict
+from core.time_utils import to_naive_utc
+from models.alerts import Alert
+
+router = APIRouter(prefix="/alerts", tags=["Alerts"])
+
+@router.get("/")
+def list_alerts(
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+    kind: Optional[str] = Query(None, description="multi_door, denied_burst, login_failed_burst o unusual_hour"),
+    acknowledged: Optional[bool] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Alertas de anomalías detectadas, de la más reciente a la más antigua.
+    """
+    query = session.query(Alert)
+    if kind:
+        query = query.filter(Alert.kind == kind)
+    if acknowledged is not None:
+        query = query.filter(Alert.acknowledged == acknowledged)
+    if start_date:
+        query = query.filter(Alert.created_at >= to_naive_utc(start_date))
+    if end_date:
+        query = query.filter(Alert.created_at <= to_naive_utc(end_date))
+
+    total = query.count()
+    alerts = query.order_by(Alert.created_at.desc(), Alert.id.desc()).offset(offset).limit(limit).all()
+    return {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "data": [alert_to_dict(alert) for alert in alerts],
+    }
+
+@router.get("/stats")
+def alert_stats(user = Depends(get_current_user)):
+    """Eventos analizados, alertas emitidas y estado del detector."""
+    return anomaly_detector.get_stats()
+
+@router.post("/{alert_id}/ack")
+def acknowledge_alert(alert_id: int, session: Session = Depends(get_session), user = Depends(get_current_user)):
+    """Marca una alerta como revisada."""
+    alert = session.get(Alert, alert_id)
+    if not alert:
+        raise HTTPException(status_code=404, detail="Alerta no encontrada")
+
+    if not alert.acknowledged:
+        alert.acknowledged = True
+        alert.acknowledged_at = datetime.utcnow()
+        alert.acknowledged_by = user.id
+        session.add(alert)
+        session.commit()
+        session.refresh(alert)
+    return alert_to_dict(alert)
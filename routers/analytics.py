@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session  # ✅ SQLAlchemy
+from core.database import get_session
+from core.security import get_current_user
+from core.access_analytics import access_analytics
+from core.time_utils import resolve_query_range
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+@router.get("/access")
+def access_analytics_report(
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+    start_date: Optional[datetime] = Query(None, description="Inicio del rango (UTC). Por defecto, últimos 90 días."),
+    end_date: Optional[datetime] = Query(None, description="Fin del rango (UTC). Por defecto, hasta ahora."),
+    id_device: Optional[int] = None,
+    access_type: Optional[str] = Query(None, description="Por defecto solo accesos: nfc, pin y local."),
+    id_user: Optional[int] = None,
+    top_users: int = Query(10, ge=1, le=100),
+):
+    """
+    Histogramas de accesos por hora y por día, horas pico, mapa de calor
+    día de la semana × hora (hora Colombia) y frecuencia por usuario.
+    """
+    # Fechas con zona (…Z, -05:00) a UTC sin zona, como se guardan
+    start_date, end_date = resolve_query_range(start_date, end_date, 90)
+
+    if end_date and end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date debe ser posterior a start_date")
+
+    if (end_date or datetime.utcnow()) - start_date > timedelta(days=366):
+        raise HTTPException(status_code=400, detail="El rango máximo es de 366 días")
+
+    return access_analytics.compute(
+        session,
+        start=start_date,
+        end=end_date,
+        id_device=id_device,
+        access_type=access_type,
+        id_user=id_user,
+        top_users=top_users,
+    )
@@ -16,10 +16,11 @@ from core.security import (
 from models.users import User
 from models.tokens import Token as DBToken
 from models.logs import Log
+from core.event_codes import EventCode
 from schemas.users_schema import UserCreate, UserRead, UserData
 from schemas.auth_schema import LoginResponse
 from core.websocket_manager import manager
-from core.whatsapp_service import whatsapp_service
+from core.notification_outbox import notification_outbox
 
 # ------------------- CONFIGURACIÓN DEL ROUTER -------------------
 router = APIRouter(prefix="/api/auth", tags=["Auth"])
@@ -68,7 +69,7 @@ def register_user(user: UserCreate, session: Session = Depends(get_session)):
         log = Log(
             id_device=1,
             id_user=new_user.id,
-            event=f"Usuario registrado: {user.username}",
+            event_code=EventCode.USER_REGISTERED,
             access_type="remote"
         )
         session.add(log)
@@ -107,7 +108,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), session: Sessi
 
         # Validar contraseña
         if not verify_password(form_data.password, user.password):
-            log_security_event(session, "Intento de login fallido", user.id, f"Usuario: {user.username}")
+            log_security_event(session, EventCode.SECURITY_LOGIN_FAILED, user.id)
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Contraseña incorrecta")
 
         # Crear token JWT
@@ -139,21 +140,15 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), session: Sessi
         log = Log(
             id_device=1,
             id_user=user.id,
-            event=f"Login exitoso - Usuario: {user.username}",
+            event_code=EventCode.LOGIN_SUCCESS,
             access_type="remote"
         )
         session.add(log)
-        session.commit()
 
-        # Enviar notificación WhatsApp
-        try:
-            await whatsapp_service.send_access_notification(
-                user_name=user.name,
-                access_type="Login Web",
-                door="Panel de Control"
-            )
-        except Exception as e:
-            print(f"⚠️ Error enviando notificación WhatsApp: {e}")
+        # Notificación WhatsApp en el outbox, confirmada junto con el login
+        notification_outbox.add_access(session, user.name, "Login Web", "Panel de Control")
+        session.commit()
+        notification_outbox.wake()
 
         # Notificar al dispositivo IoT
         try:
@@ -180,7 +175,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), session: Sessi
             email=user.email
         )
 
-        log_security_event(session, "Login exitoso", user.id)
+        log_security_event(session, EventCode.SECURITY_LOGIN_SUCCESS, user.id)
 
         # Respuesta al cliente web/app
         return {
@@ -226,7 +221,7 @@ def logout(token: str = Depends(outh2_scheme), session: Session = Depends(get_se
         log = Log(
             id_device=1,
             id_user=db_token.id_user,
-            event="Logout exitoso",
+            event_code=EventCode.LOGOUT,
             access_type="remote"
         )
         session.add(log)
@@ -303,7 +298,7 @@ async def refresh_token(user = Depends(get_current_user), session: Session = Dep
         log = Log(
             id_device=1,
             id_user=user.id,
-            event="Token renovado exitosamente",
+            event_code=EventCode.TOKEN_REFRESHED,
             access_type="remote"
         )
         session.add(log)
@@ -357,7 +352,7 @@ def change_password(
     try:
         # Verificar contraseña actual
         if not verify_password(current_password, user.password):
-            log_security_event(session, "Intento de cambio de contraseña fallido", user.id)
+            log_security_event(session, EventCode.SECURITY_PASSWORD_CHANGE_FAILED, user.id)
             raise HTTPException(status_code=400, detail="Contraseña actual incorrecta")
 
         # Validar fortaleza de nueva contraseña
@@ -387,13 +382,13 @@ def change_password(
         log = Log(
             id_device=1,
             id_user=user.id,
-            event="Contraseña cambiada exitosamente",
+            event_code=EventCode.PASSWORD_CHANGED,
             access_type="remote"
         )
         session.add(log)
         session.commit()
 
-        log_security_event(session, "Contraseña cambiada exitosamente", user.id)
+        log_security_event(session, EventCode.SECURITY_PASSWORD_CHANGED, user.id)
 
         return {"success": True, "message": "Contraseña cambiada exitosamente. Se ha cerrado la sesión en todos los dispositivos."}
         
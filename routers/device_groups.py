@@ -0,0 +1,184 @@
+from datetime import datetime
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from core.database import get_session
+from core.group_commands import group_commands
+from core.security import get_current_user
+from models.device_groups import DeviceGroup
+from models.device_group_members import DeviceGroupMember
+from models.devices import Device
+from schemas.device_groups_schema import (
+    DeviceGroupCreate, DeviceGroupRead, DeviceGroupUpdate, GroupCommandCreate, GroupCommandStatus,
+)
+
+router = APIRouter(prefix="/device-groups", tags=["Device Groups"])
+
+def _require_admin(user):
+    if user.username != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo el administrador puede gestionar grupos de dispositivos"
+        )
+
+def _get_group(session: Session, group_id: int) -> DeviceGroup:
+    group = session.query(DeviceGroup).filter(DeviceGroup.id == group_id).first()
+    if not group:
+        raise HTTPException(status_code=404, detail="Grupo no encontrado")
+    return group
+
+def _member_ids(session: Session, group_id: int) -> List[int]:
+    return [
+        id_device for (id_device,) in
+        session.query(DeviceGroupMember.id_device)
+        .filter(DeviceGroupMember.id_group == group_id)
+        .order_by(DeviceGroupMember.id_device)
+    ]
+
+def _set_members(session: Session, group_id: int, device_ids: List[int]):
+    device_ids = sorted(set(device_ids))
+    if device_ids:
+        found = {id_device for (id_device,) in session.query(Device.id).filter(Device.id.in_(device_ids))}
+        missing = [id_device for id_device in device_ids if id_device not in found]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Dispositivos no encontrados: {missing}")
+    session.query(DeviceGroupMember).filter(DeviceGroupMember.id_group == group_id).delete()
+    session.add_all([DeviceGroupMember(id_group=group_id, id_device=id_device) for id_device in device_ids])
+
+def _group_read(session: Session, group: DeviceGroup) -> DeviceGroupRead:
+    return DeviceGroupRead(
+        id=group.id,
+        name=group.name,
+        description=group.description,
+        device_ids=_member_ids(session, group.id),
+        created_at=group.created_at,
+        updated_at=group.updated_at,
+    )
+
+@router.post("/", response_model=DeviceGroupRead, status_code=status.HTTP_201_CREATED)
+def create_group(
+    data: DeviceGroupCreate,
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """Crea un grupo de dispositivos (por ejemplo, todas las puertas de una sede)."""
+    _require_admin(user)
+    if session.query(DeviceGroup).filter(DeviceGroup.name == data.name).first():
+        raise HTTPException(status_code=400, detail="Ya existe un grupo con ese nombre")
+
+    group = DeviceGroup(name=data.name, description=data.description)
+    session.add(group)
+    session.flush()
+    _set_members(session, group.id, data.device_ids)
+    session.commit()
+    session.refresh(group)
+    return _group_read(session, group)
+
+@router.get("/", response_model=List[DeviceGroupRead])
+def list_groups(
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """Lista los grupos con sus dispositivos."""
+    groups = session.query(DeviceGroup).order_by(DeviceGroup.name).all()
+    members = {}
+    for id_group, id_device in session.query(DeviceGroupMember.id_group, DeviceGroupMember.id_device):
+        members.setdefault(id_group, []).append(id_device)
+    return [
+        DeviceGroupRead(
+            id=group.id,
+            name=group.name,
+            description=group.description,
+            device_ids=sorted(members.get(group.id, [])),
+            created_at=group.created_at,
+            updated_at=group.updated_at,
+        )
+        for group in groups
+    ]
+
+@router.get("/commands/{command_id}", response_model=GroupCommandStatus)
+def get_group_command(
+    command_id: str,
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """Estado actual de un comando de grupo: qué dispositivos ya confirmaron."""
+    result = group_commands.status(session, command_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Comando de grupo no encontrado")
+    return result
+
+@router.get("/{group_id}", response_model=DeviceGroupRead)
+def get_group(
+    group_id: int,
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """Obtiene un grupo y sus dispositivos."""
+    return _group_read(session, _get_group(session, group_id))
+
+@router.put("/{group_id}", response_model=DeviceGroupRead)
+def update_group(
+    group_id: int,
+    data: DeviceGroupUpdate,
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """Actualiza nombre, descripción o dispositivos del grupo."""
+    _require_admin(user)
+    group = _get_group(session, group_id)
+
+    if data.name is not None and data.name != group.name:
+        if session.query(DeviceGroup).filter(DeviceGroup.name == data.name).first():
+            raise HTTPException(status_code=400, detail="Ya existe un grupo con ese nombre")
+        group.name = data.name
+    if data.description is not None:
+        group.description = data.description
+    if data.device_ids is not None:
+        _set_members(session, group.id, data.device_ids)
+
+    group.updated_at = datetime.utcnow()
+    session.add(group)
+    session.commit()
+    session.refresh(group)
+    return _group_read(session, group)
+
+@router.delete("/{group_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_group(
+    group_id: int,
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """Elimina el grupo (los dispositivos no se tocan)."""
+    _require_admin(user)
+    group = _get_group(session, group_id)
+    session.query(DeviceGroupMember).filter(DeviceGroupMember.id_group == group.id).delete()
+    session.delete(group)
+    session.commit()
+    return
+
+@router.post("/{group_id}/commands", response_model=GroupCommandStatus)
+async def send_group_command(
+    group_id: int,
+    data: GroupCommandCreate,
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """
+    Envía la misma acción a todos los dispositivos del grupo en paralelo y
+    espera las confirmaciones hasta el plazo (deadline_seconds). Los que no
+    confirmaron a tiempo siguen en la cola; su estado se consulta en
+    /device-groups/commands/{id}.
+    """
+    _require_admin(user)
+    group = _get_group(session, group_id)
+    device_ids = _member_ids(session, group.id)
+    if not device_ids:
+        raise HTTPException(status_code=400, detail="El grupo no tiene dispositivos")
+
+    result = await group_commands.dispatch(
+        session, group, device_ids, data.action, user.id,
+        device_timeout=data.device_timeout_seconds,
+        deadline=data.deadline_seconds,
+    )
+    return result
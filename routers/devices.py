@@ -1,9 +1,11 @@
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, status
 from typing import List, Optional
 from sqlalchemy.orm import Session  # ✅ SQLAlchemy
 from core.database import get_session
 from core.security import get_current_user
+from core.recent_events import recent_events
+from core.config import settings
 from models.devices import Device
 from schemas.devices_schema import DeviceCreate, DeviceRead, DeviceUpdate, DeviceUpdateIP, DeviceStatusUpdate
 
@@ -80,6 +82,21 @@ def get_device(
     
     return device
 
+@router.get("/{device_id}/recent")
+def get_recent_events(
+    device_id: int,
+    limit: int = Query(20, ge=1, le=settings.RECENT_EVENTS_PER_DEVICE),
+    user = Depends(get_current_user),
+):
+    """Últimos eventos del dispositivo, servidos desde memoria (sin consultar la tabla de logs)."""
+    entries = recent_events.recent(device_id, limit)
+    return {
+        "device_id": device_id,
+        "count": len(entries),
+        "capacity": recent_events.capacity,
+        "data": recent_events.render(entries),
+    }
+
 @router.put("/{device_id}", response_model=DeviceRead)
 def update_device(
     device_id: int, 
@@ -1,6 +1,15 @@
 from fastapi import APIRouter, Depends
 from sqlmodel import Session, text
 from core.database import get_session
+from core.admission import admission_controller
+from core.security_compaction import security_compactor
+from core.recent_events import recent_events
+from core.command_queue import command_queue
+from core.idempotency import idempotency
+from core.action_scheduler import action_scheduler
+from core.websocket_manager import manager
+from core.notification_outbox import notification_outbox
+from core.whatsapp_service import whatsapp_service
 
 router = APIRouter(prefix="/health", tags=["Health Check"])
 
@@ -21,4 +30,68 @@ def health_check(session: Session = Depends(get_session)):
             "status": "error",
             "backend": "offline",
             "database": f"error: {str(e)}"
-        }
\ No newline at end of file
+        }
+
+@router.get("/admission")
+def admission_stats():
+    """
+    Estado del control de admisión: concurrencia, cola y tiempos de espera por clase de ruta.
+    """
+    return admission_controller.stats()
+
+
+@router.get("/security-compaction")
+def security_compaction_stats():
+    """
+    Eventos de seguridad recibidos, filas escritas y ventanas de compactación abiertas.
+    """
+    return security_compactor.get_stats()
+
+
+@router.get("/recent-events")
+def recent_events_stats():
+    """
+    Ocupación de los buffers de eventos recientes por dispositivo.
+    """
+    return recent_events.get_stats()
+
+
+@router.get("/command-queue")
+def command_queue_stats():
+    """
+    Comandos enviados, reenviados, confirmados y vencidos; abiertos por dispositivo.
+    """
+    return command_queue.get_stats()
+
+
+@router.get("/idempotency")
+def idempotency_stats():
+    """
+    Reintentos de dispositivos resueltos desde memoria o desde la tabla de claves.
+    """
+    return idempotency.get_stats()
+
+
+@router.get("/scheduler")
+def scheduler_stats():
+    """
+    Temporizadores armados por nivel de la rueda y ejecuciones de acciones programadas.
+    """
+    return action_scheduler.get_stats()
+
+
+@router.get("/device-outbound")
+def device_outbound_stats():
+    """
+    Colas de salida a dispositivos: envíos y latencia (espera en cola y entrega) por prioridad.
+    """
+    return manager.get_outbound_stats()
+
+
+@router.get("/notifications")
+def notification_stats():
+    """
+    Notificaciones de WhatsApp enviadas solas, agrupadas en resúmenes o críticas; fichas disponibles
+    y estado del outbox (pendientes, reintentos, dead letters).
+    """
+    return {**whatsapp_service.aggregator.get_stats(), "outbox": notification_outbox.get_stats()}
@@ -1,61 +1,328 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session  # ✅ SQLAlchemy
-from sqlalchemy import func, or_
 from typing import Optional, Dict, List, Any
-from core.database import get_session
+from datetime import datetime
+import csv
+import io
+import json
+import zlib
+from core.config import settings
+from core.database import get_session, SessionLocal
 from core.security import get_current_user
+from core.log_rollups import log_rollups
+from core.log_search import apply_event_search
+from core.log_archive import log_archive
+from core.time_utils import resolve_query_range
+from core.event_codes import EventCode, EventRenderer, migrate_legacy_events
 from models.logs import Log
-from models.devices import Device
 from schemas.logs_schema import LogReadPaginated
 
 router = APIRouter(prefix="/logs", tags=["Logs"])
 
-@router.get("/", response_model=LogReadPaginated)
-def get_logs(
-    session: Session = Depends(get_session),
-    user = Depends(get_current_user),
+EXPORT_COLUMNS = [
+    "id", "timestamp", "id_device", "id_user", "id_action", "access_type",
+    "event_code", "occurrences", "last_timestamp", "event",
+]
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_BATCH_ROWS = 1000
+LOG_READ_FIELDS = [
+    "id", "timestamp", "id_device", "id_user", "id_action", "access_type",
+    "event_code", "id_subject_user", "id_card", "occurrences", "last_timestamp",
+]
+
+def _filtered_logs_query(
+    session: Session,
     id_device: Optional[int] = None,
-    event_contains: Optional[str] = Query(None, description="Filtrar logs cuyo evento contenga esta cadena."),
+    event_contains: Optional[str] = None,
+    event_order: str = "recent",
     access_type: Optional[str] = None,
     id_action: Optional[int] = None,
-    page: int = Query(1, ge=1),
-    limit: int = Query(10, ge=1, le=100),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    event_code: Optional[int] = None,
 ):
-    """
-    Obtiene logs con filtros, paginación y recuentos por dispositivo, estado y tipo de acción.
-    """
-    
-    # ✅ CORREGIDO: Usar session.query()
+    """Construye la consulta de logs con los filtros comunes de listado y exportación."""
     query = session.query(Log)
 
+    # Dispositivo, tipo de evento y rango de fechas primero: usan
+    # ix_logs_device_timestamp / ix_logs_event_code_timestamp / ix_logs_timestamp
     if id_device:
         query = query.filter(Log.id_device == id_device)
+
+    if event_code is not None:
+        query = query.filter(Log.event_code == event_code)
+
+    if start_date:
+        query = query.filter(Log.timestamp >= start_date)
+
+    if end_date:
+        query = query.filter(Log.timestamp <= end_date)
     
     if event_contains:
-        query = query.filter(Log.event.ilike(f"%{event_contains}%"))
+        query = apply_event_search(query, session, event_contains, event_order)
+    else:
+        query = query.order_by(Log.timestamp.desc(), Log.id.desc())
         
     if access_type:
         query = query.filter(Log.access_type == access_type)
         
     if id_action: 
         query = query.filter(Log.id_action == id_action)
+
+    return query
+
+def _render_logs(session: Session, logs: List[Log]) -> List[Dict[str, Any]]:
+    """Convierte los logs a diccionarios con el texto del evento generado."""
+    events = EventRenderer(session).render_all(logs)
+    return [
+        {**{field: getattr(log, field) for field in LOG_READ_FIELDS}, "event": event}
+        for log, event in zip(logs, events)
+    ]
+
+@router.get("/codes")
+def list_event_codes(user = Depends(get_current_user)):
+    """Códigos de evento disponibles para el filtro event_code."""
+    return [{"code": int(code), "name": code.name} for code in EventCode]
+
+@router.get("/", response_model=LogReadPaginated)
+def get_logs(
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+    id_device: Optional[int] = None,
+    event_contains: Optional[str] = Query(None, description="Filtrar logs cuyo evento contenga estas palabras (búsqueda indexada)."),
+    event_order: str = Query("recent", pattern="^(recent|relevance)$", description="Orden de la búsqueda: recent o relevance."),
+    access_type: Optional[str] = None,
+    id_action: Optional[int] = None,
+    event_code: Optional[int] = Query(None, description="Filtrar por código de evento (ver /logs/codes)."),
+    start_date: Optional[datetime] = Query(None, description="Inicio del rango (UTC). Por defecto, los últimos QUERY_DEFAULT_WINDOW_DAYS días."),
+    end_date: Optional[datetime] = Query(None, description="Fin del rango (UTC, inclusive)."),
+    all_history: bool = Query(False, description="Sin start_date, recorrer todo el historial en lugar de la ventana por defecto."),
+    include_archive: bool = Query(False, description="Incluir logs archivados (más antiguos que la retención)."),
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+):
+    """
+    Obtiene logs con filtros, paginación y recuentos por dispositivo, estado y tipo de acción.
+    Sin rango de fechas se limita a una ventana reciente (all_history para desactivarla).
+    Con include_archive los logs archivados se listan después de los de la tabla.
+    """
+    start_date, end_date = resolve_query_range(
+        start_date, end_date, 0 if all_history else settings.QUERY_DEFAULT_WINDOW_DAYS
+    )
+    if start_date and end_date and end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date debe ser posterior a start_date")
+    
+    query = _filtered_logs_query(
+        session, id_device, event_contains, event_order, access_type, id_action, start_date, end_date, event_code
+    )
     
     # Ejecutar consulta para obtener total y datos paginados
     total = query.count()
     
     offset = (page - 1) * limit
-    logs = query.offset(offset).limit(limit).all()
+    logs = _render_logs(session, query.offset(offset).limit(limit).all()) if offset < total else []
+
+    archived_counts = {} if include_archive else None
+    if include_archive:
+        archived_total, archived_logs = log_archive.query(
+            offset=max(offset - total, 0),
+            limit=limit - len(logs),
+            id_device=id_device,
+            access_type=access_type,
+            id_action=id_action,
+            event_contains=event_contains,
+            start_date=start_date,
+            end_date=end_date,
+            event_code=event_code,
+            counts=archived_counts,
+        )
+        total += archived_total
+        logs = logs + archived_logs
 
     pages = (total // limit) + (1 if total % limit > 0 else 0)
 
+    # Recuentos (ocurrencias): desde los rollups si los filtros lo permiten; con
+    # búsqueda, id_action o event_code se agrupa la consulta filtrada, acotada
+    # por el rango de fechas
+    if event_contains or id_action or event_code is not None:
+        counts = log_rollups.counts_from_query(query)
+    else:
+        counts = log_rollups.counts_in_range(
+            session, query, id_device=id_device, access_type=access_type, start=start_date, end=end_date
+        )
+    if archived_counts:
+        log_rollups.add_archived(session, counts, archived_counts)
+
     return LogReadPaginated(
         total=total,
         page=page,
         limit=limit,
         pages=pages,
         data=logs,
-        counts_by_device={},
-        counts_by_status={},
-        counts_by_action_type={},
-        counts_by_access_type={},
-    )
\ No newline at end of file
+        **counts,
+    )
+
+@router.get("/export")
+def export_logs(
+    user = Depends(get_current_user),
+    id_device: Optional[int] = None,
+    event_contains: Optional[str] = None,
+    access_type: Optional[str] = None,
+    id_action: Optional[int] = None,
+    event_code: Optional[int] = None,
+    start_date: Optional[datetime] = Query(None, description="Inicio del rango (UTC). Sin él se exporta todo el historial."),
+    end_date: Optional[datetime] = Query(None, description="Fin del rango (UTC, inclusive)."),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    cursor: Optional[int] = Query(None, ge=0, description="Reanudar después de este id de log."),
+):
+    """
+    Exporta logs en streaming (NDJSON o CSV) con los mismos filtros que /logs/.
+
+    Las filas salen ordenadas por id ascendente y se leen con un cursor del
+    servidor, así que la memoria es constante sin importar el rango. Para
+    reanudar una descarga cortada, pasar en `cursor` el último id recibido.
+    """
+    start, end = resolve_query_range(start_date, end_date)
+
+    def generate():
+        session = SessionLocal()
+        # Sesión aparte para los nombres: la principal tiene abierto el cursor en streaming
+        lookup_session = SessionLocal()
+        try:
+            query = _filtered_logs_query(
+                session, id_device, event_contains, "recent", access_type, id_action, start, end, event_code
+            )
+            if cursor is not None:
+                query = query.filter(Log.id > cursor)
+            rows = (
+                query.order_by(None)
+                .order_by(Log.id.asc())
+                .with_entities(
+                    Log.id, Log.timestamp, Log.id_device, Log.id_user,
+                    Log.id_action, Log.access_type, Log.event_code, Log.occurrences,
+                    Log.last_timestamp, Log.event, Log.id_subject_user, Log.id_card,
+                )
+                .yield_per(EXPORT_BATCH_ROWS)
+            )
+            renderer = EventRenderer(lookup_session)
+
+            compressor = zlib.compressobj(wbits=31) if gzip else None
+            buffer = io.StringIO()
+            writer = csv.writer(buffer) if format == "csv" else None
+            if writer:
+                writer.writerow(EXPORT_COLUMNS)
+
+            def write_batch(batch):
+                for row, event in zip(batch, renderer.render_all(batch)):
+                    values = list(row[:len(EXPORT_COLUMNS)])
+                    values[1] = values[1].isoformat() if values[1] else None
+                    values[8] = values[8].isoformat() if values[8] else None
+                    values[-1] = event
+                    if writer:
+                        writer.writerow(values)
+                    else:
+                        buffer.write(json.dumps(dict(zip(EXPORT_COLUMNS, values)), ensure_ascii=False))
+                        buffer.write("\n")
+
+                    if buffer.tell() >= EXPORT_CHUNK_BYTES:
+                        chunk = drain()
+                        if chunk:
+                            yield chunk
+
+            def drain(final: bool = False):
+                data = buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+                if compressor:
+                    data = compressor.compress(data)
+                    if final:
+                        data += compressor.flush()
+                return data
+
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) < EXPORT_BATCH_ROWS:
+                    continue
+                yield from write_batch(batch)
+                batch = []
+            yield from write_batch(batch)
+
+            chunk = drain(final=True)
+            if chunk:
+                yield chunk
+        finally:
+            lookup_session.close()
+            session.close()
+
+    extension = "csv" if format == "csv" else "ndjson"
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"logs.{extension}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post("/archive/run")
+def run_log_archive(
+    older_than_days: int = Query(settings.LOG_RETENTION_DAYS, ge=1),
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """
+    Mueve a archivos comprimidos los logs más antiguos que `older_than_days`.
+    """
+    if user.username != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo el administrador puede archivar logs"
+        )
+
+    archived = log_archive.archive_old_logs(session, older_than_days)
+    return {
+        "message": "Logs archivados correctamente",
+        "archived": archived,
+        "total": sum(archived.values()),
+    }
+
+@router.post("/rollups/rebuild")
+def rebuild_log_rollups(
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """
+    Recalcula los rollups de conteos desde la tabla logs (backfill).
+    """
+    if user.username != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo el administrador puede reconstruir los rollups"
+        )
+
+    buckets = log_rollups.rebuild(session)
+    return {"message": "Rollups reconstruidos correctamente", "buckets": buckets}
+
+@router.post("/event-codes/migrate")
+def migrate_log_event_codes(
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """
+    Convierte los logs anteriores a los códigos de evento: analiza su texto,
+    asigna `event_code` y mueve nombres e ids a sus columnas. Se puede repetir.
+    """
+    if user.username != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo el administrador puede migrar los logs"
+        )
+
+    result = migrate_legacy_events(session)
+    return {"message": "Logs migrados correctamente", **result}
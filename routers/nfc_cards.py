@@ -4,10 +4,11 @@ from datetime import datetime
 from typing import List
 
 from core.database import get_session
-from core.security import get_current_user
+from core.security import get_current_user, log_security_event
 from models.nfc_cards import NFCCard
 from models.users import User
 from models.logs import Log
+from core.event_codes import EventCode
 from schemas.nfc_schema import (
     NFCCardCreate, NFCCardRead, NFCCardUpdate, 
     NFCCardValidation, NFCRegistrationRequest
@@ -41,12 +42,15 @@ async def create_nfc_card(
     )
     
     session.add(new_card)
+    session.flush()  # Para obtener el ID de la tarjeta
     
     # Crear log
     log = Log(
         id_device=1,
         id_user=user.id,
-        event=f"Tarjeta NFC '{data.card_name}' creada para usuario {user_data.name}",
+        id_subject_user=user_data.id,
+        id_card=new_card.id,
+        event_code=EventCode.NFC_CARD_CREATED,
         access_type="remote"
     )
     session.add(log)
@@ -139,6 +143,7 @@ async def validate_nfc_card(
 
     if not card:
         print(f"❌ Tarjeta no encontrada: {card_uid}")
+        log_security_event(session, EventCode.ACCESS_NFC_DENIED, details=f"Tarjeta {card_uid[:60]}", access_type="nfc")
         return NFCCardValidation(
             valid=False,
             message="Tarjeta no válida o desactivada"
@@ -147,6 +152,7 @@ async def validate_nfc_card(
     user = session.query(User).filter(User.id == card.id_user).first()
     if not user or not user.status:
         print(f"❌ Usuario desactivado: {user.name if user else 'N/A'}")
+        log_security_event(session, EventCode.ACCESS_NFC_DENIED, card.id_user, "Usuario desactivado", access_type="nfc")
         return NFCCardValidation(
             valid=False,
             message="Usuario desactivado"
@@ -165,7 +171,8 @@ async def validate_nfc_card(
     log = Log(
         id_device=1,
         id_user=user.id,
-        event=f"Acceso concedido vía NFC - Tarjeta: {card.card_name}",
+        id_card=card.id,
+        event_code=EventCode.ACCESS_NFC_CARD,
         access_type="nfc"
     )
     session.add(log)
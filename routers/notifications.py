@@ -0,0 +1,59 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from core.database import get_session
+from core.notification_outbox import notification_outbox
+from core.security import get_current_user
+from models.notification_outbox import NotificationOutbox
+from schemas.notifications_schema import NotificationOutboxRead
+
+router = APIRouter(prefix="/notifications", tags=["Notifications"])
+
+STATUSES = ("pending", "sending", "sent", "dead")
+
+def _require_admin(user):
+    if user.username != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo el administrador puede gestionar las notificaciones"
+        )
+
+@router.get("/outbox", response_model=List[NotificationOutboxRead])
+def list_outbox(
+    status_filter: Optional[str] = Query(None, alias="status"),
+    limit: int = Query(100, ge=1, le=1000),
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """Lista las notificaciones del outbox, las más recientes primero (filtro opcional por estado)."""
+    _require_admin(user)
+    query = session.query(NotificationOutbox)
+    if status_filter is not None:
+        if status_filter not in STATUSES:
+            raise HTTPException(status_code=400, detail=f"Estado inválido; use uno de {', '.join(STATUSES)}")
+        query = query.filter(NotificationOutbox.status == status_filter)
+    return query.order_by(NotificationOutbox.id.desc()).limit(limit).all()
+
+@router.post("/outbox/{notification_id}/retry", response_model=NotificationOutboxRead)
+def retry_notification(
+    notification_id: int,
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """Vuelve a poner en cola una notificación descartada (dead) o pendiente, sin espera."""
+    _require_admin(user)
+    row = session.query(NotificationOutbox).filter(NotificationOutbox.id == notification_id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Notificación no encontrada")
+    if row.status not in ("dead", "pending"):
+        raise HTTPException(status_code=409, detail=f"La notificación está en estado '{row.status}'")
+
+    row.status = "pending"
+    row.attempts = 0
+    row.next_attempt_at = None
+    session.add(row)
+    session.commit()
+    session.refresh(row)
+    notification_outbox.wake()
+    print(f"🔁 Notificación {notification_id} reenviada a la cola por el administrador")
+    return row
@@ -0,0 +1,49 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+from core.security import get_current_user
+from core.reports import report_service
+from core.time_utils import get_current_colombia_time
+
+router = APIRouter(prefix="/reports", tags=["Reports"])
+
+MEDIA_TYPES = {"pdf": "application/pdf", "csv": "text/csv; charset=utf-8"}
+
+@router.get("/access")
+async def access_report(
+    user = Depends(get_current_user),
+    type: str = Query("user", pattern="^(user|device)$", description="Reporte por usuario o por dispositivo."),
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="Mes AAAA-MM (hora Colombia). Por defecto, el mes actual."),
+    format: str = Query("pdf", pattern="^(pdf|csv)$"),
+    id_user: Optional[int] = None,
+    id_device: Optional[int] = None,
+):
+    """
+    Reporte mensual de accesos (PDF o CSV). Se genera fuera del event loop y
+    queda en caché hasta que lleguen logs nuevos al mes consultado.
+    """
+    if month:
+        year, month_number = (int(part) for part in month.split("-"))
+        if not 1 <= month_number <= 12:
+            raise HTTPException(status_code=400, detail="Mes inválido")
+    else:
+        now = get_current_colombia_time()
+        year, month_number = now.year, now.month
+
+    try:
+        path, cached = await report_service.get_report(type, year, month_number, format, id_user, id_device)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generando el reporte: {str(e)}")
+
+    filename = f"reporte-accesos-{type}-{year}-{month_number:02d}.{format}"
+    return FileResponse(
+        path,
+        media_type=MEDIA_TYPES[format],
+        filename=filename,
+        headers={"X-Report-Cache": "hit" if cached else "miss"},
+    )
+
+@router.get("/stats")
+def report_stats(user = Depends(get_current_user)):
+    """Estadísticas de generación y caché de reportes."""
+    return report_service.get_stats()
@@ -0,0 +1,159 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from core.action_scheduler import action_scheduler, parse_weekdays
+from core.database import get_session
+from core.security import get_current_user
+from core.time_utils import colombia_to_utc, format_colombia_time, to_naive_utc
+from models.devices import Device
+from models.scheduled_actions import ScheduledAction
+from schemas.scheduled_actions_schema import ScheduledActionCreate, ScheduledActionRead, ScheduledActionUpdate
+
+router = APIRouter(prefix="/scheduled-actions", tags=["Scheduled Actions"])
+
+def _require_admin(user):
+    if user.username != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo el administrador puede gestionar acciones programadas"
+        )
+
+def _get_schedule(session: Session, schedule_id: int) -> ScheduledAction:
+    schedule = session.query(ScheduledAction).filter(ScheduledAction.id == schedule_id).first()
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Acción programada no encontrada")
+    return schedule
+
+def _check_device(session: Session, id_device: int):
+    if not session.query(Device.id).filter(Device.id == id_device).first():
+        raise HTTPException(status_code=404, detail="Dispositivo no encontrado")
+
+def _run_at_utc(run_at: datetime) -> datetime:
+    """run_at sin zona es hora Colombia, como time_of_day; con zona se respeta."""
+    return colombia_to_utc(run_at) if run_at.tzinfo is None else to_naive_utc(run_at)
+
+def _apply(schedule: ScheduledAction, data: ScheduledActionCreate):
+    schedule.name = data.name
+    schedule.id_device = data.id_device
+    schedule.action = data.action
+    schedule.kind = data.kind
+    schedule.time_of_day = data.time_of_day if data.kind != "once" else None
+    schedule.weekdays = ",".join(str(day) for day in data.weekdays) if data.kind == "weekly" else None
+    schedule.run_at = _run_at_utc(data.run_at) if data.kind == "once" else None
+    schedule.catch_up_minutes = data.catch_up_minutes
+    schedule.enabled = data.enabled
+
+def _schedule_read(schedule: ScheduledAction) -> ScheduledActionRead:
+    return ScheduledActionRead(
+        id=schedule.id,
+        name=schedule.name,
+        id_device=schedule.id_device,
+        action=schedule.action,
+        kind=schedule.kind,
+        time_of_day=schedule.time_of_day,
+        weekdays=parse_weekdays(schedule.weekdays) if schedule.weekdays else None,
+        run_at=schedule.run_at,
+        catch_up_minutes=schedule.catch_up_minutes,
+        enabled=schedule.enabled,
+        next_run_at=schedule.next_run_at,
+        next_run_local=format_colombia_time(schedule.next_run_at) if schedule.next_run_at else None,
+        last_run_at=schedule.last_run_at,
+        last_action_id=schedule.last_action_id,
+        id_user=schedule.id_user,
+        created_at=schedule.created_at,
+        updated_at=schedule.updated_at,
+    )
+
+@router.post("/", response_model=ScheduledActionRead, status_code=status.HTTP_201_CREATED)
+def create_scheduled_action(
+    data: ScheduledActionCreate,
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """
+    Programa una acción para un dispositivo: única (run_at), diaria o semanal
+    (time_of_day y, para semanal, weekdays con lunes = 0). Las horas sin zona
+    son hora Colombia.
+    Se ejecuta con el usuario que la programó como autor.
+    """
+    _require_admin(user)
+    _check_device(session, data.id_device)
+
+    schedule = ScheduledAction(id_user=user.id)
+    _apply(schedule, data)
+    if schedule.kind == "once" and schedule.run_at <= datetime.utcnow():
+        raise HTTPException(status_code=400, detail="run_at debe ser una fecha futura")
+
+    action_scheduler.reschedule(session, schedule)
+    print(f"⏰ Acción programada creada: '{schedule.name}' (próxima {schedule.next_run_at})")
+    return _schedule_read(schedule)
+
+@router.get("/", response_model=List[ScheduledActionRead])
+def list_scheduled_actions(
+    id_device: Optional[int] = None,
+    enabled: Optional[bool] = None,
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """Lista las acciones programadas, las próximas a ejecutarse primero."""
+    query = session.query(ScheduledAction)
+    if id_device is not None:
+        query = query.filter(ScheduledAction.id_device == id_device)
+    if enabled is not None:
+        query = query.filter(ScheduledAction.enabled == enabled)
+    schedules = query.order_by(ScheduledAction.next_run_at.is_(None), ScheduledAction.next_run_at, ScheduledAction.id).all()
+    return [_schedule_read(schedule) for schedule in schedules]
+
+@router.get("/{schedule_id}", response_model=ScheduledActionRead)
+def get_scheduled_action(
+    schedule_id: int,
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """Obtiene una acción programada."""
+    return _schedule_read(_get_schedule(session, schedule_id))
+
+@router.put("/{schedule_id}", response_model=ScheduledActionRead)
+def update_scheduled_action(
+    schedule_id: int,
+    data: ScheduledActionUpdate,
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """Actualiza la programación y recalcula su próxima ejecución."""
+    _require_admin(user)
+    schedule = _get_schedule(session, schedule_id)
+
+    current = _schedule_read(schedule).dict(include=set(ScheduledActionCreate.__fields__))
+    if current["run_at"] is not None:
+        # Guardada en UTC: con zona para no leerla como hora Colombia
+        current["run_at"] = current["run_at"].replace(tzinfo=timezone.utc)
+    try:
+        merged = ScheduledActionCreate(**{**current, **data.dict(exclude_unset=True)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if merged.id_device != schedule.id_device:
+        _check_device(session, merged.id_device)
+
+    _apply(schedule, merged)
+    if schedule.kind == "once" and schedule.enabled and schedule.run_at <= datetime.utcnow():
+        session.rollback()  # Descarta los cambios aplicados a la fila
+        raise HTTPException(status_code=400, detail="run_at debe ser una fecha futura")
+    schedule.updated_at = datetime.utcnow()
+    action_scheduler.reschedule(session, schedule)
+    return _schedule_read(schedule)
+
+@router.delete("/{schedule_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_scheduled_action(
+    schedule_id: int,
+    session: Session = Depends(get_session),
+    user = Depends(get_current_user),
+):
+    """Elimina la acción programada (las acciones ya ejecutadas se conservan)."""
+    _require_admin(user)
+    schedule = _get_schedule(session, schedule_id)
+    session.delete(schedule)
+    session.commit()
+    action_scheduler.remove(schedule_id)
+    return
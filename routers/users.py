@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session  # ✅ SQLAlchemy
 from datetime import datetime
 from core.database import get_session
 from core.security import get_current_user
+from core.user_access_summary import user_access_summary
 from models.users import User
 from schemas.users_schema import UserRead, UserUpdate
 
@@ -20,6 +21,23 @@ def get_users(
     print(f"📋 Usuario {user.username} consultó {len(users)} usuarios")
     return users
 
+@router.post("/access-summary/rebuild")
+def rebuild_access_summary(
+    user = Depends(get_current_user),
+):
+    """
+    Recalcula desde los logs el último acceso y los accesos del mes de cada
+    usuario. Para cargas iniciales o correcciones; el uso normal es incremental.
+    """
+    if user.username != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo el administrador puede reconstruir el resumen de accesos"
+        )
+
+    result = user_access_summary.rebuild()
+    return {"message": "Resumen de accesos reconstruido", **result}
+
 @router.get("/{user_id}", response_model=UserRead)
 def get_user(
     user_id: int, 
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from core.database import SessionLocal
+from core.security import validate_token
+from core.websocket_manager import manager
+
+router = APIRouter()
+
+@router.websocket("/ws/dashboard")
+async def dashboard_websocket(websocket: WebSocket, token: str = Query(...)):
+    """
+    Canal del panel web: recibe las alertas de anomalías en tiempo real.
+    """
+    with SessionLocal() as session:
+        result = validate_token(token, session)
+    if not result.get("valid"):
+        await websocket.close(code=1008)
+        return
+
+    await manager.connect(websocket)
+    try:
+        while True:
+            # El panel solo escucha; los mensajes entrantes se ignoran
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        manager.disconnect(websocket)
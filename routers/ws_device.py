@@ -1,5 +1,7 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from core.websocket_manager import manager
+from core.websocket_manager import PRIORITY_CRITICAL, manager
+from core.command_queue import command_queue
+from core.command_tracing import command_tracer
 import json
 
 router = APIRouter()
@@ -11,6 +13,9 @@ async def websocket_endpoint(websocket: WebSocket, device_id: int):
     
     print(f"✅ Dispositivo {device_id} conectado vía WebSocket. Dispositivos activos: {len(manager.device_connections)}")
 
+    # Entregar los comandos que quedaron pendientes mientras estuvo desconectado
+    await command_queue.redeliver(device_id)
+
     try:
         while True:
             data = await websocket.receive_text()
@@ -24,11 +29,12 @@ async def websocket_endpoint(websocket: WebSocket, device_id: int):
                 if message_type == "auth":
                     token = message.get("token")
                     if token:
-                        await manager.send_json(websocket, {
+                        # Por la cola de salida: un solo escritor por conexión
+                        await manager.send_to_device(device_id, {
                             "type": "auth_response",
                             "success": True,
                             "message": "Autenticado correctamente"
-                        })
+                        }, PRIORITY_CRITICAL)
                         print(f"🔐 Dispositivo {device_id} autenticado")
                 
                 # Manejar registro de tarjeta NFC desde el dispositivo
@@ -41,20 +47,32 @@ async def websocket_endpoint(websocket: WebSocket, device_id: int):
                         print(f"🔄 Tarjeta {card_uid} registrada para usuario {user_id}")
                         
                         # Confirmar registro exitoso al dispositivo
-                        await manager.send_json(websocket, {
+                        await manager.send_to_device(device_id, {
                             "type": "nfc_registration_success",
                             "success": True,
                             "message": f"Tarjeta {card_name} registrada exitosamente"
-                        })
+                        }, PRIORITY_CRITICAL)
                 
                 # Manejar notificaciones de acceso desde el dispositivo
                 elif message_type == "access_log":
                     print(f"📝 Log de acceso desde dispositivo {device_id}: {message}")
                 
+                # Recepción de un comando (solo para medir latencia)
+                elif message_type == "action_received":
+                    action_id = message.get("action_id")
+                    if action_id:
+                        command_tracer.received(int(action_id), message.get("correlation_id"))
+
                 # Manejar confirmación de acciones
                 elif message_type == "action_confirmed":
                     action_id = message.get("action_id")
                     print(f"✅ Acción {action_id} confirmada por dispositivo {device_id}")
+                    if action_id:
+                        await command_queue.confirm(
+                            int(action_id),
+                            correlation_id=message.get("correlation_id"),
+                            device_elapsed_ms=message.get("device_elapsed_ms"),
+                        )
                 
             except json.JSONDecodeError:
                 print("❌ Mensaje no es JSON válido")
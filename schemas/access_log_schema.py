@@ -1,9 +1,47 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, validator
+from typing import List, Optional
+from datetime import datetime
 
 class AccessLogCreate(BaseModel):
     id_device: int
     action: str
     id_user: Optional[int] = None
     access_type: str = "local"
-    user_name: str
\ No newline at end of file
+    user_name: str
+    seq: Optional[int] = None  # Número de secuencia del dispositivo (idempotencia de reintentos)
+    device_timestamp: Optional[datetime] = None  # Hora del evento en el dispositivo (parte de la clave con seq)
+
+class AccessLogEvent(BaseModel):
+    seq: Optional[int] = None  # Número de secuencia del dispositivo
+    action: str
+    id_user: Optional[int] = None
+    access_type: str = "local"
+    user_name: str
+    device_timestamp: Optional[datetime] = None  # Hora del evento en el dispositivo
+
+class AccessLogBatch(BaseModel):
+    id_device: int
+    events: List[AccessLogEvent]
+
+    @validator('events')
+    def validate_events(cls, v):
+        if not v:
+            raise ValueError('El lote debe contener al menos un evento')
+        if len(v) > 500:
+            raise ValueError('El lote no puede superar 500 eventos')
+        return v
+
+class AccessLogAck(BaseModel):
+    index: int
+    seq: Optional[int] = None
+    status: str  # ok, duplicate (reintento de un evento ya registrado), conflict (secuencia usada por otro evento)
+    action_id: Optional[int] = None
+
+class AccessLogBatchResponse(BaseModel):
+    success: bool
+    received: int
+    stored: int
+    duplicates: int = 0
+    conflicts: int = 0
+    notification_sent: bool
+    acks: List[AccessLogAck]
@@ -13,10 +13,21 @@ class ActionDeviceRead(BaseModel):
     action: str
     executed: bool
     created_at: datetime
+    status: Optional[str] = None
+    seq: Optional[int] = None
+    attempts: int = 0
+    last_sent_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+    correlation_id: Optional[str] = None
 
     class Config:
         from_attributes = True
 
+class DeviceConfirmation(BaseModel):
+    """Cuerpo opcional de /actions/device/confirm/{id}."""
+    correlation_id: Optional[str] = None
+    device_elapsed_ms: Optional[float] = None  # Medido por el dispositivo entre recibir y confirmar
+
 class ActionDeviceUpdate(BaseModel):
     executed: Optional[bool] = None
 
@@ -0,0 +1,67 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, validator
+
+class DeviceGroupCreate(BaseModel):
+    name: str
+    description: Optional[str] = None
+    device_ids: List[int] = []
+
+    @validator('name')
+    def validate_name(cls, v):
+        if len(v) < 2 or len(v) > 50:
+            raise ValueError('El nombre debe tener entre 2 y 50 caracteres')
+        return v
+
+class DeviceGroupUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    device_ids: Optional[List[int]] = None
+
+class DeviceGroupRead(BaseModel):
+    id: int
+    name: str
+    description: Optional[str]
+    device_ids: List[int]
+    created_at: datetime
+    updated_at: datetime
+
+class GroupCommandCreate(BaseModel):
+    action: str
+    device_timeout_seconds: Optional[float] = None  # Por dispositivo, al enviar
+    deadline_seconds: Optional[float] = None  # Espera total de confirmaciones
+
+    @validator('action')
+    def validate_action(cls, v):
+        if not v or len(v) > 100:
+            raise ValueError('Acción inválida')
+        return v
+
+    @validator('device_timeout_seconds', 'deadline_seconds')
+    def validate_timeouts(cls, v):
+        if v is not None and not 0 < v <= 30:
+            raise ValueError('Los tiempos deben estar entre 0 y 30 segundos')
+        return v
+
+class GroupCommandDevice(BaseModel):
+    id_device: int
+    action_id: int
+    status: str
+    attempts: int
+    last_sent_at: Optional[datetime]
+
+class GroupCommandStatus(BaseModel):
+    id: str
+    id_group: int
+    group_name: str
+    action: str
+    created_at: datetime
+    total: int
+    confirmed: int
+    sent: int
+    pending: int
+    expired: int
+    complete: bool
+    devices: List[GroupCommandDevice]
+    sent_ms: Optional[float] = None
+    elapsed_ms: Optional[float] = None
@@ -15,12 +15,18 @@ class LogCreate(LogBase):
 class LogRead(LogBase):
     id: int
     timestamp: datetime
+    event_code: Optional[int] = None  # NULL en logs anteriores a los códigos
+    id_subject_user: Optional[int] = None
+    id_card: Optional[int] = None
+    occurrences: int = 1  # > 1 en eventos de seguridad compactados
+    last_timestamp: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
 class LogFilterParams(BaseModel):
     id_device: Optional[int] = None
+    event_code: Optional[int] = None
     id_action: Optional[int] = None
     access_type: Optional[str] = None
     start_date: Optional[datetime] = None
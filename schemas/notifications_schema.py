@@ -0,0 +1,19 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel
+
+class NotificationOutboxRead(BaseModel):
+    id: int
+    kind: str
+    payload: str
+    status: str
+    attempts: int
+    next_attempt_at: Optional[datetime]
+    claimed_at: Optional[datetime]
+    last_error: Optional[str]
+    id_action: Optional[int]
+    created_at: datetime
+    sent_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
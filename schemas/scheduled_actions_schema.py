@@ -0,0 +1,98 @@
+import re
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, validator
+
+KINDS = ("once", "daily", "weekly")
+
+class ScheduledActionCreate(BaseModel):
+    name: str
+    id_device: int
+    action: str
+    kind: str  # once, daily, weekly
+    time_of_day: Optional[str] = None  # HH:MM hora Colombia (daily, weekly)
+    weekdays: Optional[List[int]] = None  # 0 = lunes ... 6 = domingo (weekly)
+    run_at: Optional[datetime] = None  # Fecha y hora exacta (once)
+    catch_up_minutes: int = 15  # Tolerancia para ejecutar tras un reinicio
+    enabled: bool = True
+
+    @validator('name')
+    def validate_name(cls, v):
+        if len(v) < 2 or len(v) > 100:
+            raise ValueError('El nombre debe tener entre 2 y 100 caracteres')
+        return v
+
+    @validator('action')
+    def validate_action(cls, v):
+        if not v or len(v) > 100:
+            raise ValueError('Acción inválida')
+        return v
+
+    @validator('kind')
+    def validate_kind(cls, v):
+        if v not in KINDS:
+            raise ValueError(f'El tipo debe ser uno de {", ".join(KINDS)}')
+        return v
+
+    @validator('time_of_day')
+    def validate_time_of_day(cls, v):
+        if v is not None:
+            match = re.fullmatch(r'(\d{2}):(\d{2})', v)
+            if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+                raise ValueError('La hora debe tener formato HH:MM (00:00 a 23:59)')
+        return v
+
+    @validator('weekdays')
+    def validate_weekdays(cls, v):
+        if v is not None:
+            if any(day < 0 or day > 6 for day in v):
+                raise ValueError('Los días van de 0 (lunes) a 6 (domingo)')
+            v = sorted(set(v))
+        return v
+
+    @validator('run_at', always=True)
+    def validate_kind_fields(cls, v, values):
+        kind = values.get('kind')
+        if kind == 'once' and v is None:
+            raise ValueError('Una acción única necesita run_at')
+        if kind in ('daily', 'weekly') and not values.get('time_of_day'):
+            raise ValueError('Las acciones diarias y semanales necesitan time_of_day')
+        if kind == 'weekly' and not values.get('weekdays'):
+            raise ValueError('Las acciones semanales necesitan al menos un día en weekdays')
+        return v
+
+    @validator('catch_up_minutes')
+    def validate_catch_up(cls, v):
+        if not 0 <= v <= 1440:
+            raise ValueError('La tolerancia debe estar entre 0 y 1440 minutos')
+        return v
+
+class ScheduledActionUpdate(BaseModel):
+    name: Optional[str] = None
+    id_device: Optional[int] = None
+    action: Optional[str] = None
+    kind: Optional[str] = None
+    time_of_day: Optional[str] = None
+    weekdays: Optional[List[int]] = None
+    run_at: Optional[datetime] = None
+    catch_up_minutes: Optional[int] = None
+    enabled: Optional[bool] = None
+
+class ScheduledActionRead(BaseModel):
+    id: int
+    name: str
+    id_device: int
+    action: str
+    kind: str
+    time_of_day: Optional[str]
+    weekdays: Optional[List[int]]
+    run_at: Optional[datetime]
+    catch_up_minutes: int
+    enabled: bool
+    next_run_at: Optional[datetime]
+    next_run_local: Optional[str]  # Hora Colombia, para mostrar
+    last_run_at: Optional[datetime]
+    last_action_id: Optional[int]
+    id_user: int
+    created_at: datetime
+    updated_at: datetime
@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional, List
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, validator
+from core.time_utils import get_current_colombia_time
 
 # 🔥 NUEVA CLASE UserData AÑADIDA
 class UserData(BaseModel):
@@ -29,6 +30,17 @@ class UserRead(UserBase):
     id: int
     created_at: datetime
     last_connection: Optional[datetime]
+    last_access_at: Optional[datetime] = None
+    last_access_device: Optional[int] = None
+    month_access_period: Optional[str] = None
+    month_access_count: int = 0
+
+    @validator('month_access_count', always=True)
+    def current_month_only(cls, v, values):
+        # El contador guardado es del mes en que se registró el último acceso
+        if values.get('month_access_period') != get_current_colombia_time().strftime("%Y-%m"):
+            return 0
+        return v or 0
 
     class Config:
         from_attributes = True
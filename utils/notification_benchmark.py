@@ -0,0 +1,202 @@
+"""
+Benchmark del camino de notificaciones: accesos de puerta → outbox → WhatsApp.
+
+Envía aperturas a POST /actions/access-log de un backend en marcha (el
+mismo camino que los dispositivos) mientras muestrea /health/notifications,
+y al terminar espera a que el outbox se vacíe. Informa:
+
+- latencia de las peticiones de acceso (p50, p99, máxima),
+- profundidad de la cola de notificaciones (outbox pendiente + en envío +
+  agregador) a lo largo de la prueba,
+- rendimiento de entrega (notificaciones confirmadas por segundo) y, si se
+  indica --standin, lo que vio el proveedor (errores, 429, concurrencia).
+
+Arranque típico, para medir qué le hace un proveedor lento al tráfico de puertas:
+
+    python -m utils.notification_standin --latency-ms 2000 --error-rate 0.1
+    NOTIFICATION_PROVIDER=local NOTIFICATION_DIGEST_WINDOW_SECONDS=0 uvicorn main:app
+    python -m utils.notification_benchmark --events 500 --concurrency 20 --standin http://127.0.0.1:8090
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List, Optional
+
+import httpx
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(q * len(ordered)), len(ordered) - 1)
+    return round(ordered[index], 1)
+
+
+def queue_depth(stats: dict) -> int:
+    by_status = stats.get("outbox", {}).get("by_status", {})
+    return by_status.get("pending", 0) + by_status.get("sending", 0) + stats.get("pending", 0)
+
+
+class NotificationBenchmark:
+    def __init__(self, args):
+        self.args = args
+        self.latencies_ms: List[float] = []
+        self.errors = 0
+        self.samples = []  # (segundos desde el inicio, profundidad de la cola, enviadas)
+
+    async def _notification_stats(self, client: httpx.AsyncClient) -> dict:
+        response = await client.get(f"{self.args.backend}/health/notifications")
+        response.raise_for_status()
+        return response.json()
+
+    async def _access(self, client: httpx.AsyncClient, index: int):
+        payload = {
+            "id_device": self.args.device,
+            "id_user": 0,
+            "user_name": f"Benchmark {index}",
+            "action": "DOOR_OPEN" if index % 2 == 0 else "GARAGE_OPEN",
+            "access_type": "nfc",
+        }
+        start = time.perf_counter()
+        try:
+            response = await client.post(f"{self.args.backend}/actions/access-log", json=payload)
+            if response.status_code != 200:
+                self.errors += 1
+        except httpx.HTTPError:
+            self.errors += 1
+        self.latencies_ms.append((time.perf_counter() - start) * 1000)
+
+    async def _producer(self, client: httpx.AsyncClient):
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        interval = 1 / self.args.rate if self.args.rate > 0 else 0
+
+        async def one(index: int):
+            async with semaphore:
+                await self._access(client, index)
+
+        tasks = []
+        for index in range(self.args.events):
+            tasks.append(asyncio.create_task(one(index)))
+            if interval:
+                await asyncio.sleep(interval)
+        await asyncio.gather(*tasks)
+
+    async def _sampler(self, client: httpx.AsyncClient, started: float):
+        while True:
+            try:
+                stats = await self._notification_stats(client)
+                self.samples.append((time.monotonic() - started, queue_depth(stats), stats["outbox"]["sent"]))
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(self.args.sample_seconds)
+
+    async def run(self) -> dict:
+        limits = httpx.Limits(max_connections=self.args.concurrency + 2)
+        async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+            if self.args.standin:
+                await client.post(f"{self.args.standin}/stats/reset")
+            baseline = await self._notification_stats(client)
+
+            started = time.monotonic()
+            sampler = asyncio.create_task(self._sampler(client, started))
+            await self._producer(client)
+            produced_at = time.monotonic() - started
+
+            # Esperar a que el outbox entregue lo generado
+            drained_at = None
+            deadline = time.monotonic() + self.args.drain_timeout
+            while time.monotonic() < deadline:
+                stats = await self._notification_stats(client)
+                if queue_depth(stats) == 0:
+                    drained_at = time.monotonic() - started
+                    break
+                await asyncio.sleep(self.args.sample_seconds)
+            sampler.cancel()
+
+            final = await self._notification_stats(client)
+            provider = None
+            if self.args.standin:
+                provider = (await client.get(f"{self.args.standin}/stats")).json()
+
+        outbox, before = final["outbox"], baseline["outbox"]
+        sent = outbox["sent"] - before["sent"]
+        elapsed = drained_at or (time.monotonic() - started)
+        depths = [depth for _, depth, _ in self.samples]
+        return {
+            "events": self.args.events,
+            "concurrency": self.args.concurrency,
+            "request_errors": self.errors,
+            "request_latency_ms": {
+                "p50": percentile(self.latencies_ms, 0.50),
+                "p99": percentile(self.latencies_ms, 0.99),
+                "max": round(max(self.latencies_ms), 1) if self.latencies_ms else None,
+            },
+            "requests_per_second": round(self.args.events / produced_at, 1) if produced_at else None,
+            "notifications": {
+                "sent": sent,
+                "retried": outbox["retried"] - before["retried"],
+                "dead": outbox["dead"] - before["dead"],
+                "digests": final.get("digests", 0) - baseline.get("digests", 0),
+                "per_second": round(sent / elapsed, 2) if elapsed else None,
+                "drained": drained_at is not None,
+                "drain_seconds": round(drained_at, 2) if drained_at is not None else None,
+            },
+            "queue_depth": {
+                "max": max(depths) if depths else 0,
+                "end_of_load": next((depth for t, depth, _ in reversed(self.samples) if t <= produced_at), None),
+                "samples": [(round(t, 1), depth) for t, depth, _ in self.samples] if self.args.samples else None,
+            },
+            "provider": provider,
+        }
+
+
+def print_report(result: dict):
+    latency = result["request_latency_ms"]
+    notifications = result["notifications"]
+    queue = result["queue_depth"]
+    print(f"📊 Benchmark de notificaciones: {result['events']} accesos, concurrencia {result['concurrency']}")
+    print(f"   • Peticiones: {result['requests_per_second']}/s, errores {result['request_errors']}")
+    print(f"   • Latencia de acceso: p50 {latency['p50']} ms, p99 {latency['p99']} ms, máx {latency['max']} ms")
+    print(
+        f"   • Notificaciones: {notifications['sent']} entregadas ({notifications['per_second']}/s), "
+        f"{notifications['retried']} reintentos, {notifications['dead']} descartadas, {notifications['digests']} resúmenes"
+    )
+    if notifications["drained"]:
+        print(f"   • Outbox vacío a los {notifications['drain_seconds']} s")
+    else:
+        print("   • ⚠️ El outbox no se vació dentro del tiempo de espera")
+    print(f"   • Cola: máximo {queue['max']}, al terminar la carga {queue['end_of_load']}")
+    provider = result["provider"]
+    if provider:
+        print(
+            f"   • Proveedor: {provider['received']} recibidas, {provider['delivered']} entregadas, "
+            f"{provider['errors']} errores, {provider['throttled']} limitadas (429), "
+            f"concurrencia máx {provider['max_in_flight']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del camino de notificaciones de acceso")
+    parser.add_argument("--backend", default="http://127.0.0.1:8000")
+    parser.add_argument("--standin", default=None, help="URL base del stand-in (utils/notification_standin.py)")
+    parser.add_argument("--device", type=int, default=1)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=0, help="Accesos por segundo (0 = lo más rápido posible)")
+    parser.add_argument("--sample-seconds", type=float, default=0.5)
+    parser.add_argument("--drain-timeout", type=float, default=120)
+    parser.add_argument("--samples", action="store_true", help="Incluir la serie de profundidad de la cola")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(NotificationBenchmark(args).run())
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print_report(result)
+
+
+if __name__ == "__main__":
+    main()
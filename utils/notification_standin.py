@@ -0,0 +1,141 @@
+"""
+Servidor local que imita la API de WhatsApp de CallMeBot para pruebas de carga.
+
+Responde GET /whatsapp.php como CallMeBot (200 = enviado) con:
+- latencia base más una variación aleatoria (--latency-ms, --jitter-ms),
+- una fracción de errores 500 (--error-rate),
+- límite de envío: por encima de --rate-per-minute (ráfaga --burst) responde 429.
+
+GET /stats devuelve los contadores y POST /stats/reset los reinicia;
+PUT /config cambia los parámetros sin reiniciar el servidor.
+
+Uso, con el backend en NOTIFICATION_PROVIDER=local:
+
+    python -m utils.notification_standin --port 8090 --latency-ms 800 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Optional
+
+from fastapi import FastAPI, Query
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from core.notification_aggregator import TokenBucket
+
+
+class StandInConfig(BaseModel):
+    latency_ms: float = 300
+    jitter_ms: float = 100
+    error_rate: float = 0.0
+    rate_per_minute: float = 0  # 0 = sin límite
+    burst: int = 5
+
+
+class StandInConfigUpdate(BaseModel):
+    latency_ms: Optional[float] = None
+    jitter_ms: Optional[float] = None
+    error_rate: Optional[float] = None
+    rate_per_minute: Optional[float] = None
+    burst: Optional[int] = None
+
+
+class StandIn:
+    def __init__(self, config: StandInConfig):
+        self.configure(config)
+        self.reset()
+
+    def configure(self, config: StandInConfig):
+        self.config = config
+        self.bucket = TokenBucket(config.rate_per_minute, config.burst) if config.rate_per_minute > 0 else None
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.in_flight = 0
+        self.stats = {"received": 0, "delivered": 0, "errors": 0, "throttled": 0, "max_in_flight": 0}
+
+    async def handle(self, text: str) -> PlainTextResponse:
+        self.stats["received"] += 1
+        if self.bucket is not None and not self.bucket.try_take():
+            self.stats["throttled"] += 1
+            return PlainTextResponse("Too many messages, slow down", status_code=429)
+
+        self.in_flight += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+        try:
+            delay = self.config.latency_ms + random.uniform(-1, 1) * self.config.jitter_ms
+            await asyncio.sleep(max(delay, 0) / 1000)
+        finally:
+            self.in_flight -= 1
+
+        if random.random() < self.config.error_rate:
+            self.stats["errors"] += 1
+            return PlainTextResponse("Internal error", status_code=500)
+        self.stats["delivered"] += 1
+        return PlainTextResponse(f"Message queued. {len(text)} characters")
+
+    def get_stats(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            **self.stats,
+            "in_flight": self.in_flight,
+            "elapsed_seconds": round(elapsed, 2),
+            "delivered_per_second": round(self.stats["delivered"] / elapsed, 2) if elapsed else 0,
+            "config": self.config.dict(),
+        }
+
+
+def create_app(config: Optional[StandInConfig] = None) -> FastAPI:
+    standin = StandIn(config or StandInConfig())
+    app = FastAPI(title="CallMeBot stand-in")
+    app.state.standin = standin
+
+    @app.get("/whatsapp.php")
+    async def whatsapp(phone: str = Query(""), text: str = Query(""), apikey: str = Query("")):
+        return await standin.handle(text)
+
+    @app.get("/stats")
+    def stats():
+        return standin.get_stats()
+
+    @app.post("/stats/reset")
+    def reset():
+        standin.reset()
+        return standin.get_stats()
+
+    @app.put("/config")
+    def configure(data: StandInConfigUpdate):
+        standin.configure(StandInConfig(**{**standin.config.dict(), **data.dict(exclude_unset=True)}))
+        return standin.config
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de CallMeBot")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-per-minute", type=float, default=0, help="0 = sin límite")
+    parser.add_argument("--burst", type=int, default=5)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = StandInConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_per_minute=args.rate_per_minute,
+        burst=args.burst,
+    )
+    print(f"📡 Stand-in de CallMeBot en http://{args.host}:{args.port}/whatsapp.php ({config.dict()})")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()